@@ -0,0 +1,195 @@
+from array import array
+import json
+import mmap
+import os
+from typing import Optional
+
+microsecondsAsInt = int
+
+# Every call log file starts with two int64 words: its kind and the number of
+# samples recorded so far. A stream file's count is as of the last flush, a
+# ring's is updated with every sample.
+_kStream = 0
+_kRing = 1
+_kHeaderWords = 2
+
+
+class CallLogRecorder:
+    """
+    Records (name id, time) samples of named calls into a preallocated
+    array('q') buffer, so recording a sample only stores two ints.
+
+    Names are interned to integer ids up front with intern(). Where the
+    samples end up depends on path and useMmap:
+
+    - no path: the buffer is a ring in memory holding the latest capacity
+      samples.
+    - path: each time the buffer fills it is appended to the file, so no
+      sample is lost.
+    - path and useMmap: the buffer is a ring inside the memory-mapped file,
+      which another process can read while the robot runs and which
+      survives the robot crashing.
+
+    intern() writes the names beside the file, to path + ".names.json", as
+    they are added. readCallLog() reads both back.
+    """
+
+    __slots__ = (
+        'names', '_ids', 'path', '_capacity', '_buffer', '_header', '_index',
+        '_flushedIndex', '_file', '_mmap',
+    )
+
+    def __init__(
+        self, capacity: int = 4096, path: Optional[str] = None, useMmap: bool = False
+    ) -> None:
+        """
+        :param capacity: samples the buffer holds.
+        :param path:     file to stream the samples to.
+        :param useMmap:  keep the buffer as a ring in the memory-mapped path.
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity={capacity} must be positive")
+        if useMmap and path is None:
+            raise ValueError("useMmap needs a path")
+        self.names = []
+        self._ids = {}
+        self.path = path
+        self._capacity = capacity
+        self._index = 0
+        self._flushedIndex = 0
+        self._file = None
+        self._mmap = None
+        if useMmap:
+            with open(path, "w+b") as f:
+                f.truncate(8 * (_kHeaderWords + 2 * capacity))
+                self._mmap = mmap.mmap(f.fileno(), 0)
+            words = memoryview(self._mmap).cast('q')
+            self._header = words[:_kHeaderWords]
+            self._buffer = words[_kHeaderWords:]
+            self._header[0] = _kRing
+        else:
+            self._header = array('q', [_kStream, 0])
+            self._buffer = array('q', bytes(16 * capacity))
+            if path is not None:
+                self._file = open(path, "wb")
+                self._header.tofile(self._file)
+
+    def intern(self, name: str) -> int:
+        """
+        :returns: the id to record samples of name with.
+        """
+        nameId = self._ids.get(name)
+        if nameId is None:
+            nameId = self._ids[name] = len(self.names)
+            self.names.append(name)
+            if self.path is not None:
+                self._writeNames()
+        return nameId
+
+    def _writeNames(self) -> None:
+        # Replaced rather than rewritten in place, so a reader or a crash
+        # never sees a partly written file.
+        namesPath = self.path + ".names.json"
+        with open(namesPath + ".tmp", "w") as f:
+            json.dump(self.names, f)
+        os.replace(namesPath + ".tmp", namesPath)
+
+    def record(self, nameId: int, timeUs: microsecondsAsInt) -> None:
+        index = self._index
+        buffer = self._buffer
+        buffer[index] = nameId
+        buffer[index + 1] = timeUs
+        # Counted after the sample is stored, a ring's reader unrolls by it
+        self._header[1] += 1
+        if index + 2 == len(buffer):
+            self._index = 0
+            self._wrap()
+        else:
+            self._index = index + 2
+
+    def _wrap(self) -> None:
+        if self._file is not None:
+            self._buffer[self._flushedIndex :].tofile(self._file)
+            self._flushedIndex = 0
+
+    def count(self) -> int:
+        """
+        :returns: the number of samples recorded, including any the ring
+                  has since overwritten.
+        """
+        return self._header[1]
+
+    def flush(self) -> None:
+        if self.path is None:
+            return
+        if self._file is not None:
+            self._buffer[self._flushedIndex : self._index].tofile(self._file)
+            self._flushedIndex = self._index
+            self._file.seek(0)
+            self._header.tofile(self._file)
+            self._file.seek(0, 2)
+            self._file.flush()
+        else:
+            self._mmap.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._mmap is not None:
+            self._header.release()
+            self._buffer.release()
+            self._mmap.close()
+            self._mmap = None
+
+    def records(self) -> array:
+        """
+        :returns: the samples still available, oldest first, as alternating
+                  name ids and times.
+        """
+        if self._file is not None:
+            self.flush()
+            return readCallLog(self.path)[1]
+        return _unrollRing(
+            array('q', self._buffer.tobytes()), self.count(), self._capacity
+        )
+
+    def timesByName(self) -> dict[str, array]:
+        """
+        :returns: the times recorded for each name, oldest first.
+        """
+        return splitByName(self.names, self.records())
+
+
+def _unrollRing(buffer: array, count: int, capacity: int) -> array:
+    if count <= capacity:
+        return buffer[: 2 * count]
+    start = 2 * (count % capacity)
+    return buffer[start:] + buffer[:start]
+
+
+def readCallLog(path: str) -> tuple[list[str], array]:
+    """
+    Read a call log written by CallLogRecorder, for offline analysis.
+
+    :returns: the names indexed by id, and the samples, oldest first, as
+              alternating name ids and times.
+    """
+    with open(path + ".names.json") as f:
+        names = json.load(f)
+    words = array('q')
+    with open(path, "rb") as f:
+        words.frombytes(f.read())
+    kind, count = words[0], words[1]
+    body = words[_kHeaderWords:]
+    if kind == _kRing:
+        body = _unrollRing(body, count, len(body) // 2)
+    return names, body
+
+
+def splitByName(names: list[str], records: array) -> dict[str, array]:
+    timesByName = {name: array('q') for name in names}
+    for index in range(0, len(records), 2):
+        timesByName[names[records[index]]].append(records[index + 1])
+    return timesByName
@@ -0,0 +1,80 @@
+from array import array
+
+microsecondsAsInt = int
+
+
+class AdaptivePeriod:
+    """
+    Chooses the main loop period from a rolling window of loop execution
+    times.
+
+    After every windowLoops loops the chosen percentile of the window is
+    compared with the period: above kHighUtilization of it the period is
+    lengthened, below kLowUtilization it is shortened, in both cases to the
+    whole kStepUs that puts the percentile at kTargetUtilization, within
+    [minPeriodUs, maxPeriodUs]. The target sits between the two thresholds,
+    so a new period holds until the load really changes.
+    """
+
+    __slots__ = (
+        'periodUs', 'minPeriodUs', 'maxPeriodUs', 'percentile', '_samples', '_index',
+    )
+
+    kHighUtilization = 0.9
+    kLowUtilization = 0.5
+    kTargetUtilization = 0.7
+    kStepUs = 1000
+
+    def __init__(
+        self,
+        periodUs: microsecondsAsInt,
+        minPeriodUs: microsecondsAsInt,
+        maxPeriodUs: microsecondsAsInt,
+        windowLoops: int = 50,
+        percentile: float = 0.95,
+    ) -> None:
+        """
+        :param periodUs:    the period to start with.
+        :param minPeriodUs: the shortest period to choose.
+        :param maxPeriodUs: the longest period to choose.
+        :param windowLoops: loops between decisions.
+        :param percentile:  of the window's execution times to compare, 0.95
+                            ignores the odd slow loop.
+        """
+        if not 0 < minPeriodUs <= periodUs <= maxPeriodUs:
+            raise ValueError(
+                f"need 0 < minPeriodUs={minPeriodUs} <= periodUs={periodUs} <= maxPeriodUs={maxPeriodUs}"
+            )
+        if windowLoops < 1:
+            raise ValueError(f"windowLoops={windowLoops} must be positive")
+        self.periodUs = periodUs
+        self.minPeriodUs = minPeriodUs
+        self.maxPeriodUs = maxPeriodUs
+        self.percentile = percentile
+        self._samples = array('q', bytes(8 * windowLoops))
+        self._index = 0
+
+    def record(self, executionUs: microsecondsAsInt) -> bool:
+        """
+        Add one loop's execution time.
+
+        :returns: True if periodUs changed.
+        """
+        samples = self._samples
+        index = self._index
+        samples[index] = executionUs
+        index += 1
+        if index < len(samples):
+            self._index = index
+            return False
+        self._index = 0
+        return self._decide(sorted(samples)[int(self.percentile * (len(samples) - 1))])
+
+    def _decide(self, executionUs: microsecondsAsInt) -> bool:
+        periodUs = self.periodUs
+        if self.kLowUtilization * periodUs <= executionUs <= self.kHighUtilization * periodUs:
+            return False
+        step = self.kStepUs
+        targetUs = -(-int(executionUs / self.kTargetUtilization) // step) * step
+        self.periodUs = min(self.maxPeriodUs, max(self.minPeriodUs, targetUs))
+        return self.periodUs != periodUs
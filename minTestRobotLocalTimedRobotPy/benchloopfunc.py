@@ -0,0 +1,180 @@
+"""
+Compare the overhead of IterativeRobotPy._loopFunc with its overhead at a
+baseline git revision, on CPython.
+
+Both sides run the real _loopFunc: the current one from iterativerobotpy.py,
+and the baseline one from iterativerobotpy.py as it was at the revision,
+loaded with git show. The DriverStation is stubbed to report each control
+state in turn, and the HAL observe functions, the dashboards, the watchdog
+and the mode methods are replaced by no-ops, so the numbers are the
+framework's own cost per loop. The ratio column is baseline / current,
+above 1 where the current _loopFunc is cheaper.
+
+The revision is required, as commit ids change when the branch is rebased;
+to compare against where the branch left main, for example:
+
+    python benchloopfunc.py $(git merge-base HEAD main)
+"""
+import argparse
+import os
+import subprocess
+import timeit
+import types
+
+import iterativerobotpy
+
+NUM_LOOPS = 200_000
+
+CONTROL_STATES = {
+    "disabled": (False, False, False),
+    "autonomous": (True, True, False),
+    "teleop": (True, False, False),
+    "test": (True, False, True),
+}
+
+
+def doNothing(*args: object) -> None:
+    pass
+
+
+class StubDriverStation:
+    """
+    Answers _loopFunc's DriverStation calls with controlState.
+    """
+
+    controlState = CONTROL_STATES["disabled"]
+
+    refreshData = staticmethod(doNothing)
+
+    @staticmethod
+    def isDSAttached() -> bool:
+        return True
+
+
+class StubDSControlWord:
+    def isDSAttached(self) -> bool:
+        return True
+
+
+class NoOpDashboard:
+    updateValues = staticmethod(doNothing)
+    update = staticmethod(doNothing)
+    setEnabled = staticmethod(doNothing)
+    enableActuatorWidgets = staticmethod(doNothing)
+    disableActuatorWidgets = staticmethod(doNothing)
+
+    @staticmethod
+    def getKeys() -> list[str]:
+        return []
+
+
+class NoOpWatchdog:
+    reset = addEpoch = disable = printEpochs = staticmethod(doNothing)
+
+    @staticmethod
+    def isExpired() -> bool:
+        return False
+
+
+STUBS = {
+    "DriverStation": StubDriverStation,
+    "DSControlWord": StubDSControlWord,
+    "SmartDashboard": NoOpDashboard,
+    "LiveWindow": NoOpDashboard,
+    "Shuffleboard": NoOpDashboard,
+    "observeUserProgramDisabled": doNothing,
+    "observeUserProgramAutonomous": doNothing,
+    "observeUserProgramTeleop": doNothing,
+    "observeUserProgramTest": doNothing,
+    "simPeriodicBefore": doNothing,
+    "simPeriodicAfter": doNothing,
+}
+
+
+def loadBaseline(revision: str) -> types.ModuleType:
+    """
+    :param revision: the git revision to load iterativerobotpy.py from.
+
+    :returns: that iterativerobotpy.py, as a module separate from the
+              current one.
+    """
+    source = subprocess.run(
+        ["git", "show", f"{revision}:./iterativerobotpy.py"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    module = types.ModuleType("iterativerobotpy_baseline")
+    module.__file__ = f"{revision}:iterativerobotpy.py"
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def stubModule(module: types.ModuleType) -> None:
+    for name, stub in STUBS.items():
+        if hasattr(module, name):
+            setattr(module, name, stub)
+
+
+def makeRobot(module: types.ModuleType) -> object:
+    """
+    :param module: an iterativerobotpy module, already stubbed.
+
+    :returns: a robot built from the module's IterativeRobotPy, whose
+              robot code does nothing.
+    """
+
+    class BenchRobot(module.IterativeRobotPy):
+        def getControlState(self) -> tuple[bool, bool, bool]:
+            return StubDriverStation.controlState
+
+        def isSimulation(self) -> bool:
+            return False
+
+        driverStationConnected = robotPeriodic = doNothing
+        disabledInit = autonomousInit = teleopInit = testInit = doNothing
+        disabledPeriodic = autonomousPeriodic = doNothing
+        teleopPeriodic = testPeriodic = doNothing
+        disabledExit = autonomousExit = teleopExit = testExit = doNothing
+
+    robot = BenchRobot(0.020)
+    robot.watchdog = NoOpWatchdog()
+    robot.setNetworkTablesFlushEnabled(False)
+    return robot
+
+
+def timeLoopFunc(robot: object) -> float:
+    """
+    :returns: the best time of one _loopFunc call, in nanoseconds.
+    """
+    loopFunc = robot._loopFunc
+    loopFunc()  # enter the mode outside the timed region
+    seconds = min(timeit.repeat(loopFunc, number=NUM_LOOPS, repeat=5))
+    return seconds / NUM_LOOPS * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("revision", help="git revision to load the baseline iterativerobotpy.py from")
+    revision = parser.parse_args().revision
+    baseline = loadBaseline(revision)
+    stubModule(baseline)
+    stubModule(iterativerobotpy)
+    baselineRobot = makeRobot(baseline)
+    currentRobot = makeRobot(iterativerobotpy)
+
+    print(f"baseline: iterativerobotpy.py at {revision}")
+    print(f"{'mode':>10} {'baseline':>10} {'current':>10} {'ratio':>8}")
+    for name, controlState in CONTROL_STATES.items():
+        StubDriverStation.controlState = controlState
+        baselineNs = timeLoopFunc(baselineRobot)
+        currentNs = timeLoopFunc(currentRobot)
+        print(
+            f"{name:>10} {baselineNs:>8.1f}ns {currentNs:>8.1f}ns "
+            f"{baselineNs / currentNs:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+A robot for benchsuite.py: registers a configurable set of periodic
+callbacks, records when each one starts, and writes start skid, jitter and
+scheduler overhead statistics as a JSON line when it ends.
+
+The configuration comes from the TIMEDROBOT_BENCH_CONFIG environment variable
+as JSON, see DEFAULT_CONFIG. Run it on its own with:
+
+    python -m robotpy --main benchrobot.py sim --nogui
+"""
+from array import array
+import json
+import os
+import statistics
+import time
+
+from wpilib import RobotController
+
+from timedrobotpy import TimedRobotPy
+
+_getFPGATime = RobotController.getFPGATime
+
+microsecondsAsInt = int
+
+DEFAULT_CONFIG = {
+    # "timedrobotpy" (this directory), "wpilib.TimedRobotPy" or "wpilib.TimedRobot"
+    "impl": "timedrobotpy",
+    "numCallbacks": 10,
+    "periodS": 0.020,
+    # callback i is offset by offsetSpreadS * i / numCallbacks
+    "offsetSpreadS": 0.0,
+    "bodyCostUs": 0,
+    "numPeriods": 200,
+    "output": "bench_results.jsonl",
+}
+
+
+def loadConfig() -> dict:
+    config = dict(DEFAULT_CONFIG)
+    config.update(json.loads(os.environ.get("TIMEDROBOT_BENCH_CONFIG", "{}")))
+    return config
+
+
+def robotParentClass(impl: str):
+    if impl == "timedrobotpy":
+        return TimedRobotPy
+    if impl == "wpilib.TimedRobot":
+        from wpilib import TimedRobot
+
+        return TimedRobot
+    if impl == "wpilib.TimedRobotPy":
+        from wpilib.timedrobotpy import TimedRobotPy as WpilibTimedRobotPy
+
+        return WpilibTimedRobotPy
+    raise ValueError(f"unknown impl {impl}")
+
+
+CONFIG = loadConfig()
+
+
+def percentile(sortedValues: list, fraction: float):
+    if not sortedValues:
+        return 0
+    return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+
+def busyWaitUs(durationUs: microsecondsAsInt) -> None:
+    endNs = time.perf_counter_ns() + durationUs * 1000
+    while time.perf_counter_ns() < endNs:
+        pass
+
+
+class MyRobot(robotParentClass(CONFIG["impl"])):
+    def __init__(self):
+        # Every implementation anchors its schedule a few microseconds after
+        # this, so skids read slightly high by the same bias for all of them.
+        anchorUs = _getFPGATime()
+        super().__init__()
+        self._anchorUs = anchorUs
+        self._numCallbacks = CONFIG["numCallbacks"]
+        self._numPeriods = CONFIG["numPeriods"]
+        self._periodUs = int(CONFIG["periodS"] * 1e6)
+        self._bodyCostUs = CONFIG["bodyCostUs"]
+        self._startTimesUs = array("q", bytes(8 * self._numCallbacks * self._numPeriods))
+        self._endTimesUs = array("q", bytes(8 * self._numCallbacks * self._numPeriods))
+        self._callCounts = array("q", bytes(8 * self._numCallbacks))
+        self._bodyCpuNs = 0
+        self._loops = 0
+        self._offsetsUs = [
+            int(CONFIG["offsetSpreadS"] * 1e6 * i / self._numCallbacks)
+            for i in range(self._numCallbacks)
+        ]
+        for i, offsetUs in enumerate(self._offsetsUs):
+            # Offsets are at least 1us so the callbacks run after the main loop
+            self.addPeriodic(
+                lambda i=i: self.benchCallback(i),
+                CONFIG["periodS"],
+                (offsetUs + 1) / 1e6,
+            )
+            self._offsetsUs[i] = offsetUs + 1
+
+    def benchCallback(self, index: int) -> None:
+        startUs = _getFPGATime()
+        if self._bodyCostUs:
+            cpuStartNs = time.thread_time_ns()
+            busyWaitUs(self._bodyCostUs)
+            self._bodyCpuNs += time.thread_time_ns() - cpuStartNs
+        count = self._callCounts[index]
+        if count < self._numPeriods:
+            sample = index * self._numPeriods + count
+            self._startTimesUs[sample] = startUs
+            self._endTimesUs[sample] = _getFPGATime()
+            self._callCounts[index] = count + 1
+
+    def robotInit(self):
+        self._cpuStartNs = time.process_time_ns()
+
+    def robotPeriodic(self):
+        self._loops += 1
+        if self._loops > self._numPeriods:
+            self.endCompetition()
+
+    def disabledPeriodic(self):
+        pass
+
+    def _simulationPeriodic(self):
+        pass
+
+    def endCompetition(self):
+        cpuNs = time.process_time_ns() - self._cpuStartNs
+        super().endCompetition()
+        self.writeResults(cpuNs)
+
+    def scheduledExpirationsUs(self, index: int, offsetUs: microsecondsAsInt) -> list:
+        """
+        :returns: the expiration each recorded call of callback index ran
+                  for, so that a call more than a period late is not
+                  mistaken for an on time call of a later period.
+
+        The first call lines the schedule up, startup delay is not skid.
+        After that a call is for the next period, unless the previous call
+        itself ran past it: then the scheduler coalesced, to the first
+        period after the call ended, or, for an implementation that
+        reschedules from the loop start, to the last one before this call.
+        """
+        periodUs = self._periodUs
+        base = index * self._numPeriods
+        startTimesUs = self._startTimesUs[base : base + self._callCounts[index]]
+        endTimesUs = self._endTimesUs[base : base + self._callCounts[index]]
+        firstUs = self._anchorUs + offsetUs + periodUs
+        expirationsUs = []
+        for call, startUs in enumerate(startTimesUs):
+            if call == 0:
+                expirationUs = firstUs + max(0, (startUs - firstUs) // periodUs) * periodUs
+            else:
+                previousUs = expirationsUs[-1]
+                expirationUs = previousUs + periodUs
+                previousEndUs = endTimesUs[call - 1]
+                if previousEndUs >= expirationUs:
+                    expirationUs = previousUs + ((previousEndUs - previousUs) // periodUs + 1) * periodUs
+                    if startUs < expirationUs:
+                        expirationUs = previousUs + ((startUs - previousUs) // periodUs) * periodUs
+            expirationsUs.append(expirationUs)
+        return expirationsUs
+
+    def writeResults(self, cpuNs: int) -> None:
+        skidsUs = []
+        intervalErrorsUs = []
+        for index, offsetUs in enumerate(self._offsetsUs):
+            base = index * self._numPeriods
+            startTimesUs = self._startTimesUs[base : base + self._callCounts[index]]
+            previousUs = None
+            for startUs, expirationUs in zip(
+                startTimesUs, self.scheduledExpirationsUs(index, offsetUs)
+            ):
+                skidsUs.append(startUs - expirationUs)
+                if previousUs is not None:
+                    intervalErrorsUs.append(startUs - previousUs - self._periodUs)
+                previousUs = startUs
+        skidsUs.sort()
+        result = {
+            "config": {key: value for key, value in CONFIG.items() if key != "output"},
+            "samples": len(skidsUs),
+            "skidP50Us": percentile(skidsUs, 0.50),
+            "skidP99Us": percentile(skidsUs, 0.99),
+            "skidMaxUs": skidsUs[-1] if skidsUs else 0,
+            "jitterUs": statistics.pstdev(intervalErrorsUs) if intervalErrorsUs else 0.0,
+            "schedulerCpuUsPerLoop": (cpuNs - self._bodyCpuNs) / 1000 / max(1, self._loops),
+        }
+        with open(CONFIG["output"], "a") as f:
+            f.write(json.dumps(result) + "\n")
@@ -0,0 +1,89 @@
+"""
+Compare the cost of one scheduler dispatch (peek, reschedule, siftupRoot)
+for the OrderedList heap and the TimingWheel as the number of callbacks
+grows.
+
+No notifier is involved: the simulated time simply jumps to the expiration
+of the earliest callback, so only the scheduler data structure is measured.
+
+    python benchscheduler.py
+"""
+import functools
+import random
+import time
+
+from timedrobotpy import _Callback, OrderedList, TimingWheel
+
+BASE_PERIODS_US = [5_000, 10_000, 20_000, 50_000, 100_000]
+CALLBACK_COUNTS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+NUM_DISPATCHES = 20_000
+# The best of several runs, so that noise does not flip which is fastest
+NUM_RUNS = 5
+
+SCHEDULERS = {
+    "OrderedList": OrderedList,
+    "TimingWheel": functools.partial(TimingWheel, resolutionUs=1000, numSlots=256),
+}
+
+
+def makeCallbacks(count: int, seed: int) -> list[_Callback]:
+    rng = random.Random(seed)
+    callbacks = []
+    for _ in range(count):
+        periodUs = rng.choice(BASE_PERIODS_US)
+        # Offsets are whole milliseconds, like the periods they shift.
+        offsetUs = rng.randrange(periodUs // 1000) * 1000
+        callbacks.append(_Callback(func=lambda: None, periodUs=periodUs, expirationUs=offsetUs))
+    return callbacks
+
+
+def timeDispatches(schedulerFactory, count: int) -> float:
+    """
+    :returns: mean microseconds per dispatch, of the fastest of NUM_RUNS runs.
+    """
+    queue = schedulerFactory()
+    for callback in makeCallbacks(count, seed=count):
+        queue.add(callback)
+
+    bestNs = None
+    for _ in range(NUM_RUNS):
+        startNs = time.perf_counter_ns()
+        for _ in range(NUM_DISPATCHES):
+            callback = queue.peek()
+            callback.setNextStartTimeUs(callback.expirationUs)
+            queue.siftupRoot()
+        elapsedNs = time.perf_counter_ns() - startNs
+        if bestNs is None or elapsedNs < bestNs:
+            bestNs = elapsedNs
+
+    return bestNs / NUM_DISPATCHES / 1000.0
+
+
+def main() -> None:
+    names = list(SCHEDULERS)
+    print(f"{'callbacks':>9} " + " ".join(f"{name:>14}" for name in names) + "  fastest")
+    fastestByCount = []
+    for count in CALLBACK_COUNTS:
+        results = {name: timeDispatches(factory, count) for name, factory in SCHEDULERS.items()}
+        fastest = min(results, key=results.get)
+        fastestByCount.append((count, fastest))
+        print(f"{count:>9} " + " ".join(f"{results[name]:>12.3f}us" for name in names) + f"  {fastest}")
+
+    # Each run of consecutive counts with the same fastest scheduler, a
+    # scheduler can win in the middle of the range and lose at both ends.
+    ranges = []
+    for count, fastest in fastestByCount:
+        if ranges and ranges[-1][0] == fastest:
+            ranges[-1][2] = count
+        else:
+            ranges.append([fastest, count, count])
+    if len(ranges) == 1:
+        print(f"no crossover, {ranges[0][0]} is fastest for every callback count")
+        return
+    for fastest, firstCount, lastCount in ranges:
+        print(f"{fastest} is fastest from {firstCount} to {lastCount} callbacks")
+    print("crossovers at about " + ", ".join(str(firstCount) for _, firstCount, _ in ranges[1:]) + " callbacks")
+
+
+if __name__ == "__main__":
+    main()
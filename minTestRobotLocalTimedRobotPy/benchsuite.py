@@ -0,0 +1,162 @@
+"""
+Sweep benchrobot.py across scheduler implementations and callback loads.
+
+Every combination of implementation, period, callback count, offset spread
+and callback cost runs in its own simulator process, and each run appends
+one JSON line to a results file.
+
+Each line carries the git commit, so results files from different commits
+can be compared, and --baseline flags configurations whose p99 start skid or
+scheduler CPU time grew by more than --tolerance.
+
+    python benchsuite.py --output results.jsonl
+    python benchsuite.py --output new.jsonl --baseline old.jsonl
+
+The C++ data point is wpilib.TimedRobot, whose scheduler is native.
+cppRobot's ExpTimedRobot only probes a single notifier alarm, it has no
+callback scheduler to compare.
+"""
+import argparse
+import itertools
+import json
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
+
+HERE = pathlib.Path(__file__).resolve().parent
+
+IMPLS = ["timedrobotpy", "wpilib.TimedRobotPy", "wpilib.TimedRobot"]
+PERIODS_S = [0.020, 0.010, 0.005]
+CALLBACK_COUNTS = [1, 10, 100, 1000]
+OFFSET_SPREADS_S = [0.0, 0.010]
+BODY_COSTS_US = [0, 100]
+
+COMPARED_METRICS = ["skidP99Us", "schedulerCpuUsPerLoop"]
+
+
+def gitCommit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def runOne(config: dict, timeoutS: float) -> dict:
+    """
+    Run benchrobot.py in the simulator with config.
+
+    :returns: the result line it wrote, or a dict with an "error" key.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        output = pathlib.Path(tmp) / "result.jsonl"
+        env = dict(os.environ)
+        env["TIMEDROBOT_BENCH_CONFIG"] = json.dumps({**config, "output": str(output)})
+        try:
+            completed = subprocess.run(
+                [sys.executable, "-m", "robotpy", "--main", "benchrobot.py", "sim", "--nogui"],
+                cwd=HERE,
+                env=env,
+                capture_output=True,
+                text=True,
+                timeout=timeoutS,
+            )
+        except subprocess.TimeoutExpired:
+            return {"config": config, "error": f"timed out after {timeoutS}s"}
+        if not output.exists():
+            lastLines = (completed.stdout + completed.stderr).strip().splitlines()[-5:]
+            return {"config": config, "error": "\n".join(lastLines)}
+        return json.loads(output.read_text().splitlines()[-1])
+
+
+def configKey(config: dict) -> str:
+    return json.dumps(config, sort_keys=True)
+
+
+def loadResults(path: str) -> dict:
+    results = {}
+    with open(path) as f:
+        for line in f:
+            result = json.loads(line)
+            if "error" not in result:
+                results[configKey(result["config"])] = result
+    return results
+
+
+def findRegressions(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for result in results:
+        old = baseline.get(configKey(result["config"]))
+        if old is None or "error" in result:
+            continue
+        for metric in COMPARED_METRICS:
+            if result[metric] > old[metric] * (1.0 + tolerance) and result[metric] - old[metric] > 1:
+                regressions.append(
+                    f"{metric} {old[metric]:.1f} -> {result[metric]:.1f} for {configKey(result['config'])}"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="bench_results.jsonl")
+    parser.add_argument("--impl", action="append", choices=IMPLS, help="default: all")
+    parser.add_argument("--callbacks", type=int, action="append", help=f"default: {CALLBACK_COUNTS}")
+    parser.add_argument("--offset-spread", type=float, action="append", help=f"default: {OFFSET_SPREADS_S}")
+    parser.add_argument("--body-cost", type=int, action="append", help=f"default: {BODY_COSTS_US}")
+    parser.add_argument("--period", type=float, action="append", help=f"default: {PERIODS_S}")
+    parser.add_argument("--periods", type=int, default=200, help="main loops per run")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds per run")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative growth")
+    args = parser.parse_args()
+
+    commit = gitCommit()
+    results = []
+    print(f"{'impl':>20} {'period':>6} {'callbacks':>9} {'spread':>6} {'cost':>5} {'p50':>7} {'p99':>7} {'max':>7} {'jitter':>7} {'cpu/loop':>9}")
+    with open(args.output, "a") as f:
+        for impl, period, count, spread, cost in itertools.product(
+            args.impl or IMPLS,
+            args.period or PERIODS_S,
+            args.callbacks or CALLBACK_COUNTS,
+            args.offset_spread or OFFSET_SPREADS_S,
+            args.body_cost or BODY_COSTS_US,
+        ):
+            config = {
+                "impl": impl,
+                "numCallbacks": count,
+                "periodS": period,
+                "offsetSpreadS": spread,
+                "bodyCostUs": cost,
+                "numPeriods": args.periods,
+            }
+            result = {**runOne(config, args.timeout), "commit": commit}
+            results.append(result)
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            if "error" in result:
+                print(f"{impl:>20} {period:>6} {count:>9} {spread:>6} {cost:>5} error: {result['error']}")
+            else:
+                print(
+                    f"{impl:>20} {period:>6} {count:>9} {spread:>6} {cost:>5} "
+                    f"{result['skidP50Us']:>7} {result['skidP99Us']:>7} {result['skidMaxUs']:>7} "
+                    f"{result['jitterUs']:>7.1f} {result['schedulerCpuUsPerLoop']:>9.1f}"
+                )
+
+    if args.baseline:
+        regressions = findRegressions(results, loadResults(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
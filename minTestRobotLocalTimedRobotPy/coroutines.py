@@ -0,0 +1,113 @@
+from concurrent.futures import CancelledError
+from typing import Any, Callable, Coroutine, Optional
+
+import wpimath.units
+
+microsecondsAsInt = int
+
+# The expiration of a scheduler entry with nothing to do
+kNeverUs = 2**62
+
+
+class _Sleep:
+    """
+    What a coroutine yields to TimedRobotPy to be resumed at a time: either
+    wakeUs, or durationUs after it was due to resume.
+    """
+
+    __slots__ = 'wakeUs', 'durationUs'
+
+    def __init__(
+        self,
+        wakeUs: Optional[microsecondsAsInt] = None,
+        durationUs: microsecondsAsInt = 0,
+    ) -> None:
+        self.wakeUs = wakeUs
+        self.durationUs = durationUs
+
+    def __await__(self):
+        yield self
+
+
+def sleep(duration: wpimath.units.seconds) -> _Sleep:
+    """
+    Awaitable that resumes a coroutine started with
+    TimedRobotPy.startCoroutine() duration seconds after it was due to
+    resume, so a loop of work and sleeps keeps its cadence.
+    """
+    return _Sleep(durationUs=int(duration * 1e6))
+
+
+def sleepUntilUs(timeUs: microsecondsAsInt) -> _Sleep:
+    """
+    Awaitable that resumes a coroutine started with
+    TimedRobotPy.startCoroutine() at the FPGA time timeUs.
+    """
+    return _Sleep(wakeUs=timeUs)
+
+
+class CoroutineTask:
+    """
+    A coroutine started with TimedRobotPy.startCoroutine().
+
+    Another coroutine can await it for its result.
+    """
+
+    __slots__ = (
+        'name', '_coro', '_cancel', 'wakeUs', '_done', '_cancelled',
+        '_result', '_exception', '_waiters',
+    )
+
+    def __init__(
+        self, coro: Coroutine, cancel: Callable[["CoroutineTask"], None]
+    ) -> None:
+        self.name = getattr(coro, "__qualname__", repr(coro))
+        self._coro = coro
+        self._cancel = cancel
+        self.wakeUs = kNeverUs
+        self._done = False
+        self._cancelled = False
+        self._result: Any = None
+        self._exception: Optional[BaseException] = None
+        self._waiters: list[CoroutineTask] = []
+
+    def done(self) -> bool:
+        return self._done
+
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def result(self) -> Any:
+        """
+        :returns: what the coroutine returned.
+
+        :raises: what the coroutine raised, CancelledError if it was
+                 cancelled, or RuntimeError if it has not finished.
+        """
+        if not self._done:
+            raise RuntimeError(f"{self.name} has not finished")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def cancel(self) -> bool:
+        """
+        Close the coroutine at the await it is suspended at, which runs its
+        finally blocks. Coroutines awaiting it get CancelledError.
+
+        :returns: False if it had already finished.
+        """
+        if self._done:
+            return False
+        self._cancel(self)
+        return True
+
+    def __await__(self):
+        if not self._done:
+            yield self
+        return self.result()
+
+    def __repr__(self) -> str:
+        state = "cancelled" if self._cancelled else "done" if self._done else f"wakeUs={self.wakeUs}"
+        return f"{{name={self.name}, {state}}}"
+
@@ -0,0 +1,130 @@
+import gc
+from typing import Callable
+
+microsecondsAsInt = int
+
+
+class GcStats:
+    """
+    Counts and times of the collections GcScheduler ran or deferred, indexed
+    by generation.
+    """
+
+    __slots__ = 'collections', 'deferred', 'totalUs', 'maxUs'
+
+    def __init__(self) -> None:
+        self.collections = [0, 0, 0]
+        self.deferred = [0, 0, 0]
+        self.totalUs = [0, 0, 0]
+        self.maxUs = [0, 0, 0]
+
+    def __repr__(self) -> str:
+        return (
+            f"{{collections={self.collections}, deferred={self.deferred}, "
+            f"totalUs={self.totalUs}, maxUs={self.maxUs}}}"
+        )
+
+
+class GcScheduler:
+    """
+    Takes the garbage collector away from the interpreter and runs it only in
+    the idle slack before the next notifier alarm.
+
+    The collector's own allocation counts and thresholds decide which
+    generation is due. A due collection runs only if the slack exceeds the
+    cost estimate for that generation, otherwise it is deferred, counted and
+    the next younger generation that is due is tried instead.
+    Full (generation 2) collections only run while allowFull is True, which
+    TimedRobotPy passes while the robot is disabled.
+
+    The cost estimate for a generation jumps up to any slower collection and
+    decays slowly towards faster ones, so it errs towards deferring. It also
+    decays each time the generation is deferred: automatic collection is off,
+    so an estimate left above any slack the loop has after one slow
+    collection would otherwise defer that generation forever.
+    """
+
+    kInitialEstimateUs = (500, 2_000, 10_000)
+    kEstimateDecay = 0.95
+
+    def __init__(
+        self,
+        getTimeUs: Callable[[], microsecondsAsInt],
+        marginUs: microsecondsAsInt = 200,
+    ) -> None:
+        """
+        :param getTimeUs: the clock used to time collections.
+        :param marginUs:  slack left over after a collection's estimated cost.
+        """
+        self._getTimeUs = getTimeUs
+        self._marginUs = marginUs
+        self.estimateUs = list(self.kInitialEstimateUs)
+        self.stats = GcStats()
+        self._fullCollectedWhileAllowed = False
+        self._wasEnabled = gc.isenabled()
+
+    def start(self) -> None:
+        self._wasEnabled = gc.isenabled()
+        gc.disable()
+
+    def stop(self) -> None:
+        if self._wasEnabled:
+            gc.enable()
+
+    def collectInSlack(self, slackUs: microsecondsAsInt, allowFull: bool) -> None:
+        """
+        Run the due collection if it fits in slackUs.
+
+        :param slackUs:   time until the next callback expires.
+        :param allowFull: whether a full collection may run, one is run as
+                          soon as it fits each time allowFull becomes True.
+        """
+        if not allowFull:
+            self._fullCollectedWhileAllowed = False
+
+        counts = gc.get_count()
+        thresholds = gc.get_threshold()
+        if allowFull and (not self._fullCollectedWhileAllowed or counts[2] >= thresholds[2]):
+            generation = 2
+        else:
+            generation = self._nextDueBelow(2, counts, thresholds)
+            if generation < 0:
+                return
+
+        # A due generation that does not fit falls back to the younger ones
+        # that are due themselves, so a deferred full collection does not
+        # hold up the young generations nor collect them more often.
+        while slackUs < self.estimateUs[generation] + self._marginUs:
+            self.stats.deferred[generation] += 1
+            self.estimateUs[generation] = int(
+                self.estimateUs[generation] * self.kEstimateDecay
+            )
+            generation = self._nextDueBelow(generation, counts, thresholds)
+            if generation < 0:
+                return
+
+        startUs = self._getTimeUs()
+        gc.collect(generation)
+        elapsedUs = self._getTimeUs() - startUs
+
+        if generation == 2:
+            self._fullCollectedWhileAllowed = True
+        self.estimateUs[generation] = max(
+            elapsedUs, int(self.estimateUs[generation] * self.kEstimateDecay)
+        )
+        stats = self.stats
+        stats.collections[generation] += 1
+        stats.totalUs[generation] += elapsedUs
+        if elapsedUs > stats.maxUs[generation]:
+            stats.maxUs[generation] = elapsedUs
+
+    @staticmethod
+    def _nextDueBelow(generation: int, counts: tuple, thresholds: tuple) -> int:
+        """
+        :returns: the oldest generation younger than generation whose count
+                  has reached its threshold, or -1 if there is none.
+        """
+        for younger in range(generation - 1, -1, -1):
+            if counts[younger] >= thresholds[younger]:
+                return younger
+        return -1
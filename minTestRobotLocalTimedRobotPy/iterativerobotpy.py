@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Callable, Optional
 
 from hal import (
     report,
@@ -14,7 +15,6 @@ from hal import (
 from ntcore import NetworkTableInstance
 from wpilib import (
     DriverStation,
-    DSControlWord,
     Watchdog,
     LiveWindow,
     RobotBase,
@@ -23,6 +23,9 @@ from wpilib import (
 )
 from wpilib.shuffleboard import Shuffleboard
 import wpimath.units
+from wpiutil import Sendable
+
+from telemetry import TelemetryStage, TelemetryWorker, neverIdle
 
 _kResourceType_SmartDashboard = tResourceType.kResourceType_SmartDashboard
 _kSmartDashboard_LiveWindow = tInstances.kSmartDashboard_LiveWindow
@@ -36,6 +39,67 @@ class IterativeRobotMode(Enum):
     kTest = 4
 
 
+# Looked up once: reading a member off the Enum class allocates on every
+# access, which the loop must not do.
+_kModeDisabled = IterativeRobotMode.kDisabled
+_kModeAutonomous = IterativeRobotMode.kAutonomous
+_kModeTeleop = IterativeRobotMode.kTeleop
+_kModeTest = IterativeRobotMode.kTest
+
+
+def _modeForControlState(
+    isEnabled: bool, isAutonomous: bool, isTest: bool
+) -> IterativeRobotMode:
+    if not isEnabled:
+        return _kModeDisabled
+    elif isAutonomous:
+        return _kModeAutonomous
+    elif isTest:
+        return _kModeTest
+    else:
+        return _kModeTeleop
+
+
+# Keyed by the (isEnabled, isAutonomous, isTest) tuple from getControlState()
+_kModeByControlState = {
+    (isEnabled, isAutonomous, isTest): _modeForControlState(
+        isEnabled, isAutonomous, isTest
+    )
+    for isEnabled in (False, True)
+    for isAutonomous in (False, True)
+    for isTest in (False, True)
+}
+
+
+def _doNothing() -> None:
+    pass
+
+
+class _ModeRecord:
+    """
+    Everything _loopFunc does for one mode, bound once when the mode is
+    entered so the loop does a single attribute lookup per step.
+    """
+
+    __slots__ = 'observe', 'init', 'periodic', 'exit', 'initEpoch', 'periodicEpoch'
+
+    def __init__(
+        self,
+        observe: Callable[[], None],
+        init: Callable[[], None],
+        periodic: Callable[[], None],
+        exit: Callable[[], None],
+        initEpoch: str,
+        periodicEpoch: str,
+    ) -> None:
+        self.observe = observe
+        self.init = init
+        self.periodic = periodic
+        self.exit = exit
+        self.initEpoch = initEpoch
+        self.periodicEpoch = periodicEpoch
+
+
 # todo should this be IterativeRobotPy or IterativeRobotBase (replacing) or IterativeRobotBasePy
 class IterativeRobotPy(RobotBase):
     """
@@ -91,6 +155,10 @@ class IterativeRobotPy(RobotBase):
         self._networkTableInstanceDefault = NetworkTableInstance.getDefault()
         self._mode: IterativeRobotMode = IterativeRobotMode.kNone
         self._lastMode: IterativeRobotMode = IterativeRobotMode.kNone
+        self._realtimeMode: bool = False
+        self._modeRecord: _ModeRecord = _ModeRecord(
+            _doNothing, _doNothing, _doNothing, _doNothing, "", ""
+        )
         self._ntFlushEnabled: bool = True
         self._lwEnabledInTest: bool = False
         self._calledDsConnected: bool = False
@@ -101,6 +169,35 @@ class IterativeRobotPy(RobotBase):
         self._autonomousPeriodicHasRun: bool = False
         self._teleopPeriodicHasRun: bool = False
         self._testPeriodicHasRun: bool = False
+        self._telemetryStages: dict[str, TelemetryStage] = {
+            stage.name: stage
+            for stage in (
+                TelemetryStage(
+                    "SmartDashboard",
+                    SmartDashboard.updateValues,
+                    "SmartDashboard.updateValues()",
+                    self._isSmartDashboardIdle,
+                    skipWhenIdle=False,
+                ),
+                TelemetryStage(
+                    "LiveWindow",
+                    LiveWindow.updateValues,
+                    "LiveWindow.updateValues()",
+                    self._isLiveWindowIdle,
+                ),
+                TelemetryStage(
+                    "Shuffleboard",
+                    Shuffleboard.update,
+                    "Shuffleboard.update()",
+                    neverIdle,
+                ),
+            )
+        }
+        self._telemetryStagesInOrder = tuple(self._telemetryStages.values())
+        self._telemetryWorker: Optional[TelemetryWorker] = None
+        # Sendables put with putSmartDashboardData(), SmartDashboard itself
+        # has no cheap way to tell whether it holds any.
+        self._smartDashboardSendableCount: int = 0
 
     def robotInit(self) -> None:
         """
@@ -309,12 +406,154 @@ class IterativeRobotPy(RobotBase):
         """
         return self._lwEnabledInTest
 
+    def enableRealtimeMode(self) -> None:
+        """
+        Has startCompetition() freeze the heap after robotInit(), so that
+        what robotInit() created is left out of every later collection.
+
+        The loop itself allocates nothing but the ints of the loop times,
+        with or without realtime mode, see tests/realtime_test.py. Handing
+        the NetworkTables flush to the background telemetry worker allocates.
+
+        Call this from the constructor or robotInit().
+        """
+        self._realtimeMode = True
+
+    def isRealtimeMode(self) -> bool:
+        return self._realtimeMode
+
+    def configureTelemetryStage(
+        self, name: str, everyNLoops: int = 1, skipWhenIdle: bool = True
+    ) -> None:
+        """
+        Sets how often a dashboard update runs at the end of the loop.
+
+        By default every stage runs every loop. LiveWindow is skipped while
+        it is idle, outside test mode. SmartDashboard is idle until a
+        sendable is put with putSmartDashboardData(), but is only skipped
+        then once configured with skipWhenIdle, since sendables put with
+        SmartDashboard.putData() directly are not counted. Shuffleboard is
+        never considered idle.
+
+        :param name:         "SmartDashboard", "LiveWindow" or "Shuffleboard".
+        :param everyNLoops:  run the stage once every this many loops.
+        :param skipWhenIdle: skip the stage while it has nothing to publish.
+        """
+        if name not in self._telemetryStages:
+            raise ValueError(
+                f"unknown telemetry stage {name}, expected one of {list(self._telemetryStages)}"
+            )
+        self._telemetryStages[name].configure(everyNLoops, skipWhenIdle)
+
+    def enableBackgroundTelemetry(self) -> None:
+        """
+        Flushes NetworkTables on a background thread instead of at the end
+        of every loop.
+
+        The dashboard updates still run in the loop, so sendables are only
+        read from the robot code's thread. A flush requested while the
+        previous one is still waiting is merged into it, see
+        getDroppedTelemetryCount().
+        """
+        if self._telemetryWorker is None:
+            self._telemetryWorker = TelemetryWorker(
+                self._networkTableInstanceDefault.flushLocal
+            )
+
+    def getDroppedTelemetryCount(self) -> int:
+        """
+        The number of loops whose NetworkTables flush was merged into the
+        previous loop's because the background worker had not started it yet.
+        """
+        if self._telemetryWorker is None:
+            return 0
+        return self._telemetryWorker.coalescedFlushes
+
+    def _stopBackgroundTelemetry(self) -> None:
+        # The stopped worker is kept so its counts can still be read.
+        if self._telemetryWorker is not None:
+            self._telemetryWorker.stop()
+
+    def putSmartDashboardData(self, key: str, data: Sendable) -> None:
+        """
+        Put data on the SmartDashboard with SmartDashboard.putData() and
+        count it, so that the SmartDashboard stage is no longer idle, see
+        configureTelemetryStage().
+
+        :param key:  the dashboard key.
+        :param data: the sendable to publish.
+        """
+        SmartDashboard.putData(key, data)
+        self._smartDashboardSendableCount += 1
+
+    def _isSmartDashboardIdle(self) -> bool:
+        # updateValues() only refreshes sendables, values put with
+        # putNumber() and the like are published as they are put.
+        return not self._smartDashboardSendableCount
+
+    def _isLiveWindowIdle(self) -> bool:
+        return self._mode is not _kModeTest
+
     def getPeriod(self) -> wpimath.units.seconds:
         """
         Gets time period between calls to Periodic() functions.
         """
         return self._periodS
 
+    def _makeModeRecord(self, mode: IterativeRobotMode) -> _ModeRecord:
+        """
+        Bind the functions _loopFunc calls in mode.
+        """
+        if mode is IterativeRobotMode.kDisabled:
+            return _ModeRecord(
+                observeUserProgramDisabled,
+                self.disabledInit,
+                self.disabledPeriodic,
+                self.disabledExit,
+                "disabledInit()",
+                "disabledPeriodic()",
+            )
+        elif mode is IterativeRobotMode.kAutonomous:
+            return _ModeRecord(
+                observeUserProgramAutonomous,
+                self.autonomousInit,
+                self.autonomousPeriodic,
+                self.autonomousExit,
+                "autonomousInit()",
+                "autonomousPeriodic()",
+            )
+        elif mode is IterativeRobotMode.kTeleop:
+            return _ModeRecord(
+                observeUserProgramTeleop,
+                self.teleopInit,
+                self.teleopPeriodic,
+                self.teleopExit,
+                "teleopInit()",
+                "teleopPeriodic()",
+            )
+        elif mode is IterativeRobotMode.kTest:
+            # enableLiveWindowInTest() can't be called in test mode, so
+            # self._lwEnabledInTest holds from testInit() to testExit().
+            return _ModeRecord(
+                observeUserProgramTest,
+                self._testInitWithLiveWindow if self._lwEnabledInTest else self.testInit,
+                self.testPeriodic,
+                self._testExitWithLiveWindow if self._lwEnabledInTest else self.testExit,
+                "testInit()",
+                "testPeriodic()",
+            )
+        raise ValueError(f"no mode record for {mode}")
+
+    def _testInitWithLiveWindow(self) -> None:
+        LiveWindow.setEnabled(True)
+        Shuffleboard.enableActuatorWidgets()
+        self.testInit()
+
+    def _testExitWithLiveWindow(self) -> None:
+        LiveWindow.setEnabled(False)
+        Shuffleboard.disableActuatorWidgets()
+        self.testExit()
+
     def _loopFunc(self) -> None:
         """
         Loop function.
@@ -322,133 +561,40 @@ class IterativeRobotPy(RobotBase):
         DriverStation.refreshData()
         self.watchdog.reset()
 
-        isEnabled, isAutonomous, isTest = self.getControlState()
-        if not isEnabled:
-            self._mode = IterativeRobotMode.kDisabled
-        elif isAutonomous:
-            self._mode = IterativeRobotMode.kAutonomous
-        elif isTest:
-            self._mode = IterativeRobotMode.kTest
-        else:
-            self._mode = IterativeRobotMode.kTeleop
-
-        if not self._calledDsConnected and DSControlWord().isDSAttached():
+        self._mode = _kModeByControlState[self.getControlState()]
+
+        if not self._calledDsConnected and DriverStation.isDSAttached():
             self._calledDsConnected = True
             self.driverStationConnected()
 
         # If self._mode changed, call self._mode exit and entry functions
         if self._lastMode is not self._mode:
-
-            if self._lastMode is IterativeRobotMode.kDisabled:
-                self.disabledExit()
-            elif self._lastMode is IterativeRobotMode.kAutonomous:
-                self.autonomousExit()
-            elif self._lastMode is IterativeRobotMode.kTeleop:
-                self.teleopExit()
-            elif self._lastMode is IterativeRobotMode.kTest:
-                if self._lwEnabledInTest:
-                    LiveWindow.setEnabled(False)
-                    Shuffleboard.disableActuatorWidgets()
-                self.testExit()
-            """
-            todo switch to match statements when we don't build with python 3.9
-            match self._lastMode:
-                case IterativeRobotMode.kDisabled:
-                    self.disabledExit()
-                case IterativeRobotMode.kAutonomous:
-                    self.autonomousExit()
-                case IterativeRobotMode.kTeleop:
-                    self.teleopExit()
-                case IterativeRobotMode.kTest:
-                    if self._lwEnabledInTest:
-                        LiveWindow.setEnabled(False)
-                        Shuffleboard.disableActuatorWidgets()
-                    self.testExit()
-            """
-
-            if self._mode is IterativeRobotMode.kDisabled:
-                self.disabledInit()
-                self.watchdog.addEpoch("disabledInit()")
-            elif self._mode is IterativeRobotMode.kAutonomous:
-                self.autonomousInit()
-                self.watchdog.addEpoch("autonomousInit()")
-            elif self._mode is IterativeRobotMode.kTeleop:
-                self.teleopInit()
-                self.watchdog.addEpoch("teleopInit()")
-            elif self._mode is IterativeRobotMode.kTest:
-                if self._lwEnabledInTest:
-                    LiveWindow.setEnabled(True)
-                    Shuffleboard.enableActuatorWidgets()
-                self.testInit()
-                self.watchdog.addEpoch("testInit()")
-            """
-            match self._mode:
-                case IterativeRobotMode.kDisabled:
-                    self.disabledInit()
-                    self._watchdog.addEpoch("disabledInit()")
-                case IterativeRobotMode.kAutonomous:
-                    self.autonomousInit()
-                    self._watchdog.addEpoch("autonomousInit()")
-                case IterativeRobotMode.kTeleop:
-                    self.teleopInit()
-                    self._watchdog.addEpoch("teleopInit()")
-                case IterativeRobotMode.kTest:
-                    if self._lwEnabledInTest:
-                        LiveWindow.setEnabled(True)
-                        Shuffleboard.enableActuatorWidgets()
-                    self.testInit()
-                    self._watchdog.addEpoch("testInit()")
-            """
+            self._modeRecord.exit()
+            self._modeRecord = self._makeModeRecord(self._mode)
+            self._modeRecord.init()
+            self.watchdog.addEpoch(self._modeRecord.initEpoch)
             self._lastMode = self._mode
 
         # Call the appropriate function depending upon the current robot mode
-        if self._mode is IterativeRobotMode.kDisabled:
-            observeUserProgramDisabled()
-            self.disabledPeriodic()
-            self.watchdog.addEpoch("disabledPeriodic()")
-        elif self._mode is IterativeRobotMode.kAutonomous:
-            observeUserProgramAutonomous()
-            self.autonomousPeriodic()
-            self.watchdog.addEpoch("autonomousPeriodic()")
-        elif self._mode is IterativeRobotMode.kTeleop:
-            observeUserProgramTeleop()
-            self.teleopPeriodic()
-            self.watchdog.addEpoch("teleopPeriodic()")
-        elif self._mode is IterativeRobotMode.kTest:
-            observeUserProgramTest()
-            self.testPeriodic()
-            self.watchdog.addEpoch("testPeriodic()")
-        """
-        match self._mode:
-            case IterativeRobotMode.kDisabled:
-                observeUserProgramDisabled()
-                self.disabledPeriodic()
-                self.watchdog.addEpoch("disabledPeriodic()")
-            case IterativeRobotMode.kAutonomous:
-                observeUserProgramAutonomous()
-                self.autonomousPeriodic()
-                self.watchdog.addEpoch("autonomousPeriodic()")
-            case IterativeRobotMode.kTeleop:
-                observeUserProgramTeleop()
-                self.teleopPeriodic()
-                self.watchdog.addEpoch("teleopPeriodic()")
-            case IterativeRobotMode.kTest:
-                observeUserProgramTest()
-                self.testPeriodic()
-                self.watchdog.addEpoch("testPeriodic()")
-        """
+        modeRecord = self._modeRecord
+        modeRecord.observe()
+        modeRecord.periodic()
+        self.watchdog.addEpoch(modeRecord.periodicEpoch)
 
         self.robotPeriodic()
         self.watchdog.addEpoch("robotPeriodic()")
 
-        SmartDashboard.updateValues()
-        self.watchdog.addEpoch("SmartDashboard.updateValues()")
-
-        LiveWindow.updateValues()
-        self.watchdog.addEpoch("LiveWindow.updateValues()")
-
-        Shuffleboard.update()
-        self.watchdog.addEpoch("Shuffleboard.update()")
+        # Unpacked rather than iterated over, which would allocate an
+        # iterator every loop.
+        smartDashboardStage, liveWindowStage, shuffleboardStage = (
+            self._telemetryStagesInOrder
+        )
+        if smartDashboardStage.isDue():
+            smartDashboardStage.run(self.watchdog)
+        if liveWindowStage.isDue():
+            liveWindowStage.run(self.watchdog)
+        if shuffleboardStage.isDue():
+            shuffleboardStage.run(self.watchdog)
 
         if self.isSimulation():
             simPeriodicBefore()
@@ -460,7 +606,11 @@ class IterativeRobotPy(RobotBase):
 
         # Flush NetworkTables
         if self._ntFlushEnabled:
-            self._networkTableInstanceDefault.flushLocal()
+            telemetryWorker = self._telemetryWorker
+            if telemetryWorker is None:
+                self._networkTableInstanceDefault.flushLocal()
+            else:
+                telemetryWorker.requestFlush()
 
         # Warn on loop time overruns
         if self.watchdog.isExpired():
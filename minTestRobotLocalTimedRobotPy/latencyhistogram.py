@@ -0,0 +1,101 @@
+from array import array
+
+microsecondsAsInt = int
+
+
+class LatencyHistogram:
+    """
+    A fixed-bucket histogram of microsecond latencies.
+
+    The bucket counts are a preallocated array, so record() allocates
+    nothing beyond the ints it adds. Values below zero land in the first
+    bucket and values past the last bucket land in the last bucket, which
+    therefore also counts overflows.
+    """
+
+    __slots__ = 'bucketWidthUs', 'counts', 'count', 'totalUs', 'maxUs'
+
+    def __init__(self, bucketWidthUs: microsecondsAsInt, numBuckets: int) -> None:
+        if bucketWidthUs < 1 or numBuckets < 1:
+            raise ValueError(
+                f"bucketWidthUs={bucketWidthUs} and numBuckets={numBuckets} must be positive"
+            )
+        self.bucketWidthUs = bucketWidthUs
+        self.counts = array('q', bytes(8 * numBuckets))
+        self.count = 0
+        self.totalUs = 0
+        self.maxUs = 0
+
+    def record(self, valueUs: microsecondsAsInt) -> None:
+        counts = self.counts
+        index = valueUs // self.bucketWidthUs
+        if index >= len(counts):
+            index = len(counts) - 1
+        elif index < 0:
+            index = 0
+        counts[index] += 1
+        self.count += 1
+        self.totalUs += valueUs
+        if valueUs > self.maxUs:
+            self.maxUs = valueUs
+
+    def percentileUs(self, fraction: float) -> microsecondsAsInt:
+        """
+        :param fraction: 0.5 for the median, 0.99 for p99, ...
+
+        :returns: the upper edge of the bucket holding that fraction of the
+                  samples, or 0 when there are none.
+        """
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return (index + 1) * self.bucketWidthUs
+        return 0
+
+    def meanUs(self) -> float:
+        return self.totalUs / self.count if self.count else 0.0
+
+    def toDict(self) -> dict:
+        return {
+            "bucketWidthUs": self.bucketWidthUs,
+            "counts": list(self.counts),
+            "count": self.count,
+            "meanUs": self.meanUs(),
+            "maxUs": self.maxUs,
+            "p50Us": self.percentileUs(0.50),
+            "p99Us": self.percentileUs(0.99),
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"{{count={self.count}, meanUs={self.meanUs():.1f}, "
+            f"p50Us={self.percentileUs(0.50)}, p99Us={self.percentileUs(0.99)}, maxUs={self.maxUs}}}"
+        )
+
+
+class CallbackHistograms:
+    """
+    The start skid (start time minus scheduled expiration) and execution time
+    histograms of one callback.
+    """
+
+    __slots__ = 'name', 'skid', 'execution'
+
+    def __init__(
+        self, name: str, bucketWidthUs: microsecondsAsInt, numBuckets: int
+    ) -> None:
+        self.name = name
+        self.skid = LatencyHistogram(bucketWidthUs, numBuckets)
+        self.execution = LatencyHistogram(bucketWidthUs, numBuckets)
+
+    def toDict(self) -> dict:
+        return {
+            "name": self.name,
+            "skid": self.skid.toDict(),
+            "execution": self.execution.toDict(),
+        }
+
+    def __repr__(self) -> str:
+        return f"{{name={self.name}, skid={self.skid}, execution={self.execution}}}"
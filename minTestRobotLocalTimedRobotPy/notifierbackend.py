@@ -0,0 +1,95 @@
+import time
+
+import hal
+from wpilib import RobotController
+
+microsecondsAsInt = int
+
+
+class HalNotifierBackend:
+    """
+    The FPGA clock and the HAL notifier, which TimedRobotPy uses by default.
+
+    A backend provides getTimeUs() and the notifier functions TimedRobotPy
+    calls, with the same arguments and return values as their hal
+    counterparts.
+    """
+
+    getTimeUs = staticmethod(RobotController.getFPGATime)
+    initializeNotifier = staticmethod(hal.initializeNotifier)
+    setNotifierName = staticmethod(hal.setNotifierName)
+    updateNotifierAlarm = staticmethod(hal.updateNotifierAlarm)
+    waitForNotifierAlarm = staticmethod(hal.waitForNotifierAlarm)
+    stopNotifier = staticmethod(hal.stopNotifier)
+
+
+class SimulatedTimeBackend:
+    """
+    A virtual clock and notifier, so that TimedRobotPy runs as fast as its
+    callbacks allow instead of in real time.
+
+    waitForNotifierAlarm() returns at once, jumping the virtual clock to the
+    alarm time plus wakeSkidUs. Between waits the virtual clock advances with
+    the real time the callbacks take (scaled by executionTimeScale, 0 freezes
+    it) and with any advanceUs() calls, so overruns and skid statistics
+    still reflect what the callbacks cost.
+
+    Only TimedRobotPy's own time reads use this clock: wpilib objects such as
+    the Watchdog keep using real time.
+    """
+
+    def __init__(
+        self,
+        startTimeUs: microsecondsAsInt = 0,
+        executionTimeScale: float = 1.0,
+        wakeSkidUs: microsecondsAsInt = 0,
+    ) -> None:
+        """
+        :param startTimeUs:        the virtual time when the backend is created.
+        :param executionTimeScale: virtual microseconds per real microsecond
+                                   of callback execution.
+        :param wakeSkidUs:         how late after the alarm each wait returns,
+                                   about 60 on a roboRIO 2.
+        """
+        self._baseUs = startTimeUs
+        self._realBaseNs = time.perf_counter_ns()
+        self._executionTimeScale = executionTimeScale
+        self._wakeSkidUs = wakeSkidUs
+        self._alarmUs = startTimeUs
+        self._stopped = False
+
+    def getTimeUs(self) -> microsecondsAsInt:
+        if not self._executionTimeScale:
+            return self._baseUs
+        elapsedNs = time.perf_counter_ns() - self._realBaseNs
+        return self._baseUs + int(elapsedNs * self._executionTimeScale) // 1000
+
+    def advanceUs(self, durationUs: microsecondsAsInt) -> None:
+        """
+        Move the virtual clock forward, for a callback to simulate its cost.
+        """
+        self._baseUs += durationUs
+
+    def initializeNotifier(self) -> tuple[int, int]:
+        return 1, 0
+
+    def setNotifierName(self, notifier: int, name: str) -> int:
+        return 0
+
+    def updateNotifierAlarm(
+        self, notifier: int, triggerTimeUs: microsecondsAsInt
+    ) -> int:
+        self._alarmUs = triggerTimeUs
+        return 0
+
+    def waitForNotifierAlarm(self, notifier: int) -> tuple[int, int]:
+        # Like the HAL, a stopped notifier returns a time of 0
+        if self._stopped:
+            return 0, 0
+        nowUs = max(self.getTimeUs(), self._alarmUs + self._wakeSkidUs)
+        self._baseUs = nowUs
+        self._realBaseNs = time.perf_counter_ns()
+        return nowUs, 0
+
+    def stopNotifier(self, notifier: int) -> None:
+        self._stopped = True
@@ -0,0 +1,100 @@
+from concurrent.futures import Executor, Future
+from enum import Enum
+from typing import Callable, Optional
+
+from wpilib import reportError
+
+
+class ExecutionClass(Enum):
+    """
+    Where addPeriodic() runs a callback.
+    """
+
+    # On the notifier thread, in line with the main loop. Only inline
+    # callbacks have TimedRobotPy's timing guarantees.
+    kInline = 0
+    # Submitted to a thread pool when due, for slow work such as logging that
+    # spends its time outside the interpreter lock.
+    kThreadPool = 1
+    # Submitted to a process pool when due, for slow python work such as
+    # vision processing. The callback and its arguments must be picklable,
+    # so a module level function rather than a lambda or bound method of the
+    # robot.
+    kProcessPool = 2
+
+
+class OverlapPolicy(Enum):
+    """
+    What an offloaded callback does when it is due while its previous
+    invocation has not finished.
+    """
+
+    # Drop this invocation.
+    kSkip = 0
+    # Submit it anyway, it runs once the executor gets to it.
+    kQueue = 1
+    # Cancel the previous invocation if it has not started yet, and submit
+    # this one. An invocation that already started runs to completion.
+    kCancel = 2
+
+
+class OffloadedCallback:
+    """
+    Called by the scheduler when the callback is due, submits it to an
+    executor instead of running it.
+
+    Its repr() names the callback, for the histograms and scheduler events
+    that name functions.
+    """
+
+    __slots__ = (
+        'func', 'name', '_getExecutor', 'overlapPolicy', '_future',
+        'submitted', 'skipped', 'cancelled', 'failed',
+    )
+
+    def __init__(
+        self,
+        func: Callable[..., None],
+        getExecutor: Callable[[], Executor],
+        overlapPolicy: OverlapPolicy,
+    ) -> None:
+        """
+        :param func:          the callback.
+        :param getExecutor:   returns the executor, which is created on first use.
+        :param overlapPolicy: see OverlapPolicy.
+        """
+        self.func = func
+        self.name = getattr(func, "__qualname__", repr(func))
+        self._getExecutor = getExecutor
+        self.overlapPolicy = overlapPolicy
+        self._future: Optional[Future] = None
+        self.submitted = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.failed = 0
+
+    def __call__(self, *args) -> None:
+        future = self._future
+        if future is not None and not future.done():
+            if self.overlapPolicy is OverlapPolicy.kSkip:
+                self.skipped += 1
+                return
+            if self.overlapPolicy is OverlapPolicy.kCancel and future.cancel():
+                self.cancelled += 1
+        future = self._getExecutor().submit(self.func, *args)
+        future.add_done_callback(self._reportFailure)
+        self._future = future
+        self.submitted += 1
+
+    def _reportFailure(self, future: Future) -> None:
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            self.failed += 1
+            reportError(
+                f"offloaded callback {self.name} raised {exception!r}", False
+            )
+
+    def __repr__(self) -> str:
+        return f"offloaded {self.name}"
@@ -2,6 +2,9 @@ import gc
 import sys
 
 from wpilib import RobotController
+
+from calllog import CallLogRecorder
+from tracing import Tracer
 from timedrobotpy import TimedRobotPy
 from wpilib.timedrobotpy import TimedRobotPy
 from wpilib import TimedRobot
@@ -11,29 +14,9 @@ _getFPGATime = RobotController.getFPGATime
 microsecondsAsInt = int
 
 PRINT_ENTRY_EXIT = False
-if PRINT_ENTRY_EXIT:
-    def printEntry(name, startTimeUs:microsecondsAsInt):
-        print(f"{startTimeUs/1000_000.0:.6f}:Enter:{name}")
-
-    def printExit(name):
-        print(f"{_getFPGATime()/1000_000.0:.6f}:Exit :{name}")
-else:
-    def printEntry(name, startTimeUs):
-        pass
-    def printExit(name):
-        pass
-
-
-def printEntryAndExit(func):
-    def wrapper(*args, **kwargs):
-        name = args[1]
-        startTimeUs = _getFPGATime()
-        args[0].addCallLog(name,startTimeUs)
-        printEntry(name, startTimeUs)
-        result = func(*args, **kwargs)
-        printExit(name)
-        return result
-    return wrapper
+# Set TRACE_PATH to export a Chrome trace-event (Perfetto) timeline
+TRACE_PATH = None
+tracer = Tracer(enabled=PRINT_ENTRY_EXIT or TRACE_PATH is not None)
 
 RobotParentClass = TimedRobotPy
 USE_TIMEDROBOT = False
@@ -43,17 +26,16 @@ if USE_TIMEDROBOT:
 NUM_TEST_PERIODIC = 2
 NUM_PERIODS = 1000
 
-class MyRobot(RobotParentClass):
+# Set CALL_LOG_PATH to stream the call log to a file for offline analysis
+CALL_LOG_PATH = None
+CALL_LOG_MMAP = False
 
-    def addCallLog(self, name, timeUs):
-        if self._callCount[name] < NUM_PERIODS:
-            self._callTimesUs[name] += timeUs
-            self._callCount[name] +=1
+class MyRobot(RobotParentClass):
 
-    @printEntryAndExit
-    def testPeriodic(self,name):
+    def testPeriodic(self,nameId):
+        self._callLog.record(nameId, _getFPGATime())
         if PRINT_ENTRY_EXIT:
-            print(f"testPeriodic({name})")
+            print(f"testPeriodic({self._callLog.names[nameId]})")
         pass
 
     def startCompetition(self):
@@ -61,30 +43,36 @@ class MyRobot(RobotParentClass):
 
     def endCompetition(self):
         super().endCompetition()
-        avgDeltaCallTimesUs = {}
-        commonCallCount = self._callCount['loopStartTime']
+        callTimesUs = {name: timesUs[:NUM_PERIODS] for name, timesUs in self._callLog.timesByName().items()}
+        self._callLog.close()
+        loopStartTimesUs = callTimesUs['loopStartTime']
+        commonCallCount = len(loopStartTimesUs)
         print(f"commonCallCount={commonCallCount}")
-        for name, value in self._callTimesUs.items():
-            assert commonCallCount == self._callCount[name]
-            avgDeltaCallTimesUs[name] = (self._callTimesUs[name]-self._callTimesUs['loopStartTime'])/self._callCount[name]
-            print(f'avgDeltaCallTimesUs[{name}]={avgDeltaCallTimesUs[name]}')
+        for name, timesUs in callTimesUs.items():
+            assert commonCallCount == len(timesUs)
+            deltaCallTimesUs = sorted(timeUs - loopStartTimeUs for timeUs, loopStartTimeUs in zip(timesUs, loopStartTimesUs))
+            avgDeltaCallTimeUs = sum(deltaCallTimesUs)/commonCallCount
+            p99DeltaCallTimeUs = deltaCallTimesUs[min(commonCallCount - 1, int(0.99*commonCallCount))]
+            print(f'avgDeltaCallTimesUs[{name}]={avgDeltaCallTimeUs} '
+                  f'p50={deltaCallTimesUs[commonCallCount//2]} p99={p99DeltaCallTimeUs} max={deltaCallTimesUs[-1]}')
+        if PRINT_ENTRY_EXIT:
+            tracer.printEvents()
+        if TRACE_PATH is not None:
+            tracer.exportChromeTrace(TRACE_PATH)
 
     def robotInit(self):
         self.count = 0
-        self._callTimesUs = {}
-        self._callCount = {}
-        self._callTimesUs['loopStartTime'] = 0
-        self._callTimesUs['disabledPeriodic'] = 0
-        self._callTimesUs['robotPeriodic'] = 0
-        self._callCount['loopStartTime'] = 0
-        self._callCount['disabledPeriodic'] = 0
-        self._callCount['robotPeriodic'] = 0
+        # Room for every call of every loop, with a couple of loops to spare
+        self._callLog = CallLogRecorder(capacity=(NUM_TEST_PERIODIC+3)*(NUM_PERIODS+2),
+                                        path=CALL_LOG_PATH, useMmap=CALL_LOG_MMAP)
+        self._loopStartTimeId = self._callLog.intern('loopStartTime')
+        self._disabledPeriodicId = self._callLog.intern('disabledPeriodic')
+        self._robotPeriodicId = self._callLog.intern('robotPeriodic')
         for i in range(NUM_TEST_PERIODIC):
-            name = f"{i}"
-            self.addPeriodic(lambda current_name=name: self.testPeriodic(f"{current_name}"),
+            nameId = self._callLog.intern(f"{i}")
+            self.addPeriodic(tracer.trace(lambda current_nameId=nameId: self.testPeriodic(current_nameId),
+                                          name=f"testPeriodic({i})"),
                              0.020, 0.000_001+0.000_001*i)
-            self._callTimesUs[name] = 0
-            self._callCount[name] = 0
         print(f"robotInit Done RobotParentClass={RobotParentClass.__name__}")
         if not USE_TIMEDROBOT:
             print(f"self._callbacks={type(self._callbacks).__name__}")
@@ -93,16 +81,14 @@ class MyRobot(RobotParentClass):
 
 
 
-    @printEntryAndExit
-    def robotPeriodicBody(self, name):
+    @tracer.trace
+    def robotPeriodic(self):
+        self._callLog.record(self._robotPeriodicId, _getFPGATime())
         self.count += 1
-        self.addCallLog('loopStartTime',self.getLoopStartTime())
+        self._callLog.record(self._loopStartTimeId, self.getLoopStartTime())
         if self.count > NUM_PERIODS:
             self.endCompetition()
 
-    def robotPeriodic(self):
-        self.robotPeriodicBody('robotPeriodic')
-
     def autonomousInit(self):
         pass
 
@@ -115,12 +101,9 @@ class MyRobot(RobotParentClass):
     def disabledInit(self):
         pass
 
-    @printEntryAndExit
-    def disabledPeriodicBody(self, name):
-        pass
-
+    @tracer.trace
     def disabledPeriodic(self):
-        self.disabledPeriodicBody('disabledPeriodic')
+        self._callLog.record(self._disabledPeriodicId, _getFPGATime())
 
     def disabledExit(self):
         pass
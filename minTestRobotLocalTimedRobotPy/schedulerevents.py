@@ -0,0 +1,178 @@
+from array import array
+import json
+from typing import Any, Callable
+
+microsecondsAsInt = int
+
+# Event kinds, each event is four int64 words: kind, timeUs, a, b
+kAlarmSet = 0  # a: the requested alarm time
+kWake = 1  # a: the requested alarm time, b: skid from it to timeUs
+kCallbackStart = 2  # a: callback id, b: its scheduled expiration
+kCallbackEnd = 3  # a: callback id
+kReschedule = 4  # a: callback id, b: its next expiration
+kOverrunSkip = 5  # a: callback id, b: periods skipped
+kDeadlineSkip = 6  # a: callback id, b: how late it was when skipped
+
+_kWordsPerEvent = 4
+
+_kKindNames = {
+    kAlarmSet: "alarm set",
+    kWake: "wake",
+    kCallbackStart: "callback start",
+    kCallbackEnd: "callback end",
+    kReschedule: "reschedule",
+    kOverrunSkip: "overrun skip",
+    kDeadlineSkip: "deadline skip",
+}
+
+
+class SchedulerEventRing:
+    """
+    A fixed-size ring of the latest scheduler events, for a timeline of what
+    TimedRobotPy's loop did around a skid or an overrun.
+
+    Events are four ints in a preallocated array('q'), so recording one
+    allocates nothing beyond the ints it stores. Callbacks are recorded by
+    id, see callbackId().
+    """
+
+    __slots__ = 'capacity', '_words', '_index', 'count', 'callbackNames', '_callbackIds'
+
+    def __init__(self, capacity: int = 4096) -> None:
+        """
+        :param capacity: events kept.
+        """
+        if capacity < 1:
+            raise ValueError(f"capacity={capacity} must be positive")
+        self.capacity = capacity
+        self._words = array('q', bytes(8 * _kWordsPerEvent * capacity))
+        self._index = 0
+        self.count = 0
+        self.callbackNames: list[str] = []
+        self._callbackIds: dict[Any, int] = {}
+
+    def record(self, kind: int, timeUs: microsecondsAsInt, a: int = 0, b: int = 0) -> None:
+        index = self._index
+        words = self._words
+        words[index] = kind
+        words[index + 1] = timeUs
+        words[index + 2] = a
+        words[index + 3] = b
+        index += _kWordsPerEvent
+        self._index = 0 if index == len(words) else index
+        self.count += 1
+
+    def callbackId(self, callback: Any) -> int:
+        """
+        :param callback: a scheduler entry, named after the functions it runs.
+        """
+        callbackId = self._callbackIds.get(callback)
+        if callbackId is None:
+            funcs = callback.userFuncs()
+            callbackId = self._callbackIds[callback] = len(self.callbackNames)
+            self.callbackNames.append(
+                ", ".join(getattr(func, "__qualname__", repr(func)) for func in funcs)
+            )
+        return callbackId
+
+    def wrapNotifier(
+        self,
+        getTimeUs: Callable[[], microsecondsAsInt],
+        updateNotifierAlarm: Callable[[int, microsecondsAsInt], int],
+        waitForNotifierAlarm: Callable[[int], tuple[int, int]],
+    ) -> tuple[Callable[[int, microsecondsAsInt], int], Callable[[int], tuple[int, int]]]:
+        """
+        :returns: updateNotifierAlarm and waitForNotifierAlarm, wrapped to
+                  record alarm set and wake events.
+        """
+        record = self.record
+        requestedUs = [0]
+
+        def recordingUpdateNotifierAlarm(notifier: int, triggerTimeUs: microsecondsAsInt) -> int:
+            requestedUs[0] = triggerTimeUs
+            record(kAlarmSet, getTimeUs(), triggerTimeUs)
+            return updateNotifierAlarm(notifier, triggerTimeUs)
+
+        def recordingWaitForNotifierAlarm(notifier: int) -> tuple[int, int]:
+            wakeUs, status = waitForNotifierAlarm(notifier)
+            if wakeUs:
+                record(kWake, wakeUs, requestedUs[0], wakeUs - requestedUs[0])
+            return wakeUs, status
+
+        return recordingUpdateNotifierAlarm, recordingWaitForNotifierAlarm
+
+    def copy(self) -> "SchedulerEventRing":
+        """
+        :returns: a copy of the ring as it is now, which another thread can
+                  dump() while this one keeps recording.
+        """
+        ring = SchedulerEventRing.__new__(SchedulerEventRing)
+        ring.capacity = self.capacity
+        ring._words = self._words[:]
+        ring._index = self._index
+        ring.count = self.count
+        ring.callbackNames = list(self.callbackNames)
+        ring._callbackIds = dict(self._callbackIds)
+        return ring
+
+    def events(self) -> list[tuple[int, microsecondsAsInt, int, int]]:
+        """
+        :returns: (kind, timeUs, a, b) for the events in the ring, oldest first.
+        """
+        words = self._words
+        if self.count > self.capacity:
+            words = words[self._index :] + words[: self._index]
+        else:
+            words = words[: self._index]
+        return [
+            tuple(words[index : index + _kWordsPerEvent])
+            for index in range(0, len(words), _kWordsPerEvent)
+        ]
+
+    def chromeTraceEvents(self) -> list[dict]:
+        """
+        :returns: the events in Chrome trace-event format, which Perfetto
+                  and chrome://tracing open. Callbacks are spans, the skid of
+                  each wake is a span from the requested alarm time, the
+                  other events are instants.
+        """
+        traceEvents = []
+        openCallbacks = set()
+        names = self.callbackNames
+        for kind, timeUs, a, b in self.events():
+            if kind == kCallbackStart:
+                openCallbacks.add(a)
+                traceEvents.append(
+                    {"name": names[a], "ph": "B", "ts": timeUs, "pid": 1, "tid": 1,
+                     "args": {"expirationUs": b, "skidUs": timeUs - b}}
+                )
+            elif kind == kCallbackEnd:
+                # The start may have been overwritten
+                if a in openCallbacks:
+                    openCallbacks.discard(a)
+                    traceEvents.append({"name": names[a], "ph": "E", "ts": timeUs, "pid": 1, "tid": 1})
+            elif kind == kWake:
+                traceEvents.append(
+                    {"name": "wake skid", "ph": "X", "ts": a, "dur": b, "pid": 1, "tid": 2,
+                     "args": {"requestedUs": a, "wakeUs": timeUs, "skidUs": b}}
+                )
+            else:
+                if kind == kAlarmSet:
+                    args = {"alarmUs": a}
+                elif kind == kReschedule:
+                    args = {"callback": names[a], "nextExpirationUs": b}
+                elif kind == kDeadlineSkip:
+                    args = {"callback": names[a], "lateUs": b}
+                else:
+                    args = {"callback": names[a], "skippedPeriods": b}
+                traceEvents.append(
+                    {"name": _kKindNames[kind], "ph": "i", "s": "t", "ts": timeUs, "pid": 1, "tid": 2, "args": args}
+                )
+        return traceEvents
+
+    def dump(self, path: str) -> None:
+        """
+        Write the ring to path as Chrome trace-event JSON.
+        """
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.chromeTraceEvents(), "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,132 @@
+import threading
+from typing import Callable
+
+from wpilib import Watchdog
+
+
+class TelemetryStage:
+    """
+    One dashboard update that IterativeRobotPy runs at the end of its loop.
+
+    A stage runs every everyNLoops loops. When skipWhenIdle is set, a stage
+    that is due is still skipped while isIdle() reports that there is nothing
+    for it to publish.
+    """
+
+    __slots__ = (
+        'name',
+        'epoch',
+        'everyNLoops',
+        'skipWhenIdle',
+        '_update',
+        '_isIdle',
+        '_loopsUntilDue',
+    )
+
+    def __init__(
+        self,
+        name: str,
+        update: Callable[[], None],
+        epoch: str,
+        isIdle: Callable[[], bool],
+        skipWhenIdle: bool = True,
+    ) -> None:
+        """
+        :param name:         the stage name used to configure it.
+        :param update:       publishes the stage's values.
+        :param epoch:        the watchdog epoch added after update() runs.
+        :param isIdle:       returns True when update() would have nothing to do.
+        :param skipWhenIdle: the initial skipWhenIdle.
+        """
+        self.name = name
+        self.epoch = epoch
+        self.everyNLoops = 1
+        self.skipWhenIdle = skipWhenIdle
+        self._update = update
+        self._isIdle = isIdle
+        self._loopsUntilDue = 1
+
+    def configure(self, everyNLoops: int, skipWhenIdle: bool) -> None:
+        if everyNLoops < 1:
+            raise ValueError(f"everyNLoops must be at least 1, not {everyNLoops}")
+        self.everyNLoops = everyNLoops
+        self.skipWhenIdle = skipWhenIdle
+        self._loopsUntilDue = 1
+
+    def isDue(self) -> bool:
+        """
+        Count down one loop.
+
+        :returns: True if the stage should run on this loop.
+        """
+        self._loopsUntilDue -= 1
+        if self._loopsUntilDue:
+            return False
+        self._loopsUntilDue = self.everyNLoops
+        return not (self.skipWhenIdle and self._isIdle())
+
+    def run(self, watchdog: Watchdog) -> None:
+        self._update()
+        watchdog.addEpoch(self.epoch)
+
+    def __repr__(self) -> str:
+        return f"{{name={self.name}, everyNLoops={self.everyNLoops}, skipWhenIdle={self.skipWhenIdle}}}"
+
+
+def neverIdle() -> bool:
+    return False
+
+
+class TelemetryWorker:
+    """
+    Flushes NetworkTables on a background thread, so that sending the loop's
+    values does not compete with the robot loop.
+
+    The telemetry stages still run on the loop thread, between robot code
+    that mutates the sendables: they copy the values into NetworkTables'
+    local entries, and that copy is the loop's snapshot. The worker only
+    sends it. A flush requested while the previous one has not started yet
+    is merged into it, as that flush sends the newer values anyway, and is
+    counted in coalescedFlushes.
+    """
+
+    def __init__(self, flush: Callable[[], None]) -> None:
+        """
+        :param flush: flushes NetworkTables.
+        """
+        self._flush = flush
+        self._condition = threading.Condition()
+        self._flushPending = False
+        self._running = True
+        self.coalescedFlushes = 0
+        self.flushes = 0
+        self._thread = threading.Thread(
+            target=self._run, name="TelemetryWorker", daemon=True
+        )
+        self._thread.start()
+
+    def requestFlush(self) -> None:
+        with self._condition:
+            if self._flushPending:
+                self.coalescedFlushes += 1
+            else:
+                self._flushPending = True
+                self._condition.notify()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._running and not self._flushPending:
+                    self._condition.wait()
+                # Once stopped, send the last values before exiting
+                if not self._flushPending:
+                    return
+                self._flushPending = False
+            self._flush()
+            self.flushes += 1
@@ -0,0 +1,72 @@
+"""
+    CallLogRecorder keeps the latest samples in memory, streams every
+    sample to a file, or keeps a ring in a memory-mapped file.
+"""
+
+import pytest
+
+from calllog import CallLogRecorder, readCallLog
+
+
+def recordSamples(recorder, count):
+    even = recorder.intern("even")
+    odd = recorder.intern("odd")
+    for timeUs in range(count):
+        recorder.record(odd if timeUs % 2 else even, timeUs)
+
+
+def test_memory_ring_keeps_the_latest_samples():
+    recorder = CallLogRecorder(capacity=8)
+    recordSamples(recorder, 21)
+
+    assert recorder.count() == 21
+    timesByName = recorder.timesByName()
+    assert list(timesByName["even"]) == [14, 16, 18, 20]
+    assert list(timesByName["odd"]) == [13, 15, 17, 19]
+
+
+def test_intern_returns_the_same_id():
+    recorder = CallLogRecorder()
+    assert recorder.intern("a") == recorder.intern("a") != recorder.intern("b")
+
+
+@pytest.mark.parametrize("count", [0, 5, 8, 21])
+def test_stream_keeps_every_sample(tmp_path, count):
+    path = str(tmp_path / "calls.bin")
+    recorder = CallLogRecorder(capacity=8, path=path)
+    recordSamples(recorder, count)
+    # A flush part way through a pass must not duplicate samples
+    recorder.flush()
+    recorder.record(recorder.intern("even"), 1000)
+    recorder.close()
+
+    names, records = readCallLog(path)
+    assert names == ["even", "odd"]
+    assert list(records[1::2]) == list(range(count)) + [1000]
+
+
+def test_mmap_ring_is_readable_offline(tmp_path):
+    path = str(tmp_path / "calls.ring")
+    recorder = CallLogRecorder(capacity=8, path=path, useMmap=True)
+    recordSamples(recorder, 21)
+    inMemory = recorder.records()
+    recorder.close()
+
+    names, records = readCallLog(path)
+    assert list(records[1::2]) == list(range(13, 21))
+    assert records == inMemory
+
+
+def test_mmap_ring_is_readable_without_close(tmp_path):
+    path = str(tmp_path / "calls.ring")
+    recorder = CallLogRecorder(capacity=8, path=path, useMmap=True)
+    recordSamples(recorder, 21)
+    late = recorder.intern("late")
+    recorder.record(late, 100)
+
+    # As another process would see it if the robot crashed now
+    names, records = readCallLog(path)
+    assert names == ["even", "odd", "late"]
+    assert recorder.count() == 22
+    assert list(records[1::2]) == list(range(14, 21)) + [100]
+    recorder.close()
@@ -0,0 +1,104 @@
+"""
+    GcScheduler decisions for a given slack, with the collector's thresholds
+    pinned so that which generations are due is deterministic.
+"""
+
+import gc
+
+import pytest
+
+from gcscheduler import GcScheduler
+from notifierbackend import SimulatedTimeBackend
+
+# More than the generation 1 estimate, less than the full collection one
+kSlackUs = 3_000
+
+
+@pytest.fixture
+def backend():
+    return SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0)
+
+
+@pytest.fixture
+def scheduler(backend):
+    thresholds = gc.get_threshold()
+    gcScheduler = GcScheduler(backend.getTimeUs)
+    gcScheduler.start()
+    gc.collect()
+    yield gcScheduler
+    gcScheduler.stop()
+    gc.set_threshold(*thresholds)
+
+
+def test_deferred_full_collection_skips_generations_that_are_not_due(scheduler):
+    gc.set_threshold(100_000, 10, 10)
+    scheduler.collectInSlack(kSlackUs, allowFull=True)
+
+    assert scheduler.stats.deferred == [0, 0, 1]
+    assert scheduler.stats.collections == [0, 0, 0]
+
+
+def test_deferred_full_collection_falls_back_to_a_due_generation(scheduler):
+    gc.set_threshold(1, 10, 10)
+    garbage = [[] for _ in range(10)]
+    scheduler.collectInSlack(kSlackUs, allowFull=True)
+
+    assert scheduler.stats.deferred == [0, 0, 1]
+    assert scheduler.stats.collections == [1, 0, 0]
+    del garbage
+
+
+def test_young_generations_keep_their_ratio_while_full_is_deferred(scheduler):
+    gc.set_threshold(50, 10, 10)
+    # A full collection estimate that does not decay to fit in 300 deferrals
+    scheduler.estimateUs[2] = 10**12
+    garbage = []
+    for _ in range(300):
+        # Survivors, so that each loop is past the generation 0 threshold
+        garbage.append([[] for _ in range(60)])
+        scheduler.collectInSlack(kSlackUs, allowFull=True)
+    del garbage
+
+    collections = scheduler.stats.collections
+    # Every loop collects, generation 1 only every eleventh time
+    assert collections[0] + collections[1] == 300
+    assert collections[1] <= 300 // 11 + 1
+    assert collections[2] == 0
+    assert scheduler.stats.deferred[2] == 300
+
+
+def test_nothing_runs_without_enough_slack(scheduler):
+    gc.set_threshold(1, 10, 10)
+    garbage = [[] for _ in range(10)]
+    scheduler.collectInSlack(100, allowFull=False)
+
+    assert scheduler.stats.deferred == [1, 0, 0]
+    assert scheduler.stats.collections == [0, 0, 0]
+    del garbage
+
+
+def test_generation_is_collected_again_after_one_slow_collection(backend, scheduler):
+    gc.set_threshold(1, 100_000, 10)
+
+    def slowCollection(phase, info):
+        if phase == "stop":
+            backend.advanceUs(1_000_000)
+
+    garbage = [[] for _ in range(10)]
+    gc.callbacks.append(slowCollection)
+    try:
+        scheduler.collectInSlack(2_000_000, allowFull=False)
+    finally:
+        gc.callbacks.remove(slowCollection)
+    assert scheduler.stats.collections == [1, 0, 0]
+    assert scheduler.estimateUs[0] == 1_000_000
+
+    for _ in range(1_000):
+        garbage.append([[] for _ in range(10)])
+        scheduler.collectInSlack(kSlackUs, allowFull=False)
+    del garbage
+
+    # The estimate decayed while deferred until the loop's slack fit it
+    assert scheduler.stats.deferred[0] > 0
+    assert scheduler.stats.collections[0] > 1
+    assert scheduler.estimateUs[0] < kSlackUs
@@ -0,0 +1,174 @@
+"""
+    LatencyHistogram bucketing, percentiles and export, and the
+    callback histograms TimedRobotPy records with them.
+"""
+
+import json
+
+import hal
+import pytest
+
+from latencyhistogram import CallbackHistograms, LatencyHistogram
+from notifierbackend import SimulatedTimeBackend
+from timedrobotpy import TimedRobotPy, NativeCallbackQueue
+
+
+def test_values_land_in_their_bucket_and_clamp_at_the_ends():
+    histogram = LatencyHistogram(bucketWidthUs=10, numBuckets=5)
+    for valueUs in (-3, 0, 9, 10, 25, 49, 50, 1000):
+        histogram.record(valueUs)
+
+    assert list(histogram.counts) == [3, 1, 1, 0, 3]
+    assert histogram.count == 8
+    assert histogram.maxUs == 1000
+    assert histogram.totalUs == sum((-3, 0, 9, 10, 25, 49, 50, 1000))
+
+
+def test_invalid_shapes_are_rejected():
+    with pytest.raises(ValueError):
+        LatencyHistogram(bucketWidthUs=0, numBuckets=5)
+    with pytest.raises(ValueError):
+        LatencyHistogram(bucketWidthUs=10, numBuckets=0)
+
+
+def test_percentiles_are_bucket_upper_edges():
+    histogram = LatencyHistogram(bucketWidthUs=10, numBuckets=100)
+    assert histogram.percentileUs(0.5) == 0
+    assert histogram.meanUs() == 0.0
+
+    for valueUs in range(100):
+        histogram.record(valueUs * 5)
+
+    # Two samples per 10us bucket, 0..495us
+    assert histogram.percentileUs(0.50) == 250
+    assert histogram.percentileUs(0.99) == 500
+    assert histogram.percentileUs(1.0) == 500
+    assert histogram.meanUs() == pytest.approx(247.5)
+
+
+def test_callback_histograms_export_as_json(tmp_path):
+    histograms = CallbackHistograms("periodic", bucketWidthUs=10, numBuckets=3)
+    histograms.skid.record(5)
+    histograms.execution.record(15)
+    histograms.execution.record(100)
+
+    path = tmp_path / "histograms.json"
+    path.write_text(json.dumps(histograms.toDict()))
+    exported = json.loads(path.read_text())
+
+    assert exported["name"] == "periodic"
+    assert exported["skid"]["counts"] == [1, 0, 0]
+    assert exported["execution"]["counts"] == [0, 1, 1]
+    assert exported["execution"]["maxUs"] == 100
+    assert exported["execution"]["p50Us"] == 20
+    assert exported["execution"]["p99Us"] == 30
+
+
+class CountingRobot(TimedRobotPy):
+    def __init__(self, backend, **kwargs):
+        super().__init__(backend=backend, **kwargs)
+        self.loops = 0
+
+    def robotPeriodic(self):
+        self.loops += 1
+        if self.loops >= 50:
+            self.endCompetition()
+
+    def disabledPeriodic(self):
+        pass
+
+    def _simulationPeriodic(self):
+        pass
+
+
+def test_robot_records_and_exports_a_histogram_per_callback(tmp_path):
+    hal.initialize()
+    robot = CountingRobot(SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+    path = tmp_path / "callbacks.json"
+    robot.enableCallbackHistograms(bucketWidthUs=10, numBuckets=50, exportPath=str(path))
+
+    def periodic():
+        pass
+
+    robot.addPeriodic(periodic, 0.020, 0.005)
+    robot.startCompetition()
+
+    byName = {histograms.name: histograms for histograms in robot.getCallbackHistograms()}
+    periodicHistograms = byName[periodic.__qualname__]
+    assert periodicHistograms.execution.count == periodicHistograms.skid.count == 49
+    exported = json.loads(path.read_text())
+    assert periodic.__qualname__ in {entry["name"] for entry in exported}
+
+
+def test_histograms_are_refused_with_the_native_queue():
+    pytest.importorskip("timedrobotmath")
+    hal.initialize()
+    robot = CountingRobot(
+        SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0),
+        scheduler=NativeCallbackQueue,
+    )
+    with pytest.raises(ValueError):
+        robot.enableCallbackHistograms()
+
+
+def test_histograms_are_allocated_when_callbacks_are_added():
+    hal.initialize()
+    robot = CountingRobot(SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+
+    def addedBefore():
+        pass
+
+    def addedAfter():
+        pass
+
+    robot.addPeriodic(addedBefore, 0.020, 0.005)
+    robot.enableCallbackHistograms()
+    robot.addPeriodic(addedAfter, 0.020, 0.005)
+
+    names = {histograms.name for histograms in robot.getCallbackHistograms()}
+    assert {addedBefore.__qualname__, addedAfter.__qualname__} <= names
+    assert all(histograms.skid.count == 0 for histograms in robot.getCallbackHistograms())
+
+
+class ReadCountingBackend(SimulatedTimeBackend):
+    def __init__(self):
+        super().__init__(startTimeUs=1_000_000, executionTimeScale=0.0, wakeSkidUs=60)
+        self.reads = 0
+
+    def getTimeUs(self):
+        self.reads += 1
+        return super().getTimeUs()
+
+
+def runCountingReads(histograms):
+    backend = ReadCountingBackend()
+    robot = CountingRobot(backend)
+    if histograms:
+        robot.enableCallbackHistograms(bucketWidthUs=10, numBuckets=50)
+    robot.addPeriodic(lambda: None, 0.020, 0.005)
+    robot.startCompetition()
+    return robot, backend.reads
+
+
+def test_histograms_take_the_start_from_the_loop_start_time():
+    hal.initialize()
+    _, uninstrumentedReads = runCountingReads(histograms=False)
+    robot, reads = runCountingReads(histograms=True)
+
+    # The end of each function is the one read the reschedule needs anyway
+    assert reads == uninstrumentedReads
+    for callbackHistograms in robot.getCallbackHistograms():
+        assert callbackHistograms.skid.maxUs == 60
+
+
+def test_histograms_and_scheduler_events_are_not_combined():
+    hal.initialize()
+    robot = CountingRobot(SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+    robot.enableCallbackHistograms()
+    with pytest.raises(ValueError):
+        robot.enableSchedulerEvents()
+
+    robot = CountingRobot(SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+    robot.enableSchedulerEvents()
+    with pytest.raises(ValueError):
+        robot.enableCallbackHistograms()
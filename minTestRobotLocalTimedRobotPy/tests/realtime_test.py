@@ -0,0 +1,142 @@
+"""
+    Checks that a pass of startCompetition()'s loop, the scheduler dispatch
+    as well as the main loop, allocates nothing once it has warmed up but
+    the ints of the loop times, not even temporaries that are freed again
+    within the pass.
+"""
+
+import gc
+import sys
+import tracemalloc
+
+import hal
+import pytest
+
+from notifierbackend import SimulatedTimeBackend
+from timedrobotpy import TimedRobotPy
+
+WARMUP_LOOPS = 50
+MEASURED_LOOPS = 200
+
+# Python ints are objects, so each pass creates the ints of its loop times:
+# the wake up time and, per entry dispatched, the next expiration and the
+# time since the last one, which calcFutureExpirationUs() compares with the
+# period. With the single main loop entry there are four of them, two of
+# which are still alive when the next one is created. tracemalloc's peak
+# also moves by up to an int's worth between otherwise identical passes, as
+# the interpreter's own frame and int blocks are reused or not, so two more
+# are allowed for that.
+kLoopTimeInts = 6
+kIntBytes = sys.getsizeof(1_000_000)
+kAllowedBytes = kLoopTimeInts * kIntBytes
+
+
+class MeasuringBackend(SimulatedTimeBackend):
+    """
+    Measures each pass of startCompetition()'s loop, from one
+    waitForNotifierAlarm() return to the next call, and stops the loop
+    after WARMUP_LOOPS + MEASURED_LOOPS passes.
+    """
+
+    def __init__(self):
+        super().__init__(startTimeUs=1_000_000, executionTimeScale=0.0)
+        self.passes = 0
+        self.peakAllocation = 0
+        self._startAllocation = 0
+        self._overhead = 0
+        # Every alarm and wake up time stays alive, so that the previous
+        # pass's ints are not freed during the next one and do not make up
+        # for what it allocates.
+        self._alarms = [None] * (WARMUP_LOOPS + MEASURED_LOOPS + 2)
+        self._wakeUps = [None] * (WARMUP_LOOPS + MEASURED_LOOPS + 2)
+
+    def updateNotifierAlarm(self, notifier, triggerTimeUs):
+        self._alarms[self.passes] = triggerTimeUs
+        # Not super(), which allocates within the pass
+        return SimulatedTimeBackend.updateNotifierAlarm(self, notifier, triggerTimeUs)
+
+    def waitForNotifierAlarm(self, notifier):
+        if self.passes > WARMUP_LOOPS:
+            self.peakAllocation = max(
+                self.peakAllocation, self._allocatedSinceStart() - self._overhead
+            )
+        self.passes += 1
+        if self.passes == WARMUP_LOOPS:
+            tracemalloc.start()
+            # What measuring allocates itself, measured around nothing
+            self._startMeasuring()
+            self._overhead = self._allocatedSinceStart()
+        elif self.passes > WARMUP_LOOPS + MEASURED_LOOPS:
+            tracemalloc.stop()
+            # Like a stopped notifier
+            return 0, 0
+        result = super().waitForNotifierAlarm(notifier)
+        self._wakeUps[self.passes] = result
+        self._startMeasuring()
+        return result
+
+    def _startMeasuring(self):
+        # The peak is reset once the reading is stored and the rest of what
+        # get_traced_memory() returned is freed, so that none of it counts.
+        self._startAllocation = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    def _allocatedSinceStart(self):
+        return tracemalloc.get_traced_memory()[1] - self._startAllocation
+
+
+class QuietRobot(TimedRobotPy):
+    """
+    A robot whose own methods allocate nothing, so that whatever a pass
+    allocates is the framework's.
+    """
+
+    def robotPeriodic(self):
+        pass
+
+    def disabledPeriodic(self):
+        pass
+
+    def _simulationPeriodic(self):
+        pass
+
+
+class AllocatingRobot(QuietRobot):
+    def robotPeriodic(self):
+        # The previous buffer is only freed once the new one exists
+        self.lastLoop = bytearray(kAllowedBytes)
+
+
+@pytest.fixture
+def backend():
+    hal.initialize()
+    yield MeasuringBackend()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    gc.unfreeze()
+
+
+@pytest.mark.parametrize("realtime", [True, False])
+def test_loop_allocates_only_loop_time_ints(backend, realtime):
+    robot = QuietRobot(backend=backend)
+    if realtime:
+        robot.enableRealtimeMode()
+    robot.startCompetition()
+
+    assert backend.passes > WARMUP_LOOPS + MEASURED_LOOPS
+    assert 0 < backend.peakAllocation <= kAllowedBytes
+
+
+def test_realtime_mode_freezes_the_heap(backend):
+    robot = QuietRobot(backend=backend)
+    robot.enableRealtimeMode()
+    robot.startCompetition()
+
+    assert gc.get_freeze_count() > 0
+
+
+def test_loop_allocations_are_measured(backend):
+    robot = AllocatingRobot(backend=backend)
+    robot.startCompetition()
+
+    assert backend.peakAllocation > kAllowedBytes
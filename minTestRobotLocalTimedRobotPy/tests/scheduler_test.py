@@ -0,0 +1,445 @@
+"""
+    Scheduling tests for TimedRobotPy, run on SimulatedTimeBackend so that
+    hundreds of 20ms loops finish in milliseconds.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import threading
+
+import hal
+import pytest
+
+from coroutines import CancelledError, kNeverUs, sleep
+from notifierbackend import SimulatedTimeBackend
+import schedulerevents
+from timedrobotpy import (
+    CatchUpPolicy,
+    ExecutionClass,
+    OverlapPolicy,
+    TimedRobotPy,
+    NativeCallbackQueue,
+    OrderedList,
+)
+
+NUM_LOOPS = 200
+
+
+class SimulatedRobot(TimedRobotPy):
+    def __init__(self, backend, scheduler=None):
+        super().__init__(backend=backend, scheduler=scheduler)
+        self.backend = backend
+        self.loops = 0
+        self.lastLoopStartTimeUs = 0
+        self.calls = {}
+        self.slowLoops = set()
+
+    def record(self, name, value=None):
+        self.calls.setdefault(name, []).append(
+            self.getLoopStartTime() if value is None else value
+        )
+
+    def recordExpiration(self, name):
+        # The entry being dispatched is still at the front of the queue
+        self.record(name, self._callbacks.peek().expirationUs)
+
+    def robotPeriodic(self):
+        self.loops += 1
+        self.lastLoopStartTimeUs = self.getLoopStartTime()
+        if self.loops in self.slowLoops:
+            # Simulate a loop overrun of a little over three periods
+            self.backend.advanceUs(67_000)
+        if self.loops >= NUM_LOOPS:
+            self.endCompetition()
+
+    def disabledPeriodic(self):
+        pass
+
+    def _simulationPeriodic(self):
+        pass
+
+
+@pytest.fixture
+def backend():
+    hal.initialize()
+    return SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0)
+
+
+def test_callbacks_in_the_same_slot_share_an_entry(backend):
+    robot = SimulatedRobot(backend)
+    for name in ("a", "b", "c"):
+        robot.addPeriodic(lambda name=name: robot.record(name), 0.020, 0.005)
+    robot.addPeriodic(lambda: robot.record("d"), 0.020, 0.010)
+
+    assert len(robot._callbacks) == 3
+    robot.startCompetition()
+
+    assert robot.calls["a"] == robot.calls["b"] == robot.calls["c"]
+    assert len(robot.calls["a"]) == NUM_LOOPS - 1
+    assert len(robot.calls["d"]) == NUM_LOOPS - 1
+
+
+def test_batch_policy_delivers_every_missed_period(backend):
+    robot = SimulatedRobot(backend)
+    robot.slowLoops = {50, 120}
+    robot.addPeriodic(
+        lambda ticks: robot.record("batch", ticks), 0.020, 0.005, CatchUpPolicy.kBatch
+    )
+    robot.addPeriodic(lambda: robot.record("coalesce"), 0.020, 0.005)
+    robot.startCompetition()
+
+    elapsedPeriods = (robot.lastLoopStartTimeUs - robot._startTimeUs) // 20_000
+    assert sum(robot.calls["batch"]) == pytest.approx(elapsedPeriods, abs=1)
+    assert robot.calls["batch"].count(4) == 2
+    assert len(robot.calls["coalesce"]) < sum(robot.calls["batch"])
+
+
+def test_realign_policy_shifts_phase_after_an_overrun(backend):
+    robot = SimulatedRobot(backend)
+    robot.slowLoops = {50}
+    robot.addPeriodic(
+        lambda: robot.recordExpiration("realign"),
+        0.020,
+        0.005,
+        CatchUpPolicy.kRealign,
+    )
+    robot.addPeriodic(lambda: robot.recordExpiration("coalesce"), 0.020, 0.005)
+    robot.startCompetition()
+
+    coalescePhases = {timeUs % 20_000 for timeUs in robot.calls["coalesce"]}
+    realignPhases = {timeUs % 20_000 for timeUs in robot.calls["realign"]}
+    assert len(coalescePhases) == 1
+    assert len(realignPhases) == 2
+
+
+def test_scheduler_events_record_skid_and_overrun_skips(tmp_path):
+    hal.initialize()
+    backend = SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0, wakeSkidUs=60)
+    robot = SimulatedRobot(backend)
+    robot.slowLoops = {50}
+    robot.enableSchedulerEvents(capacity=64)
+    robot.addPeriodic(lambda: None, 0.020, 0.005)
+    robot.startCompetition()
+
+    events = robot.getSchedulerEvents().events()
+    assert len(events) == 64
+    wakes = [event for event in events if event[0] == schedulerevents.kWake]
+    assert wakes and all(skidUs == 60 for _, _, _, skidUs in wakes)
+
+    path = tmp_path / "events.json"
+    robot.dumpSchedulerEvents(str(path))
+    traceEvents = json.loads(path.read_text())["traceEvents"]
+    assert {"wake skid", "alarm set", "reschedule"} <= {event["name"] for event in traceEvents}
+
+    # The overrun is long gone from a ring this small, look at a big one
+    robot = SimulatedRobot(SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+    robot.slowLoops = {50}
+    robot.enableSchedulerEvents(capacity=10_000)
+    robot.startCompetition()
+    skips = [event for event in robot.getSchedulerEvents().events() if event[0] == schedulerevents.kOverrunSkip]
+    assert [skippedPeriods for _, _, _, skippedPeriods in skips] == [3]
+
+
+class OverrunningRobot(SimulatedRobot):
+    def robotPeriodic(self):
+        super().robotPeriodic()
+        if self.loops == 50:
+            # As the watchdog does when the loop overruns
+            self.printWatchdogEpochs()
+
+
+def test_overrun_events_are_written_off_the_loop(backend, tmp_path, monkeypatch):
+    dumpThreads = []
+    dump = schedulerevents.SchedulerEventRing.dump
+
+    def recordingDump(ring, path):
+        dumpThreads.append(threading.current_thread())
+        dump(ring, path)
+
+    monkeypatch.setattr(schedulerevents.SchedulerEventRing, "dump", recordingDump)
+    path = tmp_path / "overrun.json"
+    robot = OverrunningRobot(backend)
+    robot.enableSchedulerEvents(capacity=10_000, overrunPath=str(path))
+    robot.startCompetition()
+
+    assert dumpThreads and threading.main_thread() not in dumpThreads
+    # The copy holds the events up to the overrun, not those recorded since
+    traceEvents = json.loads(path.read_text())["traceEvents"]
+    assert max(event["ts"] for event in traceEvents) <= robot.lastLoopStartTimeUs - 100 * 20_000
+
+
+def recordTicks(robot, ticks):
+    robot.record("batch", ticks)
+
+
+@pytest.mark.parametrize("instrumentation", ["histograms", "events"])
+def test_batch_entries_are_instrumented_by_their_own_functions(backend, instrumentation):
+    robot = SimulatedRobot(backend)
+    robot.slowLoops = {50}
+    if instrumentation == "histograms":
+        robot.enableCallbackHistograms()
+    else:
+        robot.enableSchedulerEvents(capacity=10_000)
+    robot.addPeriodic(lambda ticks: recordTicks(robot, ticks), 0.020, 0.005, CatchUpPolicy.kBatch)
+    robot.startCompetition()
+
+    assert robot.calls["batch"].count(4) == 1
+    if instrumentation == "histograms":
+        names = [histograms.name for histograms in robot.getCallbackHistograms()]
+        assert "test_batch_entries_are_instrumented_by_their_own_functions.<locals>.<lambda>" in names
+        assert not any("_runBatch" in name for name in names)
+    else:
+        events = robot.getSchedulerEvents()
+        batchId = events.callbackNames.index(
+            "test_batch_entries_are_instrumented_by_their_own_functions.<locals>.<lambda>"
+        )
+        skips = [
+            event for event in events.events()
+            if event[0] == schedulerevents.kOverrunSkip and event[2] == batchId
+        ]
+        # The periods missed during the overrun were delivered, not skipped
+        assert skips == []
+
+
+class LoadedRobot(SimulatedRobot):
+    def robotPeriodic(self):
+        super().robotPeriodic()
+        if 20 <= self.loops < 120:
+            self.backend.advanceUs(25_000)
+        self.record("period", self.getPeriod())
+
+
+def test_adaptive_period_stretches_under_load_and_recovers(backend):
+    robot = LoadedRobot(backend)
+    periods = []
+    robot.addPeriodListener(periods.append)
+    robot.enableAdaptivePeriod(maxPeriod=0.050, windowLoops=20)
+    robot.startCompetition()
+
+    # 25ms loops are 70% of a 36ms period
+    assert periods == [0.036, 0.020]
+    assert max(robot.calls["period"]) == 0.036
+    assert robot.calls["period"][-1] == robot.getPeriod() == 0.020
+    assert robot.watchdog.getTimeout() == 0.020
+
+
+@pytest.mark.parametrize(
+    "overlapPolicy", [OverlapPolicy.kSkip, OverlapPolicy.kQueue, OverlapPolicy.kCancel]
+)
+def test_offloaded_callbacks_follow_the_overlap_policy(backend, overlapPolicy):
+    robot = SimulatedRobot(backend)
+    release = threading.Event()
+    # A single worker blocked for the whole run, so every submission overlaps
+    executor = ThreadPoolExecutor(1)
+    executor.submit(release.wait)
+    robot.setExecutor(ExecutionClass.kThreadPool, executor)
+    robot.addPeriodic(
+        lambda: None, 0.020, 0.005, executionClass=ExecutionClass.kThreadPool, overlapPolicy=overlapPolicy
+    )
+    robot.addPeriodic(lambda: robot.record("inline"), 0.020, 0.005)
+    robot.startCompetition()
+    release.set()
+    executor.shutdown()
+
+    (offloaded,) = robot.getOffloadedCallbacks()
+    due = NUM_LOOPS - 1
+    assert len(robot.calls["inline"]) == due
+    if overlapPolicy is OverlapPolicy.kSkip:
+        assert (offloaded.submitted, offloaded.skipped) == (1, due - 1)
+    elif overlapPolicy is OverlapPolicy.kQueue:
+        assert (offloaded.submitted, offloaded.skipped) == (due, 0)
+    else:
+        assert (offloaded.submitted, offloaded.cancelled) == (due, due - 1)
+
+
+def test_coroutines_resume_on_the_notifier_timebase(backend):
+    robot = SimulatedRobot(backend)
+    resumedAtUs = []
+
+    async def child():
+        await sleep(0.030)
+        return "shot"
+
+    async def routine():
+        resumedAtUs.append(backend.getTimeUs())
+        for _ in range(3):
+            await sleep(0.100)
+            resumedAtUs.append(backend.getTimeUs())
+        return await robot.startCoroutine(child())
+
+    task = robot.startCoroutine(routine())
+    robot.startCompetition()
+
+    assert task.result() == "shot"
+    # Woken only when due, with the cadence kept from the first resume
+    assert [timeUs - resumedAtUs[0] for timeUs in resumedAtUs] == [0, 100_000, 200_000, 300_000]
+    assert robot._coroutineCallback.expirationUs == kNeverUs
+
+
+def test_coroutine_that_is_always_due_does_not_starve_the_loop(backend):
+    robot = SimulatedRobot(backend)
+    loopsAtStep = []
+
+    async def spinner():
+        for _ in range(200):
+            loopsAtStep.append(robot.loops)
+            # A millisecond of work, then straight back to the scheduler
+            backend.advanceUs(1000)
+            await sleep(0)
+
+    task = robot.startCoroutine(spinner())
+    robot.startCompetition()
+
+    assert task.done()
+    # Resumed once per pass, so the 20ms main loop keeps running in between
+    assert max(loopsAtStep.count(loops) for loops in set(loopsAtStep)) <= 21
+    assert loopsAtStep[-1] >= 9
+
+
+class CancellingRobot(SimulatedRobot):
+    def robotPeriodic(self):
+        super().robotPeriodic()
+        if self.loops == 10:
+            self.task.cancel()
+
+
+def test_cancelled_coroutine_runs_its_finally_and_fails_its_waiters(backend):
+    robot = CancellingRobot(backend)
+    cleanedUp = []
+
+    async def longSleep():
+        try:
+            await sleep(10.0)
+        finally:
+            cleanedUp.append(True)
+
+    async def waiter():
+        try:
+            await robot.task
+        except CancelledError:
+            return "gave up"
+
+    robot.task = robot.startCoroutine(longSleep())
+    waiterTask = robot.startCoroutine(waiter())
+    robot.startCompetition()
+
+    assert cleanedUp == [True]
+    assert robot.task.cancelled()
+    assert waiterTask.result() == "gave up"
+
+
+class PhaseChangingRobot(SimulatedRobot):
+    def robotPeriodic(self):
+        super().robotPeriodic()
+        if self.loops == 50:
+            self.handles["cancelled"].cancel()
+            self.handles["slowed"].setPeriod(0.040)
+        if self.loops == 60:
+            # Expires before the main loop entry being dispatched
+            self.handles["late"] = self.addPeriodic(lambda: self.record("late"), 0.005)
+
+
+@pytest.fixture(params=[OrderedList, NativeCallbackQueue])
+def scheduler(request):
+    if request.param is NativeCallbackQueue:
+        pytest.importorskip("timedrobotmath")
+    return request.param
+
+
+def test_handles_cancel_and_change_period(backend, scheduler):
+    robot = PhaseChangingRobot(backend, scheduler)
+    robot.handles = {
+        name: robot.addPeriodic(lambda name=name: robot.record(name), 0.020, 0.005)
+        for name in ("cancelled", "slowed", "kept")
+    }
+    robot.startCompetition()
+
+    assert len(robot.calls["cancelled"]) == 49
+    assert len(robot.calls["kept"]) == NUM_LOOPS - 1
+    slowedIntervals = [b - a for a, b in zip(robot.calls["slowed"], robot.calls["slowed"][1:])]
+    assert slowedIntervals[:40] == [20_000] * 40
+    assert slowedIntervals[-40:] == [40_000] * 40
+    assert robot.handles["slowed"].getPeriod() == 0.040
+    assert len(robot.calls["late"]) > 4 * (NUM_LOOPS - 60) - 4
+    assert not robot.handles["cancelled"].cancel()
+
+
+def test_cancelled_entries_leave_the_queue(backend, scheduler):
+    robot = SimulatedRobot(backend, scheduler)
+    handles = [robot.addPeriodic(lambda: None, 0.020, 0.001 * i) for i in range(1, 6)]
+    for handle in handles:
+        handle.cancel()
+    # A new callback in a cancelled entry's slot gets an entry of its own
+    kept = robot.addPeriodic(lambda: robot.record("kept"), 0.020, 0.001)
+    robot.startCompetition()
+
+    assert {id(entry) for entry in robot._callbacks} == {id(robot._loopCallback), id(kept._entry)}
+    assert len(robot.calls["kept"]) == NUM_LOOPS - 1
+
+
+class SlotSharingRobot(SimulatedRobot):
+    def robotInit(self):
+        # Due before the main loop entry, so added at the top of the loop
+        self.handles = [
+            self.addPeriodic(lambda i=i: self.record(i), 0.010) for i in range(5)
+        ]
+
+
+def test_callbacks_added_in_robot_init_share_an_entry(backend):
+    robot = SlotSharingRobot(backend)
+    robot.startCompetition()
+
+    assert len({id(handle._entry) for handle in robot.handles}) == 1
+    assert len(robot._callbacks) == 2
+    assert all(robot.calls[i] == robot.calls[0] for i in range(5))
+
+
+@pytest.mark.parametrize("priorityDispatch", [False, True])
+def test_callback_added_to_its_own_slot_during_dispatch_joins_the_entry(backend, priorityDispatch):
+    robot = SimulatedRobot(backend)
+    if priorityDispatch:
+        robot.setMainLoopPriority(0)
+    handles = {}
+
+    def adder():
+        robot.record("adder")
+        if len(robot.calls["adder"]) == 5:
+            handles["joiner"] = robot.addPeriodic(lambda: robot.record("joiner"), 0.020, 0.005)
+
+    handles["adder"] = robot.addPeriodic(adder, 0.020, 0.005)
+    robot.startCompetition()
+
+    assert handles["joiner"]._entry is handles["adder"]._entry
+    assert len(robot._callbacks) == 2
+    assert robot.calls["joiner"] == robot.calls["adder"][5:]
+
+
+class OrderRecordingRobot(SimulatedRobot):
+    def robotPeriodic(self):
+        self.record("order", "loop")
+        super().robotPeriodic()
+
+
+def test_same_tick_callbacks_run_by_priority_and_skip_past_deadline(backend):
+    robot = OrderRecordingRobot(backend)
+    robot.slowLoops = {50, 120}
+    robot.addPeriodic(lambda: robot.record("order", "telemetry"), 0.020, priority=-1)
+    robot.addPeriodic(lambda: robot.record("order", "safety"), 0.020, priority=1)
+    late = robot.addPeriodic(
+        lambda: robot.record("order", "late"), 0.020, priority=-2, deadline=0.005
+    )
+    robot.startCompetition()
+
+    order = robot.calls["order"]
+    assert order[:8] == ["safety", "loop", "telemetry", "late"] * 2
+    # The loop overruns by 67ms twice, too late for the deadline both times
+    assert late.getMissedDeadlines() == 2
+    assert order.count("late") == order.count("loop") - 2
+    assert order.count("telemetry") == order.count("loop")
+
+    robot = OrderRecordingRobot(SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+    robot.addPeriodic(lambda: robot.record("order", "safety"), 0.020, priority=1)
+    robot.setMainLoopPriority(2)
+    robot.startCompetition()
+
+    assert robot.calls["order"][:4] == ["loop", "safety"] * 2
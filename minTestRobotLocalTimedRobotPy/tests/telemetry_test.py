@@ -0,0 +1,152 @@
+"""
+    Decimation and idle skipping of the dashboard updates IterativeRobotPy
+    runs at the end of each loop, and the background NetworkTables flush.
+"""
+
+import threading
+
+import hal
+import pytest
+from wpilib import SmartDashboard
+
+from notifierbackend import SimulatedTimeBackend
+from telemetry import TelemetryStage, TelemetryWorker
+from timedrobotpy import TimedRobotPy
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+
+
+def dueLoops(stage, loops):
+    return [loop for loop in range(1, loops + 1) if stage.isDue()]
+
+
+def test_stage_runs_every_n_loops():
+    stage = TelemetryStage("stage", Counter(), "stage()", lambda: False)
+    assert dueLoops(stage, 3) == [1, 2, 3]
+
+    # Due on the next loop, then every third one
+    stage.configure(everyNLoops=3, skipWhenIdle=True)
+    assert dueLoops(stage, 9) == [1, 4, 7]
+
+    with pytest.raises(ValueError):
+        stage.configure(everyNLoops=0, skipWhenIdle=True)
+
+
+def test_idle_stage_is_skipped_only_when_configured():
+    idle = [True]
+    stage = TelemetryStage("stage", Counter(), "stage()", lambda: idle[0])
+    assert dueLoops(stage, 3) == []
+
+    stage.configure(everyNLoops=1, skipWhenIdle=False)
+    assert dueLoops(stage, 3) == [1, 2, 3]
+
+    stage.configure(everyNLoops=2, skipWhenIdle=True)
+    assert dueLoops(stage, 4) == []
+    idle[0] = False
+    assert dueLoops(stage, 4) == [1, 3]
+
+
+class QuietRobot(TimedRobotPy):
+    def disabledPeriodic(self):
+        pass
+
+    def _simulationPeriodic(self):
+        pass
+
+
+@pytest.fixture
+def robot():
+    hal.initialize()
+    robot = QuietRobot(backend=SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+    robot.updates = {}
+    for name, stage in robot._telemetryStages.items():
+        stage._update = robot.updates[name] = Counter()
+    return robot
+
+
+def runLoops(robot, loops):
+    for _ in range(loops):
+        robot._loopFunc()
+
+
+def test_robot_stages_are_decimated(robot):
+    robot.configureTelemetryStage("Shuffleboard", everyNLoops=4)
+    runLoops(robot, 12)
+
+    assert robot.updates["Shuffleboard"].count == 3
+    # Outside test mode LiveWindow is idle
+    assert robot.updates["LiveWindow"].count == 0
+
+    with pytest.raises(ValueError):
+        robot.configureTelemetryStage("NoSuchStage")
+
+
+def test_smart_dashboard_is_idle_until_a_sendable_is_put(robot, monkeypatch):
+    # Until configured otherwise, it runs whether idle or not
+    runLoops(robot, 3)
+    assert robot.updates["SmartDashboard"].count == 3
+
+    robot.configureTelemetryStage("SmartDashboard", skipWhenIdle=True)
+    runLoops(robot, 3)
+    assert robot.updates["SmartDashboard"].count == 3
+
+    putKeys = []
+    monkeypatch.setattr(SmartDashboard, "putData", lambda key, data: putKeys.append(key))
+    robot.putSmartDashboardData("field", object())
+    runLoops(robot, 3)
+    assert putKeys == ["field"]
+    assert robot.updates["SmartDashboard"].count == 6
+
+
+def test_requests_made_before_the_flush_starts_are_merged():
+    flushStarted = threading.Event()
+    releaseFlush = threading.Event()
+    flushThreads = []
+
+    def flush():
+        flushThreads.append(threading.current_thread())
+        flushStarted.set()
+        releaseFlush.wait(5)
+
+    worker = TelemetryWorker(flush)
+    worker.requestFlush()
+    assert flushStarted.wait(5)
+    # The first flush is running, the next one waits and absorbs the rest
+    for _ in range(3):
+        worker.requestFlush()
+    releaseFlush.set()
+    worker.stop()
+
+    assert worker.flushes == 2
+    assert worker.coalescedFlushes == 2
+    assert flushThreads and threading.current_thread() not in flushThreads
+
+
+class FakeNetworkTableInstance:
+    def __init__(self):
+        self.flushThreads = []
+
+    def flushLocal(self):
+        self.flushThreads.append(threading.current_thread())
+
+
+def test_background_telemetry_reads_sendables_on_the_loop_thread(robot):
+    updateThreads = []
+    robot._telemetryStages["Shuffleboard"]._update = lambda: updateThreads.append(
+        threading.current_thread()
+    )
+    robot._networkTableInstanceDefault = FakeNetworkTableInstance()
+    robot.enableBackgroundTelemetry()
+    runLoops(robot, 20)
+    robot._stopBackgroundTelemetry()
+
+    assert updateThreads == [threading.current_thread()] * 20
+    flushThreads = robot._networkTableInstanceDefault.flushThreads
+    assert flushThreads and threading.current_thread() not in flushThreads
+    assert len(flushThreads) + robot.getDroppedTelemetryCount() == 20
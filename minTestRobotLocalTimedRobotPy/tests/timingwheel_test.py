@@ -0,0 +1,114 @@
+"""
+    TimingWheel ordering across slot wraparound and revolutions, and the
+    scheduler dropping cancelled entries from it.
+"""
+
+import functools
+
+import hal
+
+from notifierbackend import SimulatedTimeBackend
+from timedrobotpy import TimedRobotPy, _Callback, TimingWheel
+
+
+def makeCallback(expirationUs, periodUs=1000):
+    return _Callback(func=lambda: None, periodUs=periodUs, expirationUs=expirationUs)
+
+
+def drain(wheel):
+    return [wheel.pop().expirationUs for _ in range(len(wheel))]
+
+
+def test_items_come_out_in_order_across_wraparound():
+    # Four 10us slots: one revolution is 40us
+    wheel = TimingWheel(resolutionUs=10, numSlots=4)
+    for expirationUs in (35, 5, 42, 18, 71, 29, 40):
+        wheel.add(makeCallback(expirationUs))
+
+    assert len(wheel) == 7
+    assert drain(wheel) == [5, 18, 29, 35, 40, 42, 71]
+    assert wheel.peek() is None
+
+
+def test_far_future_items_wait_for_their_revolution():
+    wheel = TimingWheel(resolutionUs=10, numSlots=4)
+    # Both hash to slot 1, the second one 25 revolutions later
+    near = makeCallback(12)
+    far = makeCallback(1012)
+    wheel.add(far)
+    wheel.add(near)
+    assert wheel.peek() is near
+
+    wheel.pop()
+    # Nothing within a revolution, the wheel jumps to the earliest item
+    assert wheel.peek() is far
+
+
+def test_rescheduled_head_keeps_the_order():
+    wheel = TimingWheel(resolutionUs=10, numSlots=4)
+    callbacks = [makeCallback(expirationUs, periodUs=30) for expirationUs in (0, 10, 20)]
+    for callback in callbacks:
+        wheel.add(callback)
+
+    dispatchedUs = []
+    for _ in range(9):
+        head = wheel.peek()
+        dispatchedUs.append(head.expirationUs)
+        head.setNextStartTimeUs(head.expirationUs)
+        wheel.siftupRoot()
+
+    assert dispatchedUs == list(range(0, 90, 10))
+    assert len(wheel) == 3
+
+
+def test_reposition_moves_an_item_earlier():
+    wheel = TimingWheel(resolutionUs=10, numSlots=4)
+    early = makeCallback(15)
+    late = makeCallback(95)
+    wheel.add(early)
+    wheel.add(late)
+    assert wheel.peek() is early
+
+    late.expirationUs = 5
+    wheel.reposition(late)
+    assert drain(wheel) == [5, 15]
+
+
+class CancellingRobot(TimedRobotPy):
+    def __init__(self, backend):
+        super().__init__(
+            backend=backend,
+            scheduler=functools.partial(TimingWheel, resolutionUs=1000, numSlots=16),
+        )
+        self.loops = 0
+        self.calls = []
+
+    def robotInit(self):
+        self.cancelled = self.addPeriodic(lambda: self.calls.append("cancelled"), 0.020, 0.005)
+        self.kept = self.addPeriodic(lambda: self.calls.append("kept"), 0.020, 0.007)
+
+    def robotPeriodic(self):
+        self.loops += 1
+        if self.loops == 10:
+            self.cancelled.cancel()
+        if self.loops >= 50:
+            self.endCompetition()
+
+    def disabledPeriodic(self):
+        pass
+
+    def _simulationPeriodic(self):
+        pass
+
+
+def test_cancelled_entries_are_dropped_from_the_wheel():
+    hal.initialize()
+    robot = CancellingRobot(SimulatedTimeBackend(startTimeUs=1_000_000, executionTimeScale=0.0))
+    robot.startCompetition()
+
+    assert robot.calls.count("cancelled") == 9
+    assert robot.calls.count("kept") == 49
+    assert {id(entry) for entry in robot._callbacks} == {
+        id(robot._loopCallback),
+        id(robot.kept._entry),
+    }
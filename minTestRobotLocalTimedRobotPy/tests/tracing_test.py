@@ -0,0 +1,60 @@
+"""
+    Tracer returns functions untouched when disabled and records a
+    timeline of entries and exits when enabled.
+"""
+
+import json
+
+from tracing import Tracer
+
+
+class FakeClock:
+    def __init__(self):
+        self.timeUs = 0
+
+    def __call__(self):
+        self.timeUs += 10
+        return self.timeUs
+
+
+def callee():
+    return 42
+
+
+def test_disabled_tracer_returns_the_function_itself():
+    tracer = Tracer(enabled=False)
+    assert tracer.trace(callee) is callee
+    assert tracer.trace(name="named")(callee) is callee
+    assert tracer.events() == []
+
+
+def test_enabled_tracer_records_nested_calls():
+    tracer = Tracer(enabled=True, getTimeUs=FakeClock())
+    inner = tracer.trace(callee, name="inner")
+
+    @tracer.trace
+    def outer():
+        return inner()
+
+    assert outer() == 42
+    assert [(name, isEntry) for name, isEntry, _ in tracer.events()] == [
+        ("test_enabled_tracer_records_nested_calls.<locals>.outer", True),
+        ("inner", True),
+        ("inner", False),
+        ("test_enabled_tracer_records_nested_calls.<locals>.outer", False),
+    ]
+    assert [timeUs for _, _, timeUs in tracer.events()] == [10, 20, 30, 40]
+
+
+def test_chrome_trace_drops_exits_without_entries(tmp_path):
+    tracer = Tracer(enabled=True, capacity=3, getTimeUs=FakeClock())
+    traced = tracer.trace(callee, name="callee")
+    for _ in range(3):
+        traced()
+
+    path = tmp_path / "trace.json"
+    tracer.exportChromeTrace(str(path))
+    traceEvents = json.loads(path.read_text())["traceEvents"]
+    # The ring holds the exit of call 2 and both events of call 3
+    assert [event["ph"] for event in traceEvents] == ["B", "E"]
+    assert [event["ts"] for event in traceEvents] == [50, 60]
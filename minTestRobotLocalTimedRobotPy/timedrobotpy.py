@@ -1,31 +1,81 @@
-from typing import Any, Callable, Iterable, ClassVar
-from heapq import heappush, heappop, _siftup
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from enum import Enum
+import functools
+import gc
+import json
+from typing import Any, Callable, Coroutine, Iterable, ClassVar, Optional
+from heapq import heapify, heappush, heappop, _siftdown, _siftup
+from operator import attrgetter, itemgetter
 from hal import (
     report,
-    initializeNotifier,
-    setNotifierName,
     observeUserProgramStarting,
-    updateNotifierAlarm,
-    waitForNotifierAlarm,
-    stopNotifier,
     tResourceType,
     tInstances,
 )
-from wpilib import RobotController
+from wpilib import reportError
 import wpimath.units
 
-from iterativerobotpy import IterativeRobotPy
+from adaptiveperiod import AdaptivePeriod
+from coroutines import CancelledError, CoroutineTask, _Sleep, kNeverUs
+from gcscheduler import GcScheduler, GcStats
+from iterativerobotpy import IterativeRobotPy, _kModeDisabled
+from latencyhistogram import CallbackHistograms
+from notifierbackend import HalNotifierBackend
+from offload import ExecutionClass, OffloadedCallback, OverlapPolicy
+from schedulerevents import (
+    SchedulerEventRing,
+    kCallbackStart,
+    kCallbackEnd,
+    kReschedule,
+    kOverrunSkip,
+    kDeadlineSkip,
+)
+
+try:
+    import timedrobotmath
+except ModuleNotFoundError:
+    timedrobotmath = None
 
-_getFPGATime = RobotController.getFPGATime
 _kResourceType_Framework = tResourceType.kResourceType_Framework
 _kFramework_Timed = tInstances.kFramework_Timed
 
 microsecondsAsInt = int
 
 
+class CatchUpPolicy(Enum):
+    """
+    What a periodic callback does about the periods it missed when the loop
+    falls behind.
+    """
+
+    # Run once and skip the missed periods, staying on the original schedule.
+    kCoalesce = 0
+    # Run once with the number of periods due since the last run, staying on
+    # the original schedule, so every period is accounted for exactly once.
+    kBatch = 1
+    # Run once, drop the missed periods and restart the schedule one period
+    # after the callback finished.
+    kRealign = 2
+
+
+def _withoutFirst(funcs: tuple, func: Callable) -> tuple:
+    for index, other in enumerate(funcs):
+        if other is func:
+            return funcs[:index] + funcs[index + 1 :]
+    return funcs
+
+
 class _Callback:
+    """
+    A scheduler entry: every function registered with the same period and
+    phase shares one _Callback, so they are dispatched as a unit with a single
+    clock read and a single heap operation per expiration.
+    """
 
-    __slots__ = 'func', '_periodUs', 'expirationUs'
+    __slots__ = (
+        'funcs', '_periodUs', 'expirationUs', 'priority', 'deadlineUs', 'missedDeadlines',
+        'cancelled',
+    )
 
     def __init__(
         self,
@@ -33,9 +83,15 @@ class _Callback:
         periodUs: microsecondsAsInt,
         expirationUs: microsecondsAsInt,
     ) -> None:
-        self.func = func
+        self.funcs: tuple[Callable[[], None], ...] = (func,)
         self._periodUs = periodUs
         self.expirationUs = expirationUs
+        # Only looked at by TimedRobotPy's priority dispatch, see addPeriodic()
+        self.priority = 0
+        self.deadlineUs: Optional[microsecondsAsInt] = None
+        self.missedDeadlines = 0
+        # Set once the entry is emptied, it is dropped when next dispatched
+        self.cancelled = False
 
     @classmethod
     def makeCallBack(
@@ -44,13 +100,15 @@ class _Callback:
         startTimeUs: microsecondsAsInt,
         periodUs: microsecondsAsInt,
         offsetUs: microsecondsAsInt,
+        currentTimeUs: microsecondsAsInt,
+        **kwargs,
     ) -> "_Callback":
 
-        callback = _Callback(func=func, periodUs=periodUs, expirationUs=startTimeUs)
+        callback = cls(func=func, periodUs=periodUs, expirationUs=startTimeUs, **kwargs)
 
-        currentTimeUs = _getFPGATime()
-        callback.expirationUs = offsetUs + callback.calcFutureExpirationUs(
-            currentTimeUs
+        # Every policy starts out on the schedule relative to startTimeUs
+        callback.expirationUs = offsetUs + _Callback.calcFutureExpirationUs(
+            callback, currentTimeUs
         )
         return callback
 
@@ -72,6 +130,13 @@ class _Callback:
         # We assume currentTime ≥ self.expirationUs rather than checking for it since the
         # callback wouldn't be running otherwise.
         #
+        # In the common case nothing was missed and the next expiration is simply
+        # one period later, which avoids the intermediate ints of the general case.
+        expirationUs = self.expirationUs
+        periodUs = self._periodUs
+        if currentTimeUs - expirationUs < periodUs:
+            return expirationUs + periodUs
+        #
         # We take when we previously expired or when we started: self.expirationUs
         # add + self._periodUs to get at least one period in the future
         # then calculate how many whole periods we are behind:
@@ -80,14 +145,63 @@ class _Callback:
         # periods we need to skip to catch up, and add that to the sum to calculate
         # when we should run again.
         return (
-            self.expirationUs
-            + self._periodUs
-            + ((currentTimeUs - self.expirationUs) // self._periodUs) * self._periodUs
+            expirationUs
+            + periodUs
+            + ((currentTimeUs - expirationUs) // periodUs) * periodUs
         )
 
     def setNextStartTimeUs(self, currentTimeUs: microsecondsAsInt) -> None:
         self.expirationUs = self.calcFutureExpirationUs(currentTimeUs)
 
+    def isSameSlot(self, other: "_Callback") -> bool:
+        """
+        :param other: a new entry, at its first expiration.
+
+        :returns: True if other runs on this entry's schedule: it expires at
+                  this entry's expiration or, when this entry is being
+                  dispatched and has not been rescheduled yet, a whole
+                  number of periods after it.
+        """
+        return (
+            type(self) is type(other)
+            and self._periodUs == other._periodUs
+            and self.expirationUs <= other.expirationUs
+            and (other.expirationUs - self.expirationUs) % self._periodUs == 0
+            and self.priority == other.priority
+            and self.deadlineUs == other.deadlineUs
+        )
+
+    def addFunc(self, func: Callable[[], None]) -> None:
+        # A new tuple rather than an append, so that a dispatch which is
+        # iterating over self.funcs is not disturbed.
+        self.funcs = self.funcs + (func,)
+
+    def removeFunc(self, func: Callable[[], None]) -> None:
+        self.funcs = _withoutFirst(self.funcs, func)
+
+    def isEmpty(self) -> bool:
+        return not self.funcs
+
+    def userFuncs(self) -> tuple[Callable[..., None], ...]:
+        """
+        The functions registered with this entry, called with funcArgs().
+        Timing, scheduler events and overrun accounting go by these rather
+        than self.funcs, which a subclass may point at its own dispatcher.
+        """
+        return self.funcs
+
+    def funcArgs(self) -> tuple:
+        """
+        The arguments for this expiration's call of userFuncs().
+        """
+        return ()
+
+    def deliveredPeriods(self) -> int:
+        """
+        The periods the last call of userFuncs() accounted for.
+        """
+        return 1
+
     def __lt__(self, other) -> bool:
         return self.expirationUs < other.expirationUs
 
@@ -95,10 +209,230 @@ class _Callback:
         return True
 
     def __repr__(self) -> str:
-        return f"{{func={self.func.__name__}, _periodUs={self._periodUs}, expirationUs={self.expirationUs}}}"
+        names = ",".join(func.__name__ for func in self.funcs)
+        return f"{{funcs=[{names}], _periodUs={self._periodUs}, expirationUs={self.expirationUs}}}"
+
+
+class _BatchCallback(_Callback):
+    """
+    A _Callback for CatchUpPolicy.kBatch: its functions are called with the
+    number of periods due, computed from the loop start time rather than an
+    extra clock read.
+    """
+
+    __slots__ = '_batchFuncs', '_getLoopStartTimeUs', '_ticks'
+
+    def __init__(
+        self,
+        func: Callable[[int], None],
+        periodUs: microsecondsAsInt,
+        expirationUs: microsecondsAsInt,
+        getLoopStartTimeUs: Callable[[], microsecondsAsInt],
+    ) -> None:
+        super().__init__(self._runBatch, periodUs, expirationUs)
+        self._batchFuncs: tuple[Callable[[int], None], ...] = (func,)
+        self._getLoopStartTimeUs = getLoopStartTimeUs
+        self._ticks = 1
+
+    def _runBatch(self) -> None:
+        ticks = self.funcArgs()[0]
+        for func in self._batchFuncs:
+            func(ticks)
+
+    def funcArgs(self) -> tuple:
+        ticks = (self._getLoopStartTimeUs() - self.expirationUs) // self._periodUs + 1
+        if ticks < 1:
+            ticks = 1
+        self._ticks = ticks
+        return (ticks,)
+
+    def calcFutureExpirationUs(
+        self, currentTimeUs: microsecondsAsInt
+    ) -> microsecondsAsInt:
+        # Advance past exactly the periods that were delivered. If the
+        # callback itself overran, the next run is due at once and delivers
+        # the periods that passed meanwhile.
+        return self.expirationUs + self._ticks * self._periodUs
+
+    def addFunc(self, func: Callable[[int], None]) -> None:
+        self._batchFuncs = self._batchFuncs + (func,)
+
+    def removeFunc(self, func: Callable[[int], None]) -> None:
+        self._batchFuncs = _withoutFirst(self._batchFuncs, func)
+
+    def isEmpty(self) -> bool:
+        return not self._batchFuncs
+
+    def userFuncs(self) -> tuple[Callable[[int], None], ...]:
+        return self._batchFuncs
+
+    def deliveredPeriods(self) -> int:
+        return self._ticks
+
+
+class _RealignCallback(_Callback):
+    """
+    A _Callback for CatchUpPolicy.kRealign.
+    """
+
+    __slots__ = ()
+
+    def calcFutureExpirationUs(
+        self, currentTimeUs: microsecondsAsInt
+    ) -> microsecondsAsInt:
+        if currentTimeUs - self.expirationUs < self._periodUs:
+            return self.expirationUs + self._periodUs
+        # Missed at least one period: drop them and shift the phase.
+        return currentTimeUs + self._periodUs
+
+
+class _CoroutineCallback(_Callback):
+    """
+    The scheduler entry that runs the coroutines started with
+    TimedRobotPy.startCoroutine(): it expires at the earliest time a
+    coroutine is due to resume, kNeverUs when none is, and resumes every
+    coroutine that is due.
+
+    A coroutine runs until it awaits a sleep, which puts it back on this
+    entry's own heap, or another task, which resumes it from that task's
+    end. Each dispatch resumes a coroutine at most once: one that is due
+    again at once, say from sleep(0), waits for the next pass, so it cannot
+    starve the main loop.
+    """
+
+    __slots__ = '_sleeping', '_sequence', '_getTimeUs', '_current', '_due'
+
+    def __init__(self, getTimeUs: Callable[[], microsecondsAsInt]) -> None:
+        super().__init__(self._resumeDue, kNeverUs, kNeverUs)
+        # (wakeUs, sequence, task), the sequence keeps equal wakes in start order
+        self._sleeping: list[tuple[int, int, CoroutineTask]] = []
+        self._sequence = 0
+        self._getTimeUs = getTimeUs
+        self._current: Optional[CoroutineTask] = None
+        # The tasks one dispatch resumes, kept to not allocate a list per dispatch
+        self._due: list[CoroutineTask] = []
+
+    def start(self, coro, wakeUs: microsecondsAsInt) -> CoroutineTask:
+        task = CoroutineTask(coro, self._cancelTask)
+        self._sleepUntil(task, wakeUs)
+        return task
+
+    def _sleepUntil(self, task: CoroutineTask, wakeUs: microsecondsAsInt) -> None:
+        task.wakeUs = wakeUs
+        heappush(self._sleeping, (wakeUs, self._sequence, task))
+        self._sequence += 1
+
+    def calcFutureExpirationUs(
+        self, currentTimeUs: microsecondsAsInt
+    ) -> microsecondsAsInt:
+        if not self._sleeping:
+            return kNeverUs
+        wakeUs = self._sleeping[0][0]
+        # A coroutine already due again runs on the next pass, not this one
+        return wakeUs if wakeUs > currentTimeUs else currentTimeUs + 1
+
+    def moveToEarliestWake(self) -> bool:
+        """
+        Move expirationUs earlier if a coroutine was started or woken
+        outside this entry's dispatch.
+
+        :returns: True if it moved, and the queue needs repositioning.
+        """
+        wakeUs = self.calcFutureExpirationUs(0)
+        if wakeUs < self.expirationUs:
+            self.expirationUs = wakeUs
+            return True
+        return False
+
+    def _resumeDue(self) -> None:
+        nowUs = self._getTimeUs()
+        sleeping = self._sleeping
+        # Taken off the heap before any of them runs, so that a task going
+        # back to sleep until a time already past is left for the next pass.
+        due = self._due
+        while sleeping and sleeping[0][0] <= nowUs:
+            due.append(heappop(sleeping)[2])
+        try:
+            for task in due:
+                # Cancelled tasks are dropped here rather than searched for
+                if not task._done:
+                    self._step(task, task.wakeUs)
+        finally:
+            due.clear()
+
+    def _step(self, task: CoroutineTask, resumeUs: microsecondsAsInt) -> None:
+        self._current = task
+        try:
+            awaited = task._coro.send(None)
+        except StopIteration as stop:
+            self._finish(task, stop.value, None, resumeUs)
+            return
+        except BaseException as exception:
+            self._finish(task, None, exception, resumeUs)
+            return
+        finally:
+            self._current = None
+
+        if isinstance(awaited, _Sleep):
+            if awaited.wakeUs is None:
+                self._sleepUntil(task, resumeUs + awaited.durationUs)
+            else:
+                self._sleepUntil(task, awaited.wakeUs)
+        elif isinstance(awaited, CoroutineTask):
+            awaited._waiters.append(task)
+        else:
+            task._coro.close()
+            self._finish(
+                task,
+                None,
+                TypeError(
+                    f"{task.name} awaited {awaited!r}, coroutines run by TimedRobotPy "
+                    "can only await sleep(), sleepUntilUs() and other CoroutineTasks"
+                ),
+                resumeUs,
+            )
 
+    def _finish(
+        self,
+        task: CoroutineTask,
+        result: Any,
+        exception: Optional[BaseException],
+        resumeUs: microsecondsAsInt,
+    ) -> None:
+        task._done = True
+        task._result = result
+        task._exception = exception
+        waiters = task._waiters
+        task._waiters = []
+        for waiter in waiters:
+            if not waiter._done:
+                self._step(waiter, resumeUs)
+        # Like an inline callback, a failing coroutine nobody awaits stops
+        # the robot loop.
+        if exception is not None and not waiters and not task._cancelled:
+            raise exception
 
-class _OrderedList:
+    def _cancelTask(self, task: CoroutineTask) -> None:
+        if task is self._current:
+            raise RuntimeError(f"{task.name} cannot cancel itself, return instead")
+        task._cancelled = True
+        task._coro.close()
+        self._finish(task, None, CancelledError(), self._getTimeUs())
+
+
+_kCallbackClassByPolicy = {
+    CatchUpPolicy.kCoalesce: _Callback,
+    CatchUpPolicy.kBatch: _BatchCallback,
+    CatchUpPolicy.kRealign: _RealignCallback,
+}
+
+_priorityOf = attrgetter('priority')
+
+
+class OrderedList:
+    """
+    The default callback queue, a binary heap ordered by expirationUs.
+    """
 
     __slots__ = '_data'
 
@@ -122,6 +456,15 @@ class _OrderedList:
     def siftupRoot(self):
         _siftup(self._data, 0)
 
+    def reposition(self, item: Any) -> None:
+        """
+        Restore the order after item's expirationUs moved earlier. O(n),
+        and only safe while no item is being dispatched.
+        """
+        data = self._data
+        index = next(index for index, other in enumerate(data) if other is item)
+        _siftdown(data, 0, index)
+
     def __len__(self) -> int:
         return len(self._data)
 
@@ -135,6 +478,317 @@ class _OrderedList:
         return str(sorted(self._data))
 
 
+class TimingWheel:
+    """
+    A hashed timing wheel with the same add/peek/pop/siftupRoot interface as
+    OrderedList.
+
+    Items are hashed by expirationUs // resolutionUs into one of numSlots
+    slots. Each slot is a small heap, so the earliest item of a slot is at
+    its front and finding the next item to expire only looks at the front
+    of each slot from the current tick on. Items more than one revolution
+    ahead stay in their slot, behind the items of earlier revolutions.
+
+    As with OrderedList, siftupRoot must be called after the expirationUs of
+    the item returned by peek() has been moved later.
+    """
+
+    __slots__ = (
+        '_slots',
+        '_numSlots',
+        '_resolutionUs',
+        '_len',
+        '_cursorTick',
+        '_head',
+        '_headSlot',
+    )
+
+    def __init__(
+        self, resolutionUs: microsecondsAsInt = 1000, numSlots: int = 256
+    ) -> None:
+        self._slots: list[list[Any]] = [[] for _ in range(numSlots)]
+        self._numSlots = numSlots
+        self._resolutionUs = resolutionUs
+        self._len = 0
+        # No item expires before self._cursorTick
+        self._cursorTick = 0
+        self._head = None
+        self._headSlot: list[Any] = []
+
+    def add(self, item: Any) -> None:
+        tick = item.expirationUs // self._resolutionUs
+        heappush(self._slots[tick % self._numSlots], item)
+        if not self._len or tick < self._cursorTick:
+            self._cursorTick = tick
+        self._len += 1
+        if self._head is not None and item < self._head:
+            self._head = None
+
+    def pop(self) -> Any:
+        head = self.peek()
+        heappop(self._headSlot)
+        self._len -= 1
+        self._head = None
+        return head
+
+    def peek(
+        self,
+    ) -> Any:  # todo change to Any | None when we don't build with python 3.9
+        if self._head is None and self._len:
+            self._findHead()
+        return self._head
+
+    def siftupRoot(self):
+        head = self._head
+        heappop(self._headSlot)
+        self._len -= 1
+        self._head = None
+        self.add(head)
+
+    def reposition(self, item: Any) -> None:
+        """
+        Restore the order after item's expirationUs moved earlier. O(n),
+        and only safe while no item is being dispatched.
+        """
+        for slot in self._slots:
+            for index, other in enumerate(slot):
+                if other is item:
+                    slot[index] = slot[-1]
+                    slot.pop()
+                    heapify(slot)
+                    break
+            else:
+                continue
+            break
+        self._len -= 1
+        if item is self._head:
+            self._head = None
+        self.add(item)
+
+    def _findHead(self) -> None:
+        resolutionUs = self._resolutionUs
+        numSlots = self._numSlots
+        slots = self._slots
+        tick = self._cursorTick
+        for _ in range(numSlots):
+            slot = slots[tick % numSlots]
+            # The front of a slot is its earliest item, any other item due
+            # in this tick would be before it.
+            if slot and slot[0].expirationUs // resolutionUs == tick:
+                self._cursorTick = tick
+                self._head = slot[0]
+                self._headSlot = slot
+                return
+            tick += 1
+        # Everything is more than one revolution ahead, jump to the earliest item.
+        headSlot = min((slot for slot in slots if slot), key=itemgetter(0))
+        self._head = headSlot[0]
+        self._headSlot = headSlot
+        self._cursorTick = self._head.expirationUs // resolutionUs
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterable[Any]:
+        return iter(sorted(item for slot in self._slots for item in slot))
+
+    def __contains__(self, item) -> bool:
+        return any(item in slot for slot in self._slots)
+
+    def __repr__(self) -> str:
+        return str(list(self))
+
+
+class NativeCallbackQueue:
+    """
+    A callback queue backed by timedrobotmath.CppCallbackQueue.
+
+    The heap ordering and the reschedule arithmetic run in C++, python only
+    maps the native handles back to _Callback entries. TimedRobotPy dispatches
+    from this queue with popExpiredAndReschedule(), which reschedules relative
+    to the loop start time (as the C++ TimedRobot does) rather than to the time
+    after each callback ran.
+    """
+
+    __slots__ = '_queue', '_callbacks', '_handles', '_freeHandles'
+
+    def __init__(self) -> None:
+        if timedrobotmath is None:
+            raise RuntimeError(
+                "NativeCallbackQueue requires the timedrobotmath extension"
+            )
+        self._queue = timedrobotmath.CppCallbackQueue()
+        # The native handle of a _Callback is its index in this list
+        self._callbacks: list[Optional[_Callback]] = []
+        self._handles: dict[_Callback, int] = {}
+        # Indexes in self._callbacks left by removed entries, to reuse
+        self._freeHandles: list[int] = []
+
+    def add(self, item: _Callback) -> None:
+        if self._freeHandles:
+            handle = self._freeHandles.pop()
+            self._callbacks[handle] = item
+        else:
+            handle = len(self._callbacks)
+            self._callbacks.append(item)
+        self._queue.push(item.expirationUs, item._periodUs, handle)
+        self._handles[item] = handle
+
+    def remove(self, item: _Callback) -> None:
+        """
+        Drop item from the queue, if it is in it.
+        """
+        handle = self._handles.get(item)
+        if handle is not None:
+            self._queue.erase(handle)
+            self._freeHandle(handle, item)
+
+    def _freeHandle(self, handle: int, item: _Callback) -> None:
+        del self._handles[item]
+        self._callbacks[handle] = None
+        self._freeHandles.append(handle)
+
+    def pop(self) -> _Callback:
+        item = self.peek()
+        self._freeHandle(self._queue.popHandle(), item)
+        return item
+
+    def peek(
+        self,
+    ) -> Any:  # todo change to _Callback | None when we don't build with python 3.9
+        if not self._queue.size():
+            return None
+        item = self._callbacks[self._queue.peekHandle()]
+        item.expirationUs = self._queue.peekExpirationUs()
+        return item
+
+    def siftupRoot(self):
+        root = self._callbacks[self._queue.peekHandle()]
+        self._queue.replaceTopExpirationUs(root.expirationUs)
+
+    def popExpiredAndReschedule(
+        self, currentTimeUs: microsecondsAsInt
+    ) -> list[Callable[[], None]]:
+        """
+        Reschedule every entry due at currentTimeUs.
+
+        :returns: the functions to run, in expiration order.
+        """
+        callbacks = self._callbacks
+        return [
+            func
+            for handle in self._queue.popExpiredAndReschedule(currentTimeUs)
+            for func in callbacks[handle].funcs
+        ]
+
+    def syncExpirations(self) -> None:
+        """
+        Copy the expirations the native queue keeps into the _Callbacks.
+        """
+        self._sync()
+
+    def _sync(self) -> list[_Callback]:
+        items = []
+        for handle in self._queue.handles():
+            item = self._callbacks[handle]
+            item.expirationUs = self._queue.expirationUsOf(handle)
+            items.append(item)
+        return items
+
+    def __len__(self) -> int:
+        return self._queue.size()
+
+    def __iter__(self) -> Iterable[Any]:
+        return iter(sorted(self._sync()))
+
+    def __contains__(self, item) -> bool:
+        return item in self._sync()
+
+    def __repr__(self) -> str:
+        return str(sorted(self._sync()))
+
+
+class PeriodicHandle:
+    """
+    Returned by TimedRobotPy.addPeriodic() to cancel the callback or change
+    its period.
+    """
+
+    __slots__ = '_robot', '_func', '_entry', '_offsetUs', '_catchUpPolicy', '_missedDeadlines'
+
+    def __init__(
+        self,
+        robot: "TimedRobotPy",
+        func: Callable[..., None],
+        entry: _Callback,
+        offsetUs: microsecondsAsInt,
+        catchUpPolicy: CatchUpPolicy,
+    ) -> None:
+        self._robot = robot
+        self._func = func
+        self._entry: Optional[_Callback] = entry
+        self._offsetUs = offsetUs
+        self._catchUpPolicy = catchUpPolicy
+        # Deadlines missed in the entries this callback has left
+        self._missedDeadlines = 0
+
+    def isActive(self) -> bool:
+        return self._entry is not None
+
+    def getPeriod(self) -> wpimath.units.seconds:
+        if self._entry is None:
+            raise RuntimeError("the callback has been cancelled")
+        return self._entry._periodUs / 1e6
+
+    def getMissedDeadlines(self) -> int:
+        """
+        The number of times the callback was skipped for being later than its
+        deadline. Callbacks that share a scheduler entry share the count, as
+        they are skipped together.
+        """
+        if self._entry is None:
+            return self._missedDeadlines
+        return self._missedDeadlines + self._entry.missedDeadlines
+
+    def cancel(self) -> bool:
+        """
+        Stop calling the callback from its next expiration on. Once no
+        callback is left in its scheduler entry, the entry is dropped from
+        the queue when it next expires, or at once with
+        NativeCallbackQueue, and costs nothing more.
+
+        :returns: False if it had already been cancelled.
+        """
+        if self._entry is None:
+            return False
+        self._robot._removeFromEntry(self._func, self._entry)
+        self._missedDeadlines += self._entry.missedDeadlines
+        self._entry = None
+        return True
+
+    def setPeriod(self, period: wpimath.units.seconds) -> None:
+        """
+        Call the callback every period seconds from now on, keeping its
+        offset from the common starting time.
+        """
+        entry = self._entry
+        if entry is None:
+            raise RuntimeError("the callback has been cancelled")
+        self._robot._removeFromEntry(self._func, entry)
+        self._missedDeadlines += entry.missedDeadlines
+        self._entry = self._robot._addToEntry(
+            self._func,
+            int(period * 1e6),
+            self._offsetUs,
+            self._catchUpPolicy,
+            entry.priority,
+            entry.deadlineUs,
+        )
+
+    def __repr__(self) -> str:
+        return f"{{func={getattr(self._func, '__qualname__', repr(self._func))}, entry={self._entry}}}"
+
+
 # todo what should the name of this class be?
 class TimedRobotPy(IterativeRobotPy):
     """
@@ -150,29 +804,84 @@ class TimedRobotPy(IterativeRobotPy):
     kDefaultPeriod: ClassVar[wpimath.units.seconds] = (
         0.020  # todo this is a change to keep consistent units in the API
     )
+    kDefaultThreadPoolWorkers: ClassVar[int] = 2
+    kDefaultProcessPoolWorkers: ClassVar[int] = 1
+    # Overruns tend to come in runs, keep writing their events from adding to them
+    kSchedulerEventsDumpIntervalUs: ClassVar[microsecondsAsInt] = 1_000_000
 
-    def __init__(self, period: wpimath.units.seconds = kDefaultPeriod) -> None:
+    def __init__(
+        self,
+        period: wpimath.units.seconds = kDefaultPeriod,
+        scheduler: Optional[Callable[[], Any]] = None,
+        backend: Any = None,
+    ) -> None:
         """
         Constructor for TimedRobotPy.
 
-        :param period: period of the main robot periodic loop in seconds.
+        :param period:    period of the main robot periodic loop in seconds.
+        :param scheduler: factory for the callback queue, either OrderedList
+                          (the default binary heap), TimingWheel or
+                          NativeCallbackQueue. Use functools.partial to pass
+                          TimingWheel a resolution and slot count that suit
+                          the callback periods.
+        :param backend:   the clock and notifier, HalNotifierBackend by
+                          default. SimulatedTimeBackend runs the schedule on a
+                          virtual clock, faster than real time.
         """
         super().__init__(period)
 
+        self._backend = backend or HalNotifierBackend()
+        self._getTimeUs: Callable[[], microsecondsAsInt] = self._backend.getTimeUs
+
         # All periodic functions created by addPeriodic are relative
         # to this self._startTimeUs
-        self._startTimeUs = _getFPGATime()
-        self._callbacks = _OrderedList()
+        self._startTimeUs = self._getTimeUs()
+        self._callbacks = (scheduler or OrderedList)()
+        self._nativeDispatch = isinstance(self._callbacks, NativeCallbackQueue)
+        self._gcScheduler: Optional[GcScheduler] = None
+        self._callbackHistograms: dict[Callable[[], None], CallbackHistograms] = {}
+        self._histogramBucketWidthUs = 0
+        self._histogramNumBuckets = 0
+        self._histogramExportPath: Optional[str] = None
+        # When the last histogram-timed entry ended, where the next one starts
+        # if it is in the same pass.
+        self._lastDispatchEndUs = 0
+        self._schedulerEvents: Optional[SchedulerEventRing] = None
+        self._schedulerEventsOverrunPath: Optional[str] = None
+        self._lastSchedulerEventsDumpUs = 0
+        self._schedulerEventsDump: Optional[Future] = None
+        self._adaptivePeriod: Optional[AdaptivePeriod] = None
+        self._periodListeners: list[Callable[[wpimath.units.seconds], None]] = []
+        self._executors: dict[ExecutionClass, Executor] = {}
+        self._ownedExecutors: list[Executor] = []
+        self._offloadedCallbacks: list[OffloadedCallback] = []
+        self._coroutineCallback: Optional[_CoroutineCallback] = None
+        # Entries that would displace an entry being dispatched wait for the
+        # top of the loop to be added, where none is.
+        self._pendingAdds: list[_Callback] = []
+        # The entries user callbacks can join, by (type, period, priority,
+        # deadline), so that addPeriodic() only compares the entries that
+        # could share its slot.
+        self._entriesBySlot: dict[tuple, list[_Callback]] = {}
         self._loopStartTimeUs = 0
-        self.addPeriodic(self._loopFunc, period=self._periodS)
+        # The main loop keeps a dedicated entry, user callbacks are only
+        # grouped among themselves.
+        self._loopCallback = _Callback.makeCallBack(
+            self._loopFunc,
+            self._startTimeUs,
+            int(self._periodS * 1e6),
+            0,
+            self._startTimeUs,
+        )
+        self._callbacks.add(self._loopCallback)
 
-        self._notifier, status = initializeNotifier()
+        self._notifier, status = self._backend.initializeNotifier()
         if status != 0:
             raise RuntimeError(
                 f"initializeNotifier() returned {self._notifier}, {status}"
             )
 
-        status = setNotifierName(self._notifier, "TimedRobotPy")
+        status = self._backend.setNotifierName(self._notifier, "TimedRobotPy")
         if status != 0:
             raise RuntimeError(f"setNotifierName() returned {status}")
 
@@ -188,19 +897,54 @@ class TimedRobotPy(IterativeRobotPy):
             if self.isSimulation():
                 self._simulationInit()
 
+            if self._realtimeMode:
+                # Everything robotInit() created is long lived, keep it out of
+                # future collections.
+                gc.collect()
+                gc.freeze()
+
+            gcScheduler = self._gcScheduler
+            if gcScheduler is not None:
+                gcScheduler.start()
+
             # Tell the DS that the robot is ready to be enabled
             print("********** Robot program startup complete **********", flush=True)
             observeUserProgramStarting()
 
+            getTimeUs = self._getTimeUs
+            updateNotifierAlarm = self._backend.updateNotifierAlarm
+            waitForNotifierAlarm = self._backend.waitForNotifierAlarm
+            if self._schedulerEvents is not None:
+                updateNotifierAlarm, waitForNotifierAlarm = self._schedulerEvents.wrapNotifier(
+                    getTimeUs, updateNotifierAlarm, waitForNotifierAlarm
+                )
+
+            pendingAdds = self._pendingAdds
+
             # Loop forever, calling the appropriate mode-dependent function
             # (really not forever, there is a check for a break)
             while True:
+                if pendingAdds:
+                    self._applyPendingAdds()
+
                 #  We don't have to check there's an element in the queue first because
                 #  there's always at least one (the constructor adds one). It's re-enqueued
                 #  at the end of the loop.
+                # Coroutines started or woken outside the coroutine entry's own
+                # dispatch can move it earlier, which is only safe to apply here.
+                coroutineCallback = self._coroutineCallback
+                if coroutineCallback is not None and coroutineCallback.moveToEarliestWake():
+                    self._callbacks.reposition(coroutineCallback)
+
                 #callback = self._callbacks.pop()
                 callback = self._callbacks.peek()
 
+                if gcScheduler is not None:
+                    gcScheduler.collectInSlack(
+                        callback.expirationUs - getTimeUs(),
+                        self._mode is _kModeDisabled,
+                    )
+
                 status = updateNotifierAlarm(self._notifier, callback.expirationUs)
                 if status != 0:
                     raise RuntimeError(f"updateNotifierAlarm() returned {status}")
@@ -211,7 +955,7 @@ class TimedRobotPy(IterativeRobotPy):
                 # the loopStart time. Uncomment it and
                 # the "self._loopStartTimeUs = startTimeUs" further below to emulate the
                 # legacy behavior.
-                # startTimeUs = _getFPGATime() # uncomment this for legacy behavior
+                # startTimeUs = getTimeUs() # uncomment this for legacy behavior
 
                 if status != 0:
                     raise RuntimeError(
@@ -233,40 +977,559 @@ class TimedRobotPy(IterativeRobotPy):
                 # and there is about 70 microseconds of skid from self._loopStartTimeUs to startTimeUs.
                 # Consequently, this code uses "self._loopStartTimeUs, status = waitForNotifierAlarm"
                 # to establish loopStartTime, rather than slowing down the code by adding an extra call to
-                # "startTimeUs = _getFPGATime()".
+                # "startTimeUs = getTimeUs()".
 
                 # self._loopStartTimeUs = startTimeUs # Uncomment this line for legacy behavior.
 
-                self._runCallbackAndReschedule(callback)
-
-                #  Process all other callbacks that are ready to run
-                while self._callbacks.peek().expirationUs <= self._loopStartTimeUs:
-                    #callback = self._callbacks.pop()
-                    callback = self._callbacks.peek()
-                    self._runCallbackAndReschedule(callback)
+                self._runExpiredCallbacks()
         finally:
             # pytests hang on PC when we don't force a call to self._stopNotifier()
             self._stopNotifier()
+            self._stopBackgroundTelemetry()
+            self._waitForSchedulerEventsDump()
+            self._shutdownExecutors()
+            if self._gcScheduler is not None:
+                self._gcScheduler.stop()
+
+    def _runExpiredCallbacks(self) -> None:
+        """
+        Run the callback the notifier woke up for and every other callback
+        that expires at or before self._loopStartTimeUs.
+        """
+        if self._nativeDispatch:
+            for func in self._callbacks.popExpiredAndReschedule(self._loopStartTimeUs):
+                func()
+            return
+
+        #callback = self._callbacks.pop()
+        callback = self._callbacks.peek()
+
+        #  Process it and all other callbacks that are ready to run
+        while True:
+            if callback.cancelled:
+                # Lazily deleted, see _removeFromEntry()
+                self._callbacks.pop()
+            else:
+                self._runCallbackAndReschedule(callback)
+            callback = self._callbacks.peek()
+            if callback.expirationUs > self._loopStartTimeUs:
+                break
 
     def _runCallbackAndReschedule(self, callback: _Callback) -> None:
-        callback.func()
+        for func in callback.funcs:
+            func()
         # The c++ implementation used the current time before the callback ran,
-        # to reschedule. By using _getFPGATime(), on a callback.func()
-        # that ran long we immediately push the next invocation to the
-        # following period.
-        callback.setNextStartTimeUs(_getFPGATime())
+        # to reschedule. By using the time after callback.func() ran, on a
+        # callback.func() that ran long we immediately push the next invocation
+        # to the following period.
+        callback.setNextStartTimeUs(self._getTimeUs())
         #assert callback is self._callbacks.peek()
         self._callbacks.siftupRoot()
         #self._callbacks.add(callback)
 
+    def _runExpiredCallbacksByPriority(self) -> None:
+        """
+        _runExpiredCallbacks() once a callback has a priority or a deadline:
+        every entry due at self._loopStartTimeUs is taken off the queue and
+        run highest priority first, in expiration order within a priority.
+        An entry later than its deadline when its turn comes is skipped and
+        counted instead of run.
+        """
+        callbacks = self._callbacks
+        loopStartTimeUs = self._loopStartTimeUs
+        due = [callbacks.pop()]
+        nextCallback = callbacks.peek()
+        while nextCallback is not None and nextCallback.expirationUs <= loopStartTimeUs:
+            due.append(callbacks.pop())
+            nextCallback = callbacks.peek()
+        # The sort is stable, also reversed, so expiration order is kept
+        # within a priority.
+        due.sort(key=_priorityOf, reverse=True)
+
+        runFuncs = self._runFuncs
+        schedulerEvents = self._schedulerEvents
+        # Each entry's end time is the next one's start time, so deadlines
+        # cost no extra clock reads.
+        nowUs = loopStartTimeUs
+        for callback in due:
+            if callback.cancelled:
+                # Lazily deleted, see _removeFromEntry()
+                continue
+            expirationUs = callback.expirationUs
+            deadlineUs = callback.deadlineUs
+            if deadlineUs is not None and nowUs - expirationUs > deadlineUs:
+                callback.missedDeadlines += 1
+                if schedulerEvents is not None:
+                    schedulerEvents.record(
+                        kDeadlineSkip,
+                        nowUs,
+                        schedulerEvents.callbackId(callback),
+                        nowUs - expirationUs,
+                    )
+            else:
+                nowUs = runFuncs(callback)
+            callback.setNextStartTimeUs(nowUs)
+            if schedulerEvents is not None:
+                self._recordReschedule(callback, expirationUs, nowUs)
+            callbacks.add(callback)
+
+    def _runFuncs(self, callback: _Callback) -> microsecondsAsInt:
+        """
+        Run the functions of callback, for _runExpiredCallbacksByPriority().
+
+        :returns: the time they ended.
+        """
+        for func in callback.funcs:
+            func()
+        return self._getTimeUs()
+
+    def _enablePriorityDispatch(self) -> None:
+        if self._nativeDispatch:
+            raise ValueError("priorities and deadlines are not supported with NativeCallbackQueue")
+        self._runExpiredCallbacks = self._runExpiredCallbacksByPriority
+
+    def setMainLoopPriority(self, priority: int) -> None:
+        """
+        Set where the main loop runs among the callbacks due in the same
+        tick, see the priority of addPeriodic(). It is 0 by default, like
+        the callbacks, so a callback given a negative priority runs after it
+        and one given a positive priority before it.
+
+        Not available with NativeCallbackQueue.
+        """
+        self._enablePriorityDispatch()
+        self._loopCallback.priority = priority
+
+    def enableManagedGc(self, marginUs: microsecondsAsInt = 200) -> None:
+        """
+        Disable automatic garbage collection while startCompetition() runs
+        and collect only in the idle time before the next callback expires.
+
+        Young generations are collected when their estimated cost fits in the
+        idle time, full collections only while the robot is disabled. See
+        getGcStats() for what was collected and deferred.
+
+        Call this from the constructor or robotInit().
+
+        :param marginUs: idle time to leave over after a collection's
+                         estimated cost.
+        """
+        self._gcScheduler = GcScheduler(self._getTimeUs, marginUs)
+
+    def getGcStats(self) -> Optional[GcStats]:
+        """
+        Collection counts, times and deferrals by generation, or None when
+        enableManagedGc() has not been called.
+        """
+        if self._gcScheduler is None:
+            return None
+        return self._gcScheduler.stats
+
+    def _runCallbackAndRescheduleWithHistograms(self, callback: _Callback) -> None:
+        callback.setNextStartTimeUs(self._runFuncsWithHistograms(callback))
+        self._callbacks.siftupRoot()
+
+    def _runFuncsWithHistograms(self, callback: _Callback) -> microsecondsAsInt:
+        # The first entry of a pass starts at the loop start time, every
+        # other one when the entry before it ended, and each function's end
+        # time is the next one's start time, so timing costs one clock read
+        # per function and none for the reschedule.
+        histograms = self._callbackHistograms
+        getTimeUs = self._getTimeUs
+        expirationUs = callback.expirationUs
+        startUs = self._lastDispatchEndUs
+        if startUs < self._loopStartTimeUs:
+            startUs = self._loopStartTimeUs
+        args = callback.funcArgs()
+        for func in callback.userFuncs():
+            funcHistograms = histograms[func]
+            func(*args)
+            endUs = getTimeUs()
+            funcHistograms.skid.record(startUs - expirationUs)
+            funcHistograms.execution.record(endUs - startUs)
+            startUs = endUs
+        self._lastDispatchEndUs = startUs
+        return startUs
+
+    def _registerCallbackHistograms(self, entry: _Callback) -> None:
+        """
+        Allocate the histograms of entry's functions that have none yet, if
+        enableCallbackHistograms() has been called, so that the dispatch only
+        counts into them.
+        """
+        if not self._histogramNumBuckets:
+            return
+        histograms = self._callbackHistograms
+        for func in entry.userFuncs():
+            if func not in histograms:
+                histograms[func] = CallbackHistograms(
+                    getattr(func, "__qualname__", repr(func)),
+                    self._histogramBucketWidthUs,
+                    self._histogramNumBuckets,
+                )
+
+    def enableCallbackHistograms(
+        self,
+        bucketWidthUs: microsecondsAsInt = 10,
+        numBuckets: int = 500,
+        exportPath: Optional[str] = None,
+    ) -> None:
+        """
+        Record a start skid and an execution time histogram for every
+        callback, including the main loop function.
+
+        Start skid is the time from a callback's scheduled expiration to when
+        it started. A callback's histograms are allocated here or when it is
+        added, the dispatch only counts into them. Not available with
+        NativeCallbackQueue, which bypasses the python dispatch, nor together
+        with enableSchedulerEvents(), which instruments the same dispatch.
+
+        :param bucketWidthUs: width of each bucket in microseconds.
+        :param numBuckets:    number of buckets, the last one also counts
+                              everything beyond it.
+        :param exportPath:    if given, endCompetition() writes the histograms
+                              there as JSON.
+        """
+        if self._nativeDispatch:
+            raise ValueError("callback histograms are not supported with NativeCallbackQueue")
+        if self._schedulerEvents is not None:
+            raise ValueError("callback histograms are not supported with scheduler events")
+        self._histogramBucketWidthUs = bucketWidthUs
+        self._histogramNumBuckets = numBuckets
+        self._histogramExportPath = exportPath
+        self._callbackHistograms.clear()
+        for entry in self._callbacks:
+            self._registerCallbackHistograms(entry)
+        for entry in self._pendingAdds:
+            self._registerCallbackHistograms(entry)
+        self._runCallbackAndReschedule = self._runCallbackAndRescheduleWithHistograms
+        self._runFuncs = self._runFuncsWithHistograms
+
+    def getCallbackHistograms(self) -> list[CallbackHistograms]:
+        """
+        The histograms recorded since enableCallbackHistograms(), one entry
+        per callback function.
+        """
+        return list(self._callbackHistograms.values())
+
+    def exportCallbackHistograms(self, path: str) -> None:
+        """
+        Write the callback histograms to path as JSON.
+        """
+        with open(path, "w") as f:
+            json.dump(
+                [histograms.toDict() for histograms in self._callbackHistograms.values()],
+                f,
+                indent=2,
+            )
+
+    def enableAdaptivePeriod(
+        self,
+        maxPeriod: wpimath.units.seconds = 0.050,
+        minPeriod: Optional[wpimath.units.seconds] = None,
+        windowLoops: int = 50,
+    ) -> None:
+        """
+        Let the main loop period follow the loop's execution time, see
+        AdaptivePeriod: a loop that persistently overruns is run less often
+        instead of skipping periods, and runs more often again once there
+        is slack.
+
+        Only the main loop's period adapts, callbacks added with
+        addPeriodic() keep theirs. getPeriod() and the watchdog timeout follow
+        the effective period, and addPeriodListener() listeners are told when
+        it changes. Not available with NativeCallbackQueue, which keeps its
+        own copy of the periods.
+
+        Call this from the constructor or robotInit().
+
+        :param maxPeriod:   the longest period to stretch to.
+        :param minPeriod:   the shortest period to shrink to, the period
+                            given to the constructor by default.
+        :param windowLoops: loops between adjustments.
+        """
+        if self._nativeDispatch:
+            raise ValueError("adaptive period is not supported with NativeCallbackQueue")
+        periodUs = self._loopCallback._periodUs
+        self._adaptivePeriod = AdaptivePeriod(
+            periodUs,
+            periodUs if minPeriod is None else int(minPeriod * 1e6),
+            int(maxPeriod * 1e6),
+            windowLoops,
+        )
+        self._loopCallback.funcs = (self._loopFuncWithAdaptivePeriod,)
+        self._registerCallbackHistograms(self._loopCallback)
+
+    def addPeriodListener(
+        self, listener: Callable[[wpimath.units.seconds], None]
+    ) -> None:
+        """
+        Call listener with the new main loop period, in seconds, whenever
+        enableAdaptivePeriod() changes it. It is called from the main loop
+        before the next period starts.
+        """
+        self._periodListeners.append(listener)
+
+    def _loopFuncWithAdaptivePeriod(self) -> None:
+        getTimeUs = self._getTimeUs
+        startUs = getTimeUs()
+        self._loopFunc()
+        if self._adaptivePeriod.record(getTimeUs() - startUs):
+            self._setEffectivePeriodUs(self._adaptivePeriod.periodUs)
+
+    def _setEffectivePeriodUs(self, periodUs: microsecondsAsInt) -> None:
+        # The main loop entry is rescheduled after this returns, so the new
+        # period already applies to its next expiration.
+        self._loopCallback._periodUs = periodUs
+        self._periodS = periodUs / 1e6
+        self.watchdog.setTimeout(self._periodS)
+        for listener in self._periodListeners:
+            listener(self._periodS)
+
+    def _runCallbackAndRescheduleWithEvents(self, callback: _Callback) -> None:
+        expirationUs = callback.expirationUs
+        endUs = self._runFuncsWithEvents(callback)
+        callback.setNextStartTimeUs(endUs)
+        self._recordReschedule(callback, expirationUs, endUs)
+        self._callbacks.siftupRoot()
+
+    def _runFuncsWithEvents(self, callback: _Callback) -> microsecondsAsInt:
+        schedulerEvents = self._schedulerEvents
+        getTimeUs = self._getTimeUs
+        callbackId = schedulerEvents.callbackId(callback)
+        schedulerEvents.record(kCallbackStart, getTimeUs(), callbackId, callback.expirationUs)
+        for func in callback.funcs:
+            func()
+        endUs = getTimeUs()
+        schedulerEvents.record(kCallbackEnd, endUs, callbackId)
+        return endUs
+
+    def _recordReschedule(
+        self, callback: _Callback, expirationUs: microsecondsAsInt, endUs: microsecondsAsInt
+    ) -> None:
+        schedulerEvents = self._schedulerEvents
+        callbackId = schedulerEvents.callbackId(callback)
+        nextExpirationUs = callback.expirationUs
+        schedulerEvents.record(kReschedule, endUs, callbackId, nextExpirationUs)
+        skippedPeriods = (
+            (nextExpirationUs - expirationUs) // callback._periodUs - callback.deliveredPeriods()
+        )
+        if skippedPeriods > 0:
+            schedulerEvents.record(kOverrunSkip, endUs, callbackId, skippedPeriods)
+
+    def enableSchedulerEvents(
+        self, capacity: int = 4096, overrunPath: Optional[str] = None
+    ) -> None:
+        """
+        Record notifier alarms and wake ups, callback starts and ends,
+        reschedules, overrun skips and deadline skips into a ring of the latest capacity
+        events, see SchedulerEventRing.
+
+        A wake event records the time waitForNotifierAlarm() returned
+        against the alarm time requested, which is the skid described in
+        startCompetition(). Callback events are not recorded with
+        NativeCallbackQueue, which bypasses the python dispatch. Not available
+        together with enableCallbackHistograms(), which instruments the same
+        dispatch.
+
+        Call this from the constructor or robotInit().
+
+        :param capacity:    events kept.
+        :param overrunPath: if given, the ring is written there as Chrome
+                            trace-event JSON when the watchdog reports a loop
+                            overrun, at most once per kSchedulerEventsDumpIntervalUs.
+                            The loop only copies the ring, a kThreadPool
+                            worker writes the copy.
+        """
+        if self._histogramNumBuckets:
+            raise ValueError("scheduler events are not supported with callback histograms")
+        self._schedulerEvents = SchedulerEventRing(capacity)
+        self._schedulerEventsOverrunPath = overrunPath
+        self._runCallbackAndReschedule = self._runCallbackAndRescheduleWithEvents
+        self._runFuncs = self._runFuncsWithEvents
+
+    def getSchedulerEvents(self) -> Optional[SchedulerEventRing]:
+        """
+        The scheduler event ring, or None when enableSchedulerEvents() has
+        not been called.
+        """
+        return self._schedulerEvents
+
+    def dumpSchedulerEvents(self, path: str) -> None:
+        """
+        Write the scheduler event ring to path as Chrome trace-event JSON.
+        """
+        if self._schedulerEvents is None:
+            raise RuntimeError("enableSchedulerEvents() has not been called")
+        self._schedulerEvents.dump(path)
+
+    def printWatchdogEpochs(self) -> None:
+        super().printWatchdogEpochs()
+        if self._schedulerEventsOverrunPath is None:
+            return
+        nowUs = self._getTimeUs()
+        if (
+            not self._lastSchedulerEventsDumpUs
+            or nowUs - self._lastSchedulerEventsDumpUs >= self.kSchedulerEventsDumpIntervalUs
+        ):
+            dump = self._schedulerEventsDump
+            if dump is not None and not dump.done():
+                # Still writing the previous overrun
+                return
+            self._lastSchedulerEventsDumpUs = nowUs
+            self._schedulerEventsDump = self._getExecutor(ExecutionClass.kThreadPool).submit(
+                self._schedulerEvents.copy().dump, self._schedulerEventsOverrunPath
+            )
+
+    def _waitForSchedulerEventsDump(self) -> None:
+        dump = self._schedulerEventsDump
+        if dump is None:
+            return
+        try:
+            dump.result()
+        except Exception as e:
+            reportError(f"writing the scheduler events failed: {e}", False)
+
+    def startCoroutine(self, coro: Coroutine) -> CoroutineTask:
+        """
+        Run a coroutine on the notifier, in line with the main loop and the
+        other callbacks, without threads or an asyncio event loop.
+
+        The coroutine first runs on the next pass of the main loop and then
+        whenever what it awaits is done: coroutines.sleep() and
+        sleepUntilUs() on the FPGA clock, or another CoroutineTask. It
+        costs nothing while it sleeps, all coroutines share one scheduler
+        entry that only expires when one of them is due.
+
+        Await only those, asyncio's own awaitables need an asyncio loop.
+        Not available with NativeCallbackQueue.
+
+        :returns: the task, to cancel or await it.
+        """
+        if self._nativeDispatch:
+            raise ValueError("coroutines are not supported with NativeCallbackQueue")
+        if self._coroutineCallback is None:
+            self._coroutineCallback = _CoroutineCallback(self._getTimeUs)
+            self._registerCallbackHistograms(self._coroutineCallback)
+            self._callbacks.add(self._coroutineCallback)
+        return self._coroutineCallback.start(coro, self._getTimeUs())
+
+    def _applyPendingAdds(self) -> None:
+        for entry in self._pendingAdds:
+            if not entry.cancelled:
+                self._callbacks.add(entry)
+        self._pendingAdds.clear()
+
+    @staticmethod
+    def _slotKey(entry: _Callback) -> tuple:
+        return type(entry), entry._periodUs, entry.priority, entry.deadlineUs
+
+    def _removeFromEntry(self, func: Callable[..., None], entry: _Callback) -> None:
+        entry.removeFunc(func)
+        if not entry.isEmpty():
+            return
+        # An empty entry leaves its slot, so that nothing refills it, and is
+        # dropped from the queue when it is next dispatched, rather than
+        # searched for now. The native queue does not dispatch through
+        # python, so it drops the entry at once.
+        entry.cancelled = True
+        self._entriesBySlot[self._slotKey(entry)].remove(entry)
+        if self._nativeDispatch:
+            self._callbacks.remove(entry)
+
+    def _addToEntry(
+        self,
+        func: Callable[..., None],
+        periodUs: microsecondsAsInt,
+        offsetUs: microsecondsAsInt,
+        catchUpPolicy: CatchUpPolicy,
+        priority: int = 0,
+        deadlineUs: Optional[microsecondsAsInt] = None,
+    ) -> _Callback:
+        """
+        Add func to the entry for its slot, creating one if there is none.
+
+        :returns: the entry.
+        """
+        kwargs = {}
+        if catchUpPolicy is CatchUpPolicy.kBatch:
+            kwargs["getLoopStartTimeUs"] = self.getLoopStartTime
+        cb = _kCallbackClassByPolicy[catchUpPolicy].makeCallBack(
+            func,
+            self._startTimeUs,
+            periodUs,
+            offsetUs,
+            self._getTimeUs(),
+            **kwargs,
+        )
+        cb.priority = priority
+        cb.deadlineUs = deadlineUs
+        slotEntries = self._entriesBySlot.setdefault(self._slotKey(cb), [])
+        if slotEntries and self._nativeDispatch:
+            # The native queue keeps the expirations
+            self._callbacks.syncExpirations()
+        # Also finds the entry of a callback adding another to its own slot,
+        # which still has the expiration it is being dispatched for.
+        for group in slotEntries:
+            if group.isSameSlot(cb):
+                group.addFunc(func)
+                self._registerCallbackHistograms(group)
+                return group
+        slotEntries.append(cb)
+        self._registerCallbackHistograms(cb)
+        # An entry that expires before the one at the front of the queue
+        # would displace it, which must wait if that one is being dispatched.
+        root = self._callbacks.peek()
+        if root is not None and cb < root:
+            self._pendingAdds.append(cb)
+        else:
+            self._callbacks.add(cb)
+        return cb
+
+    def setExecutor(self, executionClass: ExecutionClass, executor: Executor) -> None:
+        """
+        Use executor for callbacks added with executionClass, instead of the
+        pool TimedRobotPy would create on first use. The caller keeps
+        ownership and shuts it down.
+        """
+        if executionClass is ExecutionClass.kInline:
+            raise ValueError("inline callbacks do not use an executor")
+        self._executors[executionClass] = executor
+
+    def _getExecutor(self, executionClass: ExecutionClass) -> Executor:
+        executor = self._executors.get(executionClass)
+        if executor is None:
+            if executionClass is ExecutionClass.kThreadPool:
+                executor = ThreadPoolExecutor(
+                    self.kDefaultThreadPoolWorkers, thread_name_prefix="TimedRobotPy"
+                )
+            else:
+                executor = ProcessPoolExecutor(self.kDefaultProcessPoolWorkers)
+            self._executors[executionClass] = executor
+            self._ownedExecutors.append(executor)
+        return executor
+
+    def _shutdownExecutors(self) -> None:
+        for executor in self._ownedExecutors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def getOffloadedCallbacks(self) -> list[OffloadedCallback]:
+        """
+        The callbacks added with a thread or process pool execution class,
+        with their submitted, skipped, cancelled and failed counts.
+        """
+        return list(self._offloadedCallbacks)
+
     def _stopNotifier(self):
-        stopNotifier(self._notifier)
+        self._backend.stopNotifier(self._notifier)
 
     def endCompetition(self) -> None:
         """
         Ends the main loop in startCompetition().
         """
         self._stopNotifier()
+        if self._histogramExportPath is not None:
+            self.exportCallbackHistograms(self._histogramExportPath)
 
     def getLoopStartTime(self) -> microsecondsAsInt:
         """
@@ -285,26 +1548,78 @@ class TimedRobotPy(IterativeRobotPy):
 
     def addPeriodic(
         self,
-        callback: Callable[[], None],
+        callback: Callable[..., None],
         period: wpimath.units.seconds,
         offset: wpimath.units.seconds = 0.0,
-    ) -> None:
+        catchUpPolicy: CatchUpPolicy = CatchUpPolicy.kCoalesce,
+        executionClass: ExecutionClass = ExecutionClass.kInline,
+        overlapPolicy: OverlapPolicy = OverlapPolicy.kSkip,
+        priority: int = 0,
+        deadline: Optional[wpimath.units.seconds] = None,
+    ) -> PeriodicHandle:
         """
         Add a callback to run at a specific period with a starting time offset.
 
-        This is scheduled on TimedRobotPy's Notifier, so TimedRobotPy and the callback
-        run synchronously. Interactions between them are thread-safe.
+        This is scheduled on TimedRobotPy's Notifier, so TimedRobotPy and an inline
+        callback run synchronously. Interactions between them are thread-safe.
+        A callback with another execution class is submitted to its pool when
+        due, so it runs concurrently with the main loop and must synchronize
+        any state it shares with it.
 
         :param callback: The callback to run.
         :param period:   The period at which to run the callback.
         :param offset:   The offset from the common starting time. This is useful
                          for scheduling a callback in a different timeslot relative
                          to TimedRobotPy.
+        :param catchUpPolicy: What to do about periods missed when the loop
+                         falls behind. With CatchUpPolicy.kBatch the callback
+                         is called with the number of periods due, an int.
+        :param executionClass: where the callback runs, see ExecutionClass.
+        :param overlapPolicy: what to do when an offloaded callback is due while
+                         its previous invocation has not finished, see
+                         OverlapPolicy. Ignored for inline callbacks.
+        :param priority: where the callback runs among the callbacks due in
+                         the same tick, higher first. The main loop is at 0
+                         unless setMainLoopPriority() moves it.
+        :param deadline: how late after its scheduled time the callback may
+                         still start. When it is later than that, because the
+                         loop fell behind or higher priority callbacks ran
+                         long, it is skipped until its next period and counted,
+                         see PeriodicHandle.getMissedDeadlines(). Not
+                         available with CatchUpPolicy.kBatch, which accounts
+                         for every period.
+
+        Callbacks registered with the same period, offset, catch up policy,
+        priority and deadline share a single scheduler entry and run, in
+        registration order, as one unit.
+
+        Until a priority or deadline is given, callbacks due in the same tick
+        run in expiration order and nothing is sorted. Neither is available
+        with NativeCallbackQueue.
+
+        Callbacks can be added at any time, also from other callbacks.
+
+        :returns: a handle to cancel the callback or change its period.
         """
-        cb = _Callback.makeCallBack(
-            callback, self._startTimeUs, int(period * 1e6), int(offset * 1e6)
+        if self._nativeDispatch and catchUpPolicy is not CatchUpPolicy.kCoalesce:
+            raise ValueError(
+                f"{catchUpPolicy} is not supported with NativeCallbackQueue"
+            )
+        deadlineUs = None if deadline is None else int(deadline * 1e6)
+        if deadlineUs is not None and catchUpPolicy is CatchUpPolicy.kBatch:
+            raise ValueError(f"a deadline is not supported with {catchUpPolicy}")
+        if priority or deadlineUs is not None:
+            self._enablePriorityDispatch()
+        if executionClass is not ExecutionClass.kInline:
+            callback = OffloadedCallback(
+                callback,
+                functools.partial(self._getExecutor, executionClass),
+                overlapPolicy,
+            )
+            self._offloadedCallbacks.append(callback)
+        offsetUs = int(offset * 1e6)
+        entry = self._addToEntry(
+            callback, int(period * 1e6), offsetUs, catchUpPolicy, priority, deadlineUs
         )
-        if len(self._callbacks):
-            assert cb > self._callbacks.peek()
-        self._callbacks.add(cb)
+        return PeriodicHandle(self, callback, entry, offsetUs, catchUpPolicy)
 
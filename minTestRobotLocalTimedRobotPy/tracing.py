@@ -0,0 +1,126 @@
+import functools
+import json
+from typing import Callable, Optional
+
+from wpilib import RobotController
+
+from calllog import CallLogRecorder
+
+microsecondsAsInt = int
+
+
+class Tracer:
+    """
+    Records entry and exit times of traced functions, for a timeline of
+    when each one ran.
+
+    Tracing is decided when a function is decorated: a disabled Tracer
+    returns the function itself, so it costs nothing. An enabled one wraps
+    it to record an (id, time) pair on entry and on exit into a
+    CallLogRecorder, with exits stored as negative ids, and formats nothing
+    until the events are printed or exported.
+
+    The buffer is not locked, trace functions run by one thread only.
+    """
+
+    __slots__ = 'enabled', '_log', '_getTimeUs'
+
+    def __init__(
+        self,
+        enabled: bool,
+        capacity: int = 65536,
+        path: Optional[str] = None,
+        useMmap: bool = False,
+        getTimeUs: Optional[Callable[[], microsecondsAsInt]] = None,
+    ) -> None:
+        """
+        :param enabled:   whether functions decorated from now on are traced.
+        :param capacity:  events kept, see CallLogRecorder.
+        :param path:      file to stream the raw events to, see CallLogRecorder.
+        :param useMmap:   see CallLogRecorder.
+        :param getTimeUs: the clock, the FPGA time by default.
+        """
+        self.enabled = enabled
+        self._log = CallLogRecorder(capacity, path, useMmap) if enabled else None
+        self._getTimeUs = getTimeUs or RobotController.getFPGATime
+
+    def trace(self, func: Optional[Callable] = None, *, name: Optional[str] = None):
+        """
+        Decorate func, as @tracer.trace or @tracer.trace(name=...), or wrap
+        a callback with tracer.trace(callback, name=...).
+
+        :param name: the name on the timeline, func's qualified name by default.
+
+        :returns: func itself when tracing is disabled.
+        """
+        if func is None:
+            return functools.partial(self.trace, name=name)
+        if not self.enabled:
+            return func
+
+        entryId = self._log.intern(name or func.__qualname__)
+        exitId = -1 - entryId
+        record = self._log.record
+        getTimeUs = self._getTimeUs
+
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            record(entryId, getTimeUs())
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(exitId, getTimeUs())
+
+        return traced
+
+    def events(self) -> list[tuple[str, bool, microsecondsAsInt]]:
+        """
+        :returns: (name, isEntry, timeUs) for the events still in the
+                  buffer, oldest first.
+        """
+        if not self.enabled:
+            return []
+        names = self._log.names
+        records = self._log.records()
+        events = []
+        for index in range(0, len(records), 2):
+            eventId = records[index]
+            if eventId >= 0:
+                events.append((names[eventId], True, records[index + 1]))
+            else:
+                events.append((names[-1 - eventId], False, records[index + 1]))
+        return events
+
+    def printEvents(self) -> None:
+        for name, isEntry, timeUs in self.events():
+            print(f"{timeUs/1000_000.0:.6f}:{'Enter' if isEntry else 'Exit '}:{name}")
+
+    def chromeTraceEvents(self) -> list[dict]:
+        """
+        :returns: the events in Chrome trace-event format, which Perfetto
+                  and chrome://tracing open. Exits whose entry the ring has
+                  already overwritten are left out.
+        """
+        traceEvents = []
+        depthByName = {}
+        for name, isEntry, timeUs in self.events():
+            depth = depthByName.get(name, 0)
+            if not isEntry:
+                if not depth:
+                    continue
+                depth -= 1
+            else:
+                depth += 1
+            depthByName[name] = depth
+            traceEvents.append(
+                {"name": name, "ph": "B" if isEntry else "E", "ts": timeUs, "pid": 1, "tid": 1}
+            )
+        return traceEvents
+
+    def exportChromeTrace(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.chromeTraceEvents(), "displayTimeUnit": "ms"}, f)
+
+    def close(self) -> None:
+        if self.enabled:
+            self._log.close()
@@ -1,4 +1,4 @@
 # autogenerated by 'robotpy-build create-imports timedrobotmath timedrobotmath._rpydemo'
-from ._timedrobotmath import getSizeOfLong, cppCalcFutureExpirationUs
+from ._timedrobotmath import getSizeOfLong, cppCalcFutureExpirationUs, CppCallbackQueue
 
-__all__ = ["getSizeOfLong", "cppCalcFutureExpirationUs"]
+__all__ = ["getSizeOfLong", "cppCalcFutureExpirationUs", "CppCallbackQueue"]
@@ -1,6 +1,10 @@
 
 #pragma once
 
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
 int getSizeOfLong();
 
 long cppCalcFutureExpirationUs(
@@ -9,3 +13,68 @@ long cppCalcFutureExpirationUs(
     long periodUs,
     long currentTimeUs);
 
+/**
+ * A min-heap of (expirationUs, periodUs, handle) entries.
+ *
+ * This is the native counterpart of TimedRobotPy's _OrderedList and
+ * _Callback arithmetic. Handles are opaque to the queue, the python side maps
+ * them back to the callables to run.
+ */
+class CppCallbackQueue {
+ public:
+  void push(int64_t expirationUs, int64_t periodUs, int64_t handle);
+
+  size_t size() const;
+
+  /** Expiration of the earliest entry, the queue must not be empty. */
+  int64_t peekExpirationUs() const;
+
+  /** Handle of the earliest entry, the queue must not be empty. */
+  int64_t peekHandle() const;
+
+  /** Remove the earliest entry and return its handle. */
+  int64_t popHandle();
+
+  /**
+   * Move the earliest entry to its next future expiration after
+   * currentTimeUs and restore the heap order.
+   */
+  void rescheduleTop(int64_t currentTimeUs);
+
+  /**
+   * Set the expiration of the earliest entry, which must not move earlier,
+   * and restore the heap order.
+   */
+  void replaceTopExpirationUs(int64_t expirationUs);
+
+  /**
+   * Reschedule every entry that expires at or before currentTimeUs and
+   * return their handles in expiration order.
+   */
+  std::vector<int64_t> popExpiredAndReschedule(int64_t currentTimeUs);
+
+  /**
+   * Remove the entry with the given handle and restore the heap order.
+   * Returns false if it is absent.
+   */
+  bool erase(int64_t handle);
+
+  /** Expiration of the entry with the given handle, or -1 if it is absent. */
+  int64_t expirationUsOf(int64_t handle) const;
+
+  /** Handles of every entry, in no particular order. */
+  std::vector<int64_t> handles() const;
+
+ private:
+  struct Entry {
+    int64_t expirationUs;
+    int64_t periodUs;
+    int64_t handle;
+  };
+
+  static bool expiresLater(const Entry& a, const Entry& b);
+
+  void siftDownTop();
+
+  std::vector<Entry> m_heap;
+};
@@ -1,6 +1,8 @@
-
 #include "timedrobotmath.h"
 
+#include <algorithm>
+#include <stdexcept>
+
 
 int getSizeOfLong() {
     return sizeof(long);
@@ -15,3 +17,133 @@ long cppCalcFutureExpirationUs(
     return expirationTimeUs + offsetUs + periodUs + (currentTimeUs-expirationTimeUs) / periodUs * periodUs;
 }
 
+// Same arithmetic as _Callback.calcFutureExpirationUs
+static int64_t calcFutureExpirationUs(
+    int64_t expirationUs,
+    int64_t periodUs,
+    int64_t currentTimeUs) {
+
+    return expirationUs + periodUs + (currentTimeUs - expirationUs) / periodUs * periodUs;
+}
+
+// std::*_heap build max-heaps, so order by the later expiration to get a min-heap.
+bool CppCallbackQueue::expiresLater(const Entry& a, const Entry& b) {
+    return a.expirationUs > b.expirationUs;
+}
+
+void CppCallbackQueue::push(int64_t expirationUs, int64_t periodUs, int64_t handle) {
+    if (periodUs <= 0) {
+        throw std::invalid_argument("periodUs must be positive");
+    }
+    m_heap.push_back(Entry{expirationUs, periodUs, handle});
+    std::push_heap(m_heap.begin(), m_heap.end(), expiresLater);
+}
+
+size_t CppCallbackQueue::size() const {
+    return m_heap.size();
+}
+
+int64_t CppCallbackQueue::peekExpirationUs() const {
+    if (m_heap.empty()) {
+        throw std::out_of_range("peekExpirationUs() on an empty CppCallbackQueue");
+    }
+    return m_heap.front().expirationUs;
+}
+
+int64_t CppCallbackQueue::peekHandle() const {
+    if (m_heap.empty()) {
+        throw std::out_of_range("peekHandle() on an empty CppCallbackQueue");
+    }
+    return m_heap.front().handle;
+}
+
+int64_t CppCallbackQueue::popHandle() {
+    if (m_heap.empty()) {
+        throw std::out_of_range("popHandle() on an empty CppCallbackQueue");
+    }
+    std::pop_heap(m_heap.begin(), m_heap.end(), expiresLater);
+    int64_t handle = m_heap.back().handle;
+    m_heap.pop_back();
+    return handle;
+}
+
+void CppCallbackQueue::siftDownTop() {
+    // The top only ever moves later, so it only has to sift down.
+    size_t size = m_heap.size();
+    size_t pos = 0;
+    Entry top = m_heap[0];
+    while (true) {
+        size_t child = 2 * pos + 1;
+        if (child >= size) {
+            break;
+        }
+        if (child + 1 < size && m_heap[child + 1].expirationUs < m_heap[child].expirationUs) {
+            child++;
+        }
+        if (m_heap[child].expirationUs >= top.expirationUs) {
+            break;
+        }
+        m_heap[pos] = m_heap[child];
+        pos = child;
+    }
+    m_heap[pos] = top;
+}
+
+void CppCallbackQueue::rescheduleTop(int64_t currentTimeUs) {
+    if (m_heap.empty()) {
+        throw std::out_of_range("rescheduleTop() on an empty CppCallbackQueue");
+    }
+    Entry& top = m_heap.front();
+    top.expirationUs = calcFutureExpirationUs(top.expirationUs, top.periodUs, currentTimeUs);
+    siftDownTop();
+}
+
+void CppCallbackQueue::replaceTopExpirationUs(int64_t expirationUs) {
+    if (m_heap.empty()) {
+        throw std::out_of_range("replaceTopExpirationUs() on an empty CppCallbackQueue");
+    }
+    m_heap.front().expirationUs = expirationUs;
+    siftDownTop();
+}
+
+std::vector<int64_t> CppCallbackQueue::popExpiredAndReschedule(int64_t currentTimeUs) {
+    std::vector<int64_t> ready;
+    while (!m_heap.empty() && m_heap.front().expirationUs <= currentTimeUs) {
+        ready.push_back(m_heap.front().handle);
+        rescheduleTop(currentTimeUs);
+    }
+    return ready;
+}
+
+bool CppCallbackQueue::erase(int64_t handle) {
+    auto it = std::find_if(m_heap.begin(), m_heap.end(), [handle](const Entry& entry) {
+        return entry.handle == handle;
+    });
+    if (it == m_heap.end()) {
+        return false;
+    }
+    // Entries are only erased when a callback is cancelled or moved to
+    // another period, rarely enough that rebuilding the heap is fine.
+    *it = m_heap.back();
+    m_heap.pop_back();
+    std::make_heap(m_heap.begin(), m_heap.end(), expiresLater);
+    return true;
+}
+
+int64_t CppCallbackQueue::expirationUsOf(int64_t handle) const {
+    for (const Entry& entry : m_heap) {
+        if (entry.handle == handle) {
+            return entry.expirationUs;
+        }
+    }
+    return -1;
+}
+
+std::vector<int64_t> CppCallbackQueue::handles() const {
+    std::vector<int64_t> result;
+    result.reserve(m_heap.size());
+    for (const Entry& entry : m_heap) {
+        result.push_back(entry.handle);
+    }
+    return result;
+}
@@ -1,13 +1,28 @@
 import os
+import sys
 import tomli
 import click
 import json
 import subprocess
-import copy
+import re
+import graphlib
+import hashlib
+import importlib.metadata
+import functools
+import threading
+import time
+import contextlib
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from trpbe.singleton import Singleton
 
 from pathlib import Path
-from typing import NamedTuple
+from typing import NamedTuple, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 os.environ["RPYBUILD_PARALLEL"] = "1"
 os.environ["RPYBUILD_CC_LAUNCHER"] = "ccache"
@@ -59,6 +74,20 @@ class ConfigRepos():
 
 
 
+class ConfigClone():
+
+    def __init__(self, tomlDict):
+        # Without a [clone] section repos are cloned in full, 4 at a time
+        self.jobs = 4
+        self.depth = None
+        self.filter = None
+
+        if 'clone' in tomlDict and isinstance(tomlDict['clone'], dict):
+            c = tomlDict['clone']
+            self.jobs = c.get('jobs', self.jobs)
+            self.depth = c.get('depth', self.depth)
+            self.filter = c.get('filter', self.filter)
+
 
 class Config(metaclass=Singleton):
     def __init__(self):
@@ -67,11 +96,13 @@ class Config(metaclass=Singleton):
         self.tomlFilename = None
         self.tomlDict = {}
 
-    def initialize(self, ctx, tomlFilename:str, clone:bool, quiet:bool):
+    def initialize(self, ctx, tomlFilename:str, clone:bool, quiet:bool, force:bool, stateFilename:str):
         self.ctx = ctx
         self.tomlFilename = tomlFilename
         self.clone = clone
         self.quiet = quiet
+        self.force = force
+        self.stateFilename = stateFilename
         if not self.quiet:
             print(f"self.tomlFilename={self.tomlFilename}")
 
@@ -83,6 +114,7 @@ class Config(metaclass=Singleton):
 
         self.env = ConfigEnv(self.tomlDict)
         self.robotpyrepos = ConfigRepos(self.tomlDict)
+        self.cloneOptions = ConfigClone(self.tomlDict)
 
 
 
@@ -90,8 +122,12 @@ class Config(metaclass=Singleton):
 @click.option('--toml', default='trpbeConfig.toml', help='Configuration file.')
 @click.option('--clone/--no-clone', default=True, help='Clone/checkout the repos.')
 @click.option('--quiet/--no-quiet', default=False, help='Do not print tool output.')
+@click.option('--force/--no-force', default=False, help='Rerun the steps of doedit and dobuildall even if their inputs are unchanged.')
+@click.option('--state', default='.trpbeState.json', help='File that records the inputs of the steps that ran.')
+@click.option('--profile', default='.trpbeProfile.json', help='File to write the timings of this run to.')
+@click.option('--profile-history', default='.trpbeProfileHistory.jsonl', help='File that keeps a summary of every run, for trends.')
 @click.pass_context
-def cli(ctx, toml, clone, quiet):
+def cli(ctx, toml, clone, quiet, force, state, profile, profile_history):
     """
     This tool is used to put robotpy (editable) inside a python environment.
 
@@ -102,35 +138,497 @@ def cli(ctx, toml, clone, quiet):
     """
     ctx.ensure_object(dict)
 
-    Config().initialize(ctx, toml, clone, quiet)
+    Config().initialize(ctx, toml, clone, quiet, force, state)
+    BuildProfile().initialize(ctx.invoked_subcommand, profile, profile_history)
+    ctx.call_on_close(BuildProfile().finish)
+
+
+def hashFile(path)->Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+
+
+def gitHead(path:str)->Optional[str]:
+    result = subprocess.run(['git', '-C', path, 'rev-parse', 'HEAD'], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def gitChanges(path:str)->Optional[str]:
+    """
+    A hash of the uncommitted changes in the repo at path: the diff of the
+    tracked files against HEAD and the contents of the untracked ones that
+    are not ignored. None if path is not a repo.
+    """
+    status = subprocess.run(['git', '-C', path, 'status', '--porcelain', '-z'], capture_output=True)
+    if status.returncode != 0:
+        return None
+    h = hashlib.sha256(status.stdout)
+    h.update(subprocess.run(['git', '-C', path, 'diff', 'HEAD', '--binary'], capture_output=True).stdout)
+    untracked = subprocess.run(
+        ['git', '-C', path, 'ls-files', '--others', '--exclude-standard', '-z'], capture_output=True).stdout
+    for name in sorted(untracked.split(b'\0')):
+        if name:
+            h.update(name + b'\0' + (hashFile(Path(path) / os.fsdecode(name)) or '').encode())
+    return h.hexdigest()
+
 
+def allRepos()->list[Repo]:
+    repos = Config().robotpyrepos
+    return ([repos.mostRepo] if repos.mostRepo else []) + repos.addReposRobotPy + repos.addFullRobotRepos
 
-def runCd(path:str):
-    print(f'command=cd {path}')
-    os.chdir(path)
+
+def cloneInputs()->dict:
+    cloneOptions = Config().cloneOptions
+    return {
+        'repos': [r._asdict() for r in allRepos()],
+        'cloned': [os.path.isdir(r.name) for r in allRepos()],
+        'depth': cloneOptions.depth,
+        'filter': cloneOptions.filter,
+    }
+
+
+def installInputs()->dict:
+    mostRepo = Config().robotpyrepos.mostRepo
+    return {'rdev_requirements': hashFile(Path(mostRepo.name) / 'rdev_requirements.txt')}
+
+
+def uninstallInputs()->dict:
+    return {'packages': sorted(uninstallPacksSet.union(r.name for r in Config().robotpyrepos.addReposRobotPy))}
+
+
+def repoInputs(repo:Repo)->dict:
+    # Building from a dirty tree is common, so local edits count as well
+    return {'repo': repo._asdict(), 'head': gitHead(repo.name), 'changes': gitChanges(repo.name)}
+
+
+def buildInputs(repo:Repo)->dict:
+    return dict(repoInputs(repo), env=Config().env.envList)
+
+
+class StepCache():
+    """
+    Tells StepGraph which steps of doedit and dobuildall to skip, because
+    their inputs are unchanged since they last succeeded.
+
+    Each step declares its own inputs, see cloneInputs() and the others, so
+    a new commit or an uncommitted edit in one repo only reruns the steps
+    that use that repo and the steps that depend on them. The python environment is part of every
+    fingerprint.
+
+    The installed package set is recorded once all steps have finished, and
+    no step is skipped unless it is the same when the next run starts, so a
+    package installed or removed behind trpbe's back reruns them all.
+    """
+
+    def __init__(self, stateFilename:str, force:bool):
+        self.stateFilename = stateFilename
+        self.force = force
+        # Steps run concurrently
+        self.lock = threading.Lock()
+        self.state = {}
+        try:
+            with open(stateFilename) as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            print(f"ignoring unreadable {stateFilename}")
+        self.state.setdefault('steps', {})
+        # No step has run yet, so nothing is installing
+        self.packagesUnchanged = self.state.get('installedPackages') == self.installedPackages()
+
+    @staticmethod
+    def fingerprint(inputs:dict)->str:
+        inputs = dict(inputs, python=sys.prefix)
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def installedPackages()->str:
+        packages = sorted(f"{d.metadata['Name']}=={d.version}" for d in importlib.metadata.distributions())
+        return hashlib.sha256("\n".join(packages).encode()).hexdigest()
+
+    def isUpToDate(self, name:str, inputs:dict)->bool:
+        fingerprint = self.fingerprint(inputs)
+        with self.lock:
+            return not self.force \
+                and self.packagesUnchanged \
+                and self.state['steps'].get(name) == fingerprint
+
+    def started(self, name:str):
+        # Until it succeeds again, the step is rerun
+        with self.lock:
+            self.state['steps'].pop(name, None)
+            self.save()
+
+    def succeeded(self, name:str, inputs:dict):
+        fingerprint = self.fingerprint(inputs)
+        with self.lock:
+            self.state['steps'][name] = fingerprint
+            self.save()
+
+    def finished(self):
+        """Record the installed package set, once no step is running"""
+        installedPackages = self.installedPackages()
+        with self.lock:
+            self.state['installedPackages'] = installedPackages
+            self.save()
+
+    def save(self):
+        with open(self.stateFilename, "w") as f:
+            json.dump(self.state, f, indent=4)
+
+
+class StepGraph():
+    """
+    Steps and the steps they depend on. run() starts every step as soon as
+    its dependencies have succeeded, so independent steps run concurrently,
+    and prints when each ran and the critical path through them.
+
+    Steps run in threads, so they must not change directory: commands take
+    a cwd instead. Steps that share a resource, such as the venv that pip
+    and setup.py develop install into, never run at the same time.
+    """
+
+    def __init__(self):
+        self.steps = {}
+        self.dependencies = {}
+        self.inputs = {}
+        self.resources = {}
+
+    def add(self, name:str, func, dependencies=(), inputs=None, resources=())->str:
+        """
+        Add a step, after the steps it depends on, and return its name.
+
+        inputs returns what the step's result depends on, as a JSON-able
+        dict. A step without inputs is never skipped.
+
+        resources names what the step needs to itself while it runs: it waits
+        for any other step using one of them to finish before it starts.
+        """
+        for d in dependencies:
+            if d not in self.steps:
+                raise ValueError(f"step {name} depends on {d}, which has not been added")
+        self.steps[name] = func
+        self.dependencies[name] = list(dependencies)
+        self.inputs[name] = inputs
+        self.resources[name] = frozenset(resources)
+        return name
+
+    def run(self, stepCache:Optional[StepCache]=None, jobs:Optional[int]=None):
+        """
+        Run the steps, at most jobs (the CPU count by default) at once. With
+        a stepCache, a step is skipped if its inputs are unchanged and none of
+        its dependencies ran. A step whose dependencies have succeeded waits
+        for its resources, in the order the steps became ready. After a
+        failure no new steps are started, and once the running ones finish
+        every failure is reported.
+        """
+        jobs = jobs or os.cpu_count() or 1
+        dependents = {name: [] for name in self.steps}
+        waitingOn = {}
+        for name, dependencies in self.dependencies.items():
+            waitingOn[name] = len(dependencies)
+            for d in dependencies:
+                dependents[d].append(name)
+
+        ran = set()
+        times = {}
+        failures = []
+        startS = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            running = {}
+            ready = []
+            heldResources = set()
+
+            def submitReady():
+                for name in list(ready):
+                    if self.resources[name] & heldResources:
+                        continue
+                    ready.remove(name)
+                    heldResources.update(self.resources[name])
+                    dependencyRan = any(d in ran for d in self.dependencies[name])
+                    # The context carries the profiled step the graph runs in
+                    running[executor.submit(
+                        contextvars.copy_context().run, self.runStep, name, stepCache, dependencyRan)] = name
+
+            ready += [name for name, count in waitingOn.items() if count == 0]
+            submitReady()
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    heldResources.difference_update(self.resources[name])
+                    try:
+                        didRun, stepStartS, stepEndS = future.result()
+                    except Exception as e:
+                        print(f"step={name} failed: {e}")
+                        failures.append((name, e))
+                        continue
+                    times[name] = (stepStartS - startS, stepEndS - startS)
+                    if didRun:
+                        ran.add(name)
+                    if failures:
+                        continue
+                    for dependent in dependents[name]:
+                        waitingOn[dependent] -= 1
+                        if waitingOn[dependent] == 0:
+                            ready.append(dependent)
+                if not failures:
+                    submitReady()
+
+        if stepCache is not None:
+            stepCache.finished()
+        self.printSummary(times, time.perf_counter() - startS)
+        if failures:
+            raise click.ClickException(
+                f"{len(failures)} steps failed: {', '.join(name for name, _ in failures)}")
+
+    def runStep(self, name:str, stepCache:Optional[StepCache], dependencyRan:bool):
+        stepStartS = time.perf_counter()
+        inputs = self.inputs[name]
+        if stepCache is None or inputs is None:
+            stepCache = None
+        elif not dependencyRan and stepCache.isUpToDate(name, inputs()):
+            print(f"step={name} skipped, its inputs are unchanged")
+            return False, stepStartS, time.perf_counter()
+
+        print(f"step={name} started")
+        if stepCache is not None:
+            stepCache.started(name)
+        with BuildProfile().step(name):
+            self.steps[name]()
+        if stepCache is not None:
+            # Inputs such as whether a repo is cloned change by running
+            stepCache.succeeded(name, inputs())
+        return True, stepStartS, time.perf_counter()
+
+    def printSummary(self, times:dict, wallS:float):
+        print(f"\n{'start':>8} {'end':>8} {'wall':>8}  step")
+        for name, (stepStartS, stepEndS) in sorted(times.items(), key=lambda item: item[1]):
+            print(f"{stepStartS:8.1f} {stepEndS:8.1f} {stepEndS - stepStartS:8.1f}  {name}")
+
+        # Walk back from the last step to finish, through the dependency
+        # that finished last, which is the one the step waited for.
+        path = []
+        name = max(times, key=lambda n: times[n][1], default=None)
+        while name is not None:
+            path.append(name)
+            finished = [d for d in self.dependencies[name] if d in times]
+            name = max(finished, key=lambda n: times[n][1], default=None)
+        path.reverse()
+        print("critical path: " + " -> ".join(f"{n} {times[n][1] - times[n][0]:.1f}s" for n in path))
+        print(f"total {wallS:.1f}s with {len(times)} steps finished\n")
+
+
+# The StepGraph resource of steps that install into the venv. pip and
+# setup.py develop rewrite site-packages and its .pth files without locking,
+# so no two of them may run at once.
+kVenv = 'venv'
+
+# The names of the StepGraph steps the current command runs in, outermost first
+currentSteps = contextvars.ContextVar('currentSteps', default=())
+
+
+def maxRssKb(rusage)->int:
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss
+
+
+class BuildProfile(metaclass=Singleton):
+    """
+    Wall time, CPU time and peak RSS of every command and step of this trpbe
+    run. At exit they are written to a JSON report and summarized, and the
+    run is appended to a history that shows whether settings such as
+    RPYBUILD_PARALLEL or ccache made runs faster.
+
+    A command's CPU time and peak RSS come from reaping it with os.wait4,
+    which covers that command and the processes it waited for, so commands
+    that run concurrently are not mixed up. Peak RSS starts out at trpbe's
+    own, which the child has until it execs the command. A step adds up its
+    commands.
+    """
+
+    # Environment variables that change how long a build takes
+    kBuildSettings = ['RPYBUILD_PARALLEL', 'RPYBUILD_CC_LAUNCHER', 'CCACHE_DIR', 'MAKEFLAGS']
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.command = None
+        self.reportFilename = None
+        self.historyFilename = None
+        self.startS = time.perf_counter()
+        self.startTime = time.time()
+        self.commands = []
+        self.steps = []
+
+    def initialize(self, command:Optional[str], reportFilename:str, historyFilename:str):
+        self.command = command
+        self.reportFilename = reportFilename
+        self.historyFilename = historyFilename
+
+    def recordCommand(self, args, cwd, wallS:float, rusage, returncode:int):
+        record = {
+            'command': args,
+            'cwd': cwd,
+            'step': ' > '.join(currentSteps.get()),
+            'wallS': wallS,
+            'cpuS': None if rusage is None else rusage.ru_utime + rusage.ru_stime,
+            'peakRssKb': None if rusage is None else maxRssKb(rusage),
+            'returncode': returncode,
+        }
+        with self.lock:
+            self.commands.append(record)
+
+    @contextlib.contextmanager
+    def step(self, name:str):
+        steps = currentSteps.get() + (name,)
+        path = ' > '.join(steps)
+        token = currentSteps.set(steps)
+        startS = time.perf_counter()
+        succeeded = False
+        try:
+            yield
+            succeeded = True
+        finally:
+            wallS = time.perf_counter() - startS
+            currentSteps.reset(token)
+            with self.lock:
+                commands = [c for c in self.commands if c['step'] == path or c['step'].startswith(path + ' > ')]
+                self.steps.append({
+                    'step': path,
+                    'wallS': wallS,
+                    'cpuS': sum(c['cpuS'] or 0 for c in commands),
+                    'peakRssKb': max((c['peakRssKb'] or 0 for c in commands), default=0),
+                    'commands': len(commands),
+                    'succeeded': succeeded,
+                })
+
+    def buildSettings(self)->dict[str, Optional[str]]:
+        names = list(self.kBuildSettings)
+        for e in Config().env.envList:
+            names.extend(k for k in e if k not in names)
+        return {name: os.environ.get(name) for name in names}
+
+    def finish(self):
+        # Called while click closes the context, an exception that is ending
+        # the command is still being handled.
+        succeeded = sys.exc_info()[0] is None
+        run = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.startTime)),
+            'command': self.command,
+            'succeeded': succeeded,
+            'wallS': time.perf_counter() - self.startS,
+            'cpuS': None,
+            'peakRssKb': None,
+            'settings': self.buildSettings(),
+        }
+        if resource is not None:
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            run['cpuS'] = children.ru_utime + children.ru_stime
+            run['peakRssKb'] = maxRssKb(children)
+
+        with open(self.reportFilename, "w") as f:
+            json.dump({'run': run, 'steps': self.steps, 'commands': self.commands}, f, indent=4)
+        with open(self.historyFilename, "a") as f:
+            f.write(json.dumps(dict(run, steps={s['step']: s['wallS'] for s in self.steps})) + "\n")
+
+        self.printSummary(run)
+        self.printTrend()
+
+    def printSummary(self, run:dict, count:int=15):
+        def formatCpu(cpuS):
+            return f"{cpuS:8.1f}" if cpuS is not None else f"{'':>8}"
+
+        def formatRss(peakRssKb):
+            return f"{peakRssKb / 1024:8.0f}" if peakRssKb is not None else f"{'':>8}"
+
+        print(f"\nprofile of trpbe {run['command']} written to {self.reportFilename}")
+        if self.steps:
+            print(f"{'wall s':>8} {'cpu s':>8} {'rss MB':>8}  step")
+            for s in sorted(self.steps, key=lambda s: s['wallS'], reverse=True)[:count]:
+                print(f"{s['wallS']:8.1f} {formatCpu(s['cpuS'])} {formatRss(s['peakRssKb'])}  {s['step']}")
+        if self.commands:
+            print(f"{'wall s':>8} {'cpu s':>8} {'rss MB':>8}  command")
+            for c in sorted(self.commands, key=lambda c: c['wallS'], reverse=True)[:count]:
+                print(f"{c['wallS']:8.1f} {formatCpu(c['cpuS'])} {formatRss(c['peakRssKb'])}  {c['command']}")
+        print(f"{run['wallS']:8.1f} {formatCpu(run['cpuS'])} {formatRss(run['peakRssKb'])}  total")
+
+    def printTrend(self, count:int=10):
+        """Print the latest successful runs of this command, and the mean time of each combination of build settings"""
+        runs = []
+        with open(self.historyFilename) as f:
+            for line in f:
+                try:
+                    run = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if run.get('command') == self.command and run.get('succeeded'):
+                    runs.append(run)
+        if len(runs) < 2:
+            return
+
+        def describe(settings):
+            return ' '.join(f"{k}={v}" for k, v in sorted(settings.items()) if v is not None) or 'defaults'
+
+        print(f"\nlatest runs of trpbe {self.command}:")
+        for run in runs[-count:]:
+            print(f"{run['time']} {run['wallS']:8.1f}s  {describe(run['settings'])}")
+
+        bySettings = {}
+        for run in runs:
+            bySettings.setdefault(describe(run['settings']), []).append(run['wallS'])
+        if len(bySettings) > 1:
+            print("mean by build settings:")
+            for settings, walls in sorted(bySettings.items(), key=lambda item: sum(item[1]) / len(item[1])):
+                print(f"{sum(walls) / len(walls):8.1f}s over {len(walls)} runs  {settings}")
+
+
+def waitAndProfile(p:subprocess.Popen, cwd, startS:float)->int:
+    """Reap p, recording its wall time and resource usage, and return its exit code"""
+    rusage = None
+    if hasattr(os, 'wait4'):
+        _, status, rusage = os.wait4(p.pid, 0)
+        p.returncode = os.waitstatus_to_exitcode(status)
+    else:
+        p.wait()
+    BuildProfile().recordCommand(p.args, cwd, time.perf_counter() - startS, rusage, p.returncode)
+    return p.returncode
+
+
+def commandDescription(args, cwd):
+    return f"command={args}" if cwd is None else f"command=cd {cwd} && {args}"
 
 
 def runCommand(args, cwd=None, shell=True)->subprocess.CompletedProcess:
-    print(f"command={args}")
-    result = subprocess.run(
-        args=args,
-        check=True,
-        cwd=cwd,
-        shell=True,
-        input=None,
-        text=True,
-        encoding='utf-8',
-        errors="replace",
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
+    print(commandDescription(args, cwd))
+    startS = time.perf_counter()
+    with subprocess.Popen(
+            args=args,
+            cwd=cwd,
+            shell=True,
+            text=True,
+            encoding='utf-8',
+            errors="replace",
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT) as p:
+        # stderr goes to the same pipe, so reading it to the end cannot block
+        stdout = p.stdout.read()
+        returncode = waitAndProfile(p, cwd, startS)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, args, output=stdout)
+    result = subprocess.CompletedProcess(args, returncode, stdout)
     if not Config().quiet:
         print(f"result=>\n{result.stdout}<=result\n")
     return result
 
-def runCommandNoWaitForOutput(args, cwd=None, shell=False):
+def runCommandNoWaitForOutput(args, cwd=None, shell=False, prefix=''):
 
-    print(f"command={args}")
+    print(f"{prefix}{commandDescription(args, cwd)}")
+    startS = time.perf_counter()
     with subprocess.Popen(
             args=args,
             cwd=cwd,
@@ -142,22 +640,19 @@ def runCommandNoWaitForOutput(args, cwd=None, shell=False):
             bufsize=1, universal_newlines=True) as p:
         for line in p.stdout:
             if not Config().quiet:
-                print(line, end='')  # process line here
+                print(f"{prefix}{line}", end='')  # process line here
+        waitAndProfile(p, cwd, startS)
 
     if p.returncode != 0:
         raise subprocess.CalledProcessError(p.returncode, p.args)
 
 def buildAddOnRobotPyPackageEdit(ctx, name:str):
     """Build add on robot py repos editable"""
-    runCd(name)
-    runCommandNoWaitForOutput('python setup.py develop -N', shell=True)
-    runCd('..')
+    runCommandNoWaitForOutput('python setup.py develop -N', cwd=name, shell=True, prefix=f'[{name}] ')
 
 def syncAFullRobotRepo(ctx, name:str):
     """sync full robotpy repos"""
-    runCd(name)
-    runCommandNoWaitForOutput('python -m robotpy sync', shell=True)
-    runCd('..')
+    runCommandNoWaitForOutput('python -m robotpy sync', cwd=name, shell=True, prefix=f'[{name}] ')
 
 
 @click.command()
@@ -168,20 +663,50 @@ def showenv(ctx):
 
 cli.add_command(showenv)
 
-def gitClone(repo: Repo):
-    runCommand(f'git clone {repo.url} {repo.name}')
-    runCommand(f"git -C {repo.name} checkout {repo.branch}")
+def gitClone(repo: Repo, cloneOptions: ConfigClone, prefix=''):
+    options = ''
+    if cloneOptions.filter:
+        options += f' --filter={cloneOptions.filter}'
+    if cloneOptions.depth:
+        # A shallow clone only has the history of the branch it is cloned at
+        runCommandNoWaitForOutput(
+            f'git clone{options} --depth {cloneOptions.depth} --branch {repo.branch} {repo.url} {repo.name}',
+            shell=True, prefix=prefix)
+    else:
+        runCommandNoWaitForOutput(f'git clone{options} {repo.url} {repo.name}', shell=True, prefix=prefix)
+        runCommandNoWaitForOutput(f"git -C {repo.name} checkout {repo.branch}", shell=True, prefix=prefix)
+
+def gitCloneAll(repos: list[Repo], cloneOptions: ConfigClone, jobs: int):
+    """Clone repos, jobs at a time, and report every failure at the end"""
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, gitClone, r, cloneOptions, f'[{r.name}] '): r
+            for r in repos
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except subprocess.CalledProcessError as e:
+                failures.append((futures[future], e))
+
+    if failures:
+        for r, e in failures:
+            print(f"clone of {r.name} from {r.url} branch {r.branch} failed: {e}")
+        raise click.ClickException(
+            f"{len(failures)} of {len(repos)} clones failed: {', '.join(r.name for r, _ in failures)}")
 
 @click.command()
+@click.option('--jobs', type=int, default=None, help='Repos to clone at once, [clone] jobs in the toml by default.')
 @click.pass_context
-def clone(ctx):
+def clone(ctx, jobs):
     """Clone the necessary repos"""
     if Config().clone:
-        gitClone(Config().robotpyrepos.mostRepo)
-        for r in Config().robotpyrepos.addReposRobotPy:
-            gitClone(r)
-        for r in Config().robotpyrepos.addFullRobotRepos:
-            gitClone(r)
+        repos = [Config().robotpyrepos.mostRepo] \
+            + Config().robotpyrepos.addReposRobotPy \
+            + Config().robotpyrepos.addFullRobotRepos
+        cloneOptions = Config().cloneOptions
+        gitCloneAll(repos, cloneOptions, cloneOptions.jobs if jobs is None else jobs)
     else:
         print("Clone is disabled")
 
@@ -192,14 +717,11 @@ cli.add_command(clone)
 def installformrobopy(ctx):
     """Install python modules that mostrobotpy needs to build"""
     runCommand('pip install robotpy')
-    runCd(Config().robotpyrepos.mostRepo.name)
-    runCommand('pip install -r rdev_requirements.txt')
+    runCommand('pip install -r rdev_requirements.txt', cwd=Config().robotpyrepos.mostRepo.name)
     runCommand('pip install numpy')
     runCommand('python -m pip install editables')
     runCommand('python -m pip install pkgconf==2.3.0.post2')
 
-    runCd('..')
-
 cli.add_command(installformrobopy)
 
 
@@ -208,9 +730,7 @@ cli.add_command(installformrobopy)
 def installformrobopyedit(ctx):
     """Install python modules that mostrobotpy needs to build editable"""
     #runCommand('pip install robotpy-build')
-    runCd("robotpy-build")
-    runCommand('pip install -e .')
-    runCd('..')
+    runCommand('pip install -e .', cwd="robotpy-build")
 
 
 cli.add_command(installformrobopyedit)
@@ -220,9 +740,7 @@ cli.add_command(installformrobopyedit)
 @click.pass_context
 def buildmrobopy(ctx):
     """Build mostrobotpy"""
-    runCd(Config().robotpyrepos.mostRepo.name)
-    runCommandNoWaitForOutput('python -m devtools ci run', shell=True )
-    runCd('..')
+    runCommandNoWaitForOutput('python -m devtools ci run', cwd=Config().robotpyrepos.mostRepo.name, shell=True)
 
 cli.add_command(buildmrobopy)
 
@@ -231,9 +749,7 @@ cli.add_command(buildmrobopy)
 @click.pass_context
 def installeditmrobopy(ctx):
     """Build editable mostrobotpy"""
-    runCd(Config().robotpyrepos.mostRepo.name)
-    runCommandNoWaitForOutput('python -m devtools develop', shell=True)
-    runCd('..')
+    runCommandNoWaitForOutput('python -m devtools develop', cwd=Config().robotpyrepos.mostRepo.name, shell=True)
 
 
 cli.add_command(installeditmrobopy)
@@ -257,40 +773,87 @@ uninstallPacks = [
 
 uninstallPacksSet = set(uninstallPacks)
 
-def getListOfInstalledPacksFromPip()->list[dict[str, str]]:
-    result: subprocess.CompletedProcess = runCommand('pip list --format json')
-    firstLine = result.stdout.splitlines()[0]
-    listOfInstalledPacksAsDicts = json.loads(firstLine)
-    return listOfInstalledPacksAsDicts
+def canonicalName(name:str)->str:
+    """The PEP 503 normalized name, which pip and importlib.metadata names may differ from"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def getInstalledDistributions()->dict[str, importlib.metadata.Distribution]:
+    """The installed distributions by canonical name, read in-process instead of from pip list"""
+    # pip has changed site-packages since the last look
+    importlib.invalidate_caches()
+    installed = {}
+    for d in importlib.metadata.distributions():
+        name = d.metadata['Name']
+        # The first one found is the one that imports, a later one is shadowed by it
+        if name:
+            installed.setdefault(canonicalName(name), d)
+    return installed
+
+
+def getUninstallOrder(names:set[str], installed:dict[str, importlib.metadata.Distribution])->list[str]:
+    """names, each before the packages it depends on"""
+    graph = {}
+    for name in sorted(names):
+        graph[name] = set()
+        for requirement in installed[name].requires or []:
+            match = re.match(r"[A-Za-z0-9][A-Za-z0-9._-]*", requirement)
+            if match and canonicalName(match.group(0)) in names:
+                graph[name].add(canonicalName(match.group(0)))
+    try:
+        order = list(graphlib.TopologicalSorter(graph).static_order())
+    except graphlib.CycleError:
+        order = sorted(names)
+    order.reverse()
+    return order
+
+
+def getInstalledCopies(names:set[str])->set[tuple[str, str]]:
+    """Every installed copy of the distributions in names, as its canonical name and location"""
+    importlib.invalidate_caches()
+    copies = set()
+    for d in importlib.metadata.distributions():
+        name = d.metadata['Name']
+        if name and canonicalName(name) in names:
+            copies.add((canonicalName(name), str(d.locate_file(''))))
+    return copies
+
+
+def uninstallAllCopies(names:set[str], uninstallThesePacks:list[str]):
+    """pip uninstall uninstallThesePacks, in order, until no copy of names is left"""
+    # A package installed twice, for example with setup.py develop and from
+    # a wheel, comes out once per pip uninstall, so repeat while that removes
+    # copies. Its name stays installed until the last copy is gone.
+    copies = getInstalledCopies(names)
+    while uninstallThesePacks:
+        runCommand(f"pip uninstall -y {' '.join(uninstallThesePacks)}")
+        stillInstalledCopies = getInstalledCopies(names)
+        if len(stillInstalledCopies) >= len(copies):
+            raise click.ClickException(
+                f"pip uninstall did not remove {' '.join(sorted({name for name, _ in stillInstalledCopies}))}")
+        copies = stillInstalledCopies
+        installed = getInstalledDistributions()
+        uninstallThesePacks = getUninstallOrder(names.intersection(installed), installed)
+
 
 @click.command()
+@click.option('--dry-run/--no-dry-run', default=False, help='Print what would be uninstalled, in order, without uninstalling.')
 @click.pass_context
-def uninstallpkgsformrobopyedit(ctx):
+def uninstallpkgsformrobopyedit(ctx, dry_run):
     """Uninstall python modules that mostrobotpy needs to build editable"""
-    countOfPacks = None
-    totalCountOfPacks = None
-    oldTotalCountOfPacks = None
-
-    uninstallPacksSuperSet = copy.copy(uninstallPacksSet)
+    uninstallPacksSuperSet = {canonicalName(p) for p in uninstallPacksSet}
 
     for r in Config().robotpyrepos.addReposRobotPy:
-        uninstallPacksSuperSet.add(r.name)
+        uninstallPacksSuperSet.add(canonicalName(r.name))
 
-    while countOfPacks is None or oldTotalCountOfPacks is None or (countOfPacks > 1 and totalCountOfPacks < oldTotalCountOfPacks):
-        listOfInstalledPacksAsDicts = getListOfInstalledPacksFromPip()
-        listOfInstalledPacks = [s['name'] for s in listOfInstalledPacksAsDicts]
-        oldTotalCountOfPacks = totalCountOfPacks
-        totalCountOfPacks = len(listOfInstalledPacks)
-        listOfInstalledPacksSet = set(listOfInstalledPacks)
+    installed = getInstalledDistributions()
+    uninstallThesePacks = getUninstallOrder(uninstallPacksSuperSet.intersection(installed), installed)
 
-        print(f"uninstallPacksSuperSet={uninstallPacksSuperSet} listOfInstalledPacksSet={listOfInstalledPacksSet}")
+    if dry_run:
+        print(f"would uninstall, in order: {' '.join(uninstallThesePacks) or 'nothing'}")
+        return
 
-        uninstallThesePacks = list(uninstallPacksSuperSet.intersection(listOfInstalledPacksSet))
-
-        countOfPacks = len(uninstallThesePacks)
-
-        for packageStr in uninstallThesePacks:
-            runCommand(f'pip uninstall -y {packageStr}')
+    uninstallAllCopies(uninstallPacksSuperSet, uninstallThesePacks)
 
 
 cli.add_command(uninstallpkgsformrobopyedit)
@@ -316,8 +879,10 @@ cli.add_command(buildrevedit)
 @click.pass_context
 def buildAddOnRobotPyEditPacks(ctx):
     """Build robotpy add on packages editable"""
+    graph = StepGraph()
     for r in Config().robotpyrepos.addReposRobotPy:
-        buildAddOnRobotPyPackageEdit(ctx, r.name)
+        graph.add(f'build {r.name}', functools.partial(buildAddOnRobotPyPackageEdit, ctx, r.name), resources=[kVenv])
+    graph.run()
 
 cli.add_command(buildAddOnRobotPyEditPacks)
 
@@ -326,32 +891,63 @@ cli.add_command(buildAddOnRobotPyEditPacks)
 @click.pass_context
 def syncFullRobotRepos(ctx):
     """Run robotpy sync on all full robot repos"""
+    graph = StepGraph()
     for r in Config().robotpyrepos.addFullRobotRepos:
-        syncAFullRobotRepo(ctx, r.name)
+        graph.add(f'sync {r.name}', functools.partial(syncAFullRobotRepo, ctx, r.name), resources=[kVenv])
+    graph.run()
 
 cli.add_command(syncFullRobotRepos)
 
 @click.command()
+@click.option('--jobs', type=int, default=None, help='Steps to run at once, the CPU count by default.')
 @click.pass_context
-def dobuildall(ctx):
-    """Run all steps (not editable)"""
-    ctx.invoke(clone)
-    ctx.invoke(installformrobopy)
-    ctx.invoke(buildmrobopy)
+def dobuildall(ctx, jobs):
+    """Run all steps (not editable), skipping those whose inputs are unchanged"""
+    graph = StepGraph()
+    mostRepo = Config().robotpyrepos.mostRepo
+    cloned = graph.add('clone', functools.partial(ctx.invoke, clone), inputs=cloneInputs)
+    installed = graph.add(
+        'installformrobopy', functools.partial(ctx.invoke, installformrobopy), [cloned], installInputs,
+        [kVenv])
+    graph.add(
+        'buildmrobopy', functools.partial(ctx.invoke, buildmrobopy), [installed],
+        functools.partial(buildInputs, mostRepo), [kVenv])
+    graph.run(StepCache(Config().stateFilename, Config().force), jobs)
 
 cli.add_command(dobuildall)
 
 @click.command()
+@click.option('--jobs', type=int, default=None, help='Steps to run at once, the CPU count by default.')
 @click.pass_context
-def doedit(ctx):
-    """Run all steps (editable)"""
-    ctx.invoke(clone)
-    ctx.invoke(installformrobopy)
-    #ctx.invoke(installformrobopyedit)
-    ctx.invoke(syncFullRobotRepos)
-    ctx.invoke(uninstallpkgsformrobopyedit)
-    ctx.invoke(installeditmrobopy)
-    ctx.invoke(buildAddOnRobotPyEditPacks)
+def doedit(ctx, jobs):
+    """Run all steps (editable), skipping those whose inputs are unchanged"""
+    graph = StepGraph()
+    mostRepo = Config().robotpyrepos.mostRepo
+    cloned = graph.add('clone', functools.partial(ctx.invoke, clone), inputs=cloneInputs)
+    installed = graph.add(
+        'installformrobopy', functools.partial(ctx.invoke, installformrobopy), [cloned], installInputs,
+        [kVenv])
+    #installedEdit = graph.add('installformrobopyedit', functools.partial(ctx.invoke, installformrobopyedit), [installed])
+    # robotpy sync installs the released packages that the editable install
+    # replaces. Every step from here on installs into the venv, so they run
+    # one at a time whatever --jobs is.
+    synced = [
+        graph.add(
+            f'sync {r.name}', functools.partial(syncAFullRobotRepo, ctx, r.name), [installed],
+            functools.partial(repoInputs, r), [kVenv])
+        for r in Config().robotpyrepos.addFullRobotRepos
+    ]
+    uninstalled = graph.add(
+        'uninstallpkgsformrobopyedit', functools.partial(ctx.invoke, uninstallpkgsformrobopyedit),
+        [installed] + synced, uninstallInputs, [kVenv])
+    installedEdit = graph.add(
+        'installeditmrobopy', functools.partial(ctx.invoke, installeditmrobopy), [uninstalled],
+        functools.partial(buildInputs, mostRepo), [kVenv])
+    for r in Config().robotpyrepos.addReposRobotPy:
+        graph.add(
+            f'build {r.name}', functools.partial(buildAddOnRobotPyPackageEdit, ctx, r.name), [installedEdit],
+            functools.partial(buildInputs, r), [kVenv])
+    graph.run(StepCache(Config().stateFilename, Config().force), jobs)
 
 cli.add_command(doedit)
 
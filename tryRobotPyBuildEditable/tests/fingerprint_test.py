@@ -0,0 +1,64 @@
+"""
+    repoInputs() of a git repo, which must change with uncommitted edits as
+    well as with new commits.
+"""
+
+import subprocess
+
+import pytest
+
+from trpbe import body
+
+
+def git(repoDir, *args):
+    subprocess.run(['git', '-C', str(repoDir), *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repoDir = tmp_path / 'robotpy-rev'
+    repoDir.mkdir()
+    git(repoDir, 'init', '-q')
+    (repoDir / 'setup.py').write_text('version = 1\n')
+    (repoDir / '.gitignore').write_text('build/\n')
+    git(repoDir, 'add', '.')
+    git(repoDir, '-c', 'user.name=trpbe', '-c', 'user.email=trpbe@example.com', 'commit', '-q', '-m', 'first')
+    return repoDir, body.Repo(str(repoDir), 'https://example.com/robotpy-rev.git', 'main')
+
+
+def test_unchanged_tree_keeps_its_inputs(repo):
+    _, r = repo
+
+    assert body.repoInputs(r) == body.repoInputs(r)
+    assert body.repoInputs(r)['changes'] is not None
+
+
+def test_edited_tracked_file_changes_the_inputs(repo):
+    repoDir, r = repo
+    before = body.repoInputs(r)
+    (repoDir / 'setup.py').write_text('version = 2\n')
+    edited = body.repoInputs(r)
+    (repoDir / 'setup.py').write_text('version = 3\n')
+
+    assert edited != before
+    assert body.repoInputs(r) != edited
+
+
+def test_untracked_file_contents_change_the_inputs(repo):
+    repoDir, r = repo
+    before = body.repoInputs(r)
+    (repoDir / 'patch.py').write_text('a = 1\n')
+    added = body.repoInputs(r)
+    (repoDir / 'patch.py').write_text('a = 2\n')
+
+    assert added != before
+    assert body.repoInputs(r) != added
+
+
+def test_ignored_files_do_not_change_the_inputs(repo):
+    repoDir, r = repo
+    before = body.repoInputs(r)
+    (repoDir / 'build').mkdir()
+    (repoDir / 'build' / 'out.o').write_text('ignored')
+
+    assert body.repoInputs(r) == before
@@ -0,0 +1,50 @@
+"""
+    StepGraph running independent steps concurrently, except those that
+    share a resource.
+"""
+
+import threading
+import time
+
+from trpbe import body
+
+
+def recordingStep(name, log, lock):
+    def step():
+        with lock:
+            log.append(('start', name))
+        time.sleep(0.05)
+        with lock:
+            log.append(('end', name))
+    return step
+
+
+def overlaps(log, first, second):
+    order = [event for event in log if event[1] in (first, second)]
+    return order[0][0] == order[1][0] == 'start'
+
+
+def test_steps_sharing_a_resource_run_one_at_a_time():
+    log = []
+    lock = threading.Lock()
+    graph = body.StepGraph()
+    graph.add('clone', recordingStep('clone', log, lock))
+    graph.add('pip a', recordingStep('pip a', log, lock), resources=[body.kVenv])
+    graph.add('pip b', recordingStep('pip b', log, lock), resources=[body.kVenv])
+
+    graph.run(jobs=3)
+
+    assert not overlaps(log, 'pip a', 'pip b')
+    assert overlaps(log, 'clone', 'pip a')
+
+
+def test_resource_is_released_for_dependents():
+    log = []
+    lock = threading.Lock()
+    graph = body.StepGraph()
+    installed = graph.add('install', recordingStep('install', log, lock), resources=[body.kVenv])
+    graph.add('build', recordingStep('build', log, lock), [installed], resources=[body.kVenv])
+
+    graph.run(jobs=2)
+
+    assert [event for event in log if event[0] == 'end'] == [('end', 'install'), ('end', 'build')]
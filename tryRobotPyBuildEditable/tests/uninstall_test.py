@@ -0,0 +1,61 @@
+"""
+    uninstallAllCopies() against a fake set of installed distributions,
+    where each pip uninstall removes the copy of a package that imports.
+"""
+
+import importlib.metadata
+
+import click
+import pytest
+
+from trpbe import body
+
+
+class FakeDistribution:
+    def __init__(self, name, location, requires=None):
+        self.metadata = {'Name': name}
+        self.requires = requires
+        self.location = location
+
+    def locate_file(self, path):
+        return f"{self.location}/{path}"
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    distributions = []
+    uninstallCommands = []
+
+    def pipUninstall(args, cwd=None, shell=True):
+        uninstallCommands.append(args)
+        for name in args.split()[3:]:
+            for d in distributions:
+                if body.canonicalName(d.metadata['Name']) == name:
+                    distributions.remove(d)
+                    break
+
+    monkeypatch.setattr(importlib.metadata, 'distributions', lambda: list(distributions))
+    monkeypatch.setattr(body, 'runCommand', pipUninstall)
+    return distributions, uninstallCommands
+
+
+def test_second_copy_is_removed_by_another_pass(installed):
+    distributions, uninstallCommands = installed
+    distributions += [
+        FakeDistribution('robotpy-wpiutil', '/src/mostrobotpy/subprojects/robotpy-wpiutil'),
+        FakeDistribution('robotpy-wpiutil', '/venv/site-packages'),
+    ]
+
+    body.uninstallAllCopies({'robotpy-wpiutil'}, ['robotpy-wpiutil'])
+
+    assert distributions == []
+    assert uninstallCommands == ['pip uninstall -y robotpy-wpiutil'] * 2
+
+
+def test_no_progress_raises(installed, monkeypatch):
+    distributions, uninstallCommands = installed
+    distributions.append(FakeDistribution('robotpy-hal', '/venv/site-packages'))
+    monkeypatch.setattr(body, 'runCommand', lambda args, cwd=None, shell=True: None)
+
+    with pytest.raises(click.ClickException, match='did not remove robotpy-hal'):
+        body.uninstallAllCopies({'robotpy-hal'}, ['robotpy-hal'])